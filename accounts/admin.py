@@ -12,7 +12,7 @@ class UserAdmin(BaseUserAdmin):
 
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Civic Portal', {
-            'fields': ('role', 'lga', 'child_safety_acknowledged', 'data_privacy_agreed', 'email_notifications_enabled')
+            'fields': ('role', 'lga', 'child_safety_acknowledged', 'data_privacy_agreed', 'email_notifications_enabled', 'email_delivery')
         }),
     )
 
@@ -0,0 +1,15 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .cache import get_cached_user
+from .models import User
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that loads the logged-in user from the user cache."""
+
+    def get_user(self, user_id):
+        try:
+            user = get_cached_user(user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
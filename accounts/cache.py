@@ -0,0 +1,57 @@
+"""
+Per-user cache for the authenticated user.
+
+Every authenticated request used to load the full ``User`` row. The auth
+backend now reads it from the cache instead, under ``accounts:user:<id>``.
+The entry is dropped whenever the row changes:
+
+* any ``save()`` (profile edits, password changes, last_login updates) via
+  the post_save signal, which is also exactly when ``updated_at`` moves;
+* the queryset ``update()`` calls that bypass signals, such as the unread
+  notification counter in notifications.services, which call
+  ``invalidate_users()`` directly.
+
+Entries are dropped immediately and again once the transaction commits, so
+a request that re-reads the row mid-transaction cannot leave a stale copy.
+With more than one worker process the cache must be shared (Redis) for
+invalidation to reach every worker; settings_prod turns the user cache off
+otherwise (``USER_CACHE_TIMEOUT = 0``).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def user_cache_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def get_cached_user(user_id):
+    """Return the user with this id, from the cache when possible.
+
+    Raises User.DoesNotExist like a normal lookup.
+    """
+    from .models import User
+
+    timeout = getattr(settings, 'USER_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return User._default_manager.get(pk=user_id)
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User._default_manager.get(pk=user_id)
+        cache.set(key, user, timeout)
+    return user
+
+
+def invalidate_users(user_ids):
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user(user_id):
+    invalidate_users([user_id])
@@ -1,8 +1,19 @@
+import unicodedata
+
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
 from .models import User
 
 
+def unicode_ci_compare(s1, s2):
+    """Compare two strings case-insensitively after NFKC normalization.
+
+    The recheck the stock PasswordResetForm makes: __iexact alone can match
+    addresses that only look alike in the database's collation.
+    """
+    return unicodedata.normalize('NFKC', s1).casefold() == unicodedata.normalize('NFKC', s2).casefold()
+
+
 class SignUpForm(UserCreationForm):
     email = forms.EmailField(required=True)
     lga = forms.ChoiceField(
@@ -34,9 +45,44 @@ class SignUpForm(UserCreationForm):
 class ProfileForm(forms.ModelForm):
     class Meta:
         model = User
-        fields = ['email', 'lga', 'email_notifications_enabled']
+        fields = ['email', 'lga', 'email_notifications_enabled', 'email_delivery']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for field in self.fields.values():
             field.widget.attrs['class'] = 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-civic-blue focus:border-transparent'
+        self.fields['email_delivery'].widget.attrs['class'] += ' bg-white'
+
+
+class UserImportForm(forms.ModelForm):
+    """Validates one row of a bulk user import (the import_users command).
+
+    Usernames are checked against the database once per batch by the
+    command, so the per-row uniqueness query is skipped here.
+    """
+
+    class Meta:
+        model = User
+        fields = ['username', 'email', 'first_name', 'last_name', 'lga', 'email_delivery',
+                  'email_notifications_enabled', 'child_safety_acknowledged', 'data_privacy_agreed']
+
+    def validate_unique(self):
+        pass
+
+
+class InvitePasswordResetForm(PasswordResetForm):
+    """Password reset that also reaches invited users who never signed in.
+
+    import_users creates invitees with an unusable password, which the stock
+    form skips, so an invitee whose link expired could never get a new one.
+    Accounts that have signed in and since lost their password stay excluded.
+    """
+
+    def get_users(self, email):
+        email_field = User.get_email_field_name()
+        users = User._default_manager.filter(**{f'{email_field}__iexact': email, 'is_active': True})
+        for user in users:
+            if not unicode_ci_compare(email, getattr(user, email_field)):
+                continue
+            if user.has_usable_password() or user.last_login is None:
+                yield user
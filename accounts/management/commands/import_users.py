@@ -0,0 +1,337 @@
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections, transaction
+from django.db.models.functions import Lower
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from accounts.forms import UserImportForm
+from accounts.models import User
+from config import metrics
+
+BOOLEAN_FIELDS = ('email_notifications_enabled', 'child_safety_acknowledged', 'data_privacy_agreed')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'f'}
+
+
+def prepare_password(row):
+    """Validate and hash one password; runs in the worker processes.
+
+    row is (username, email, first_name, last_name, password). Returns
+    (hash, None) or (None, [error messages]).
+    """
+    username, email, first_name, last_name, password = row
+    user = User(username=username, email=email, first_name=first_name, last_name=last_name)
+    try:
+        validate_password(password, user=user)
+    except ValidationError as exc:
+        return None, exc.messages
+    return make_password(password), None
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, exc
+            continue
+        yield line_number, row if isinstance(row, dict) else ValueError('expected a JSON object')
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-create youth accounts from a council CSV or JSONL file. Rows are '
+        'validated in batches, passwords are hashed in a process pool, and rows '
+        'without a password get an unusable one plus an emailed set-password link.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='CSV (with a header row) or JSONL file, or - for stdin. Columns: username, '
+                 'email, first_name, last_name, lga, password, email_delivery, '
+                 'email_notifications_enabled, child_safety_acknowledged, data_privacy_agreed',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Input format (default: from the file extension, otherwise csv)',
+        )
+        parser.add_argument(
+            '--lga',
+            choices=User.LGA.values,
+            help='LGA for rows that do not have one',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows validated and inserted together (default: 1000)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes hashing passwords; 1 hashes in this process (default: CPU count)',
+        )
+        parser.add_argument(
+            '--send-invites',
+            action='store_true',
+            help='Email a set-password link to created users that had no password',
+        )
+        parser.add_argument(
+            '--errors',
+            help='Write rejected rows to this CSV file instead of listing them here',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate everything but create nothing',
+        )
+
+    @metrics.COMMAND_DURATION.time(command='import_users')
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        self.options = options
+        self.seen_usernames = set()
+        self.errors = []
+        self.rejected = 0
+        self.created = 0
+        self.invited = 0
+        self.invite_template = get_template('accounts/email/invite.txt')
+
+        if path == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8-sig')
+            except OSError as exc:
+                raise CommandError(f'Cannot read {path}: {exc}')
+
+        # Fork before any work so the children never share a database connection.
+        connections.close_all()
+        pool = None
+        if options['workers'] > 1:
+            pool = ProcessPoolExecutor(options['workers'], mp_context=multiprocessing.get_context('fork'))
+
+        started = time.perf_counter()
+        try:
+            rows = read_jsonl(stream) if file_format == 'jsonl' else read_csv(stream)
+            while batch := list(islice(rows, options['batch_size'])):
+                self.import_batch(batch, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.report_errors()
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        summary = (
+            f'{verb} {self.created:,} users in {time.perf_counter() - started:.1f}s; '
+            f'{self.rejected:,} rows rejected'
+        )
+        if options['send_invites'] and not options['dry_run']:
+            summary += f'; {self.invited:,} invitations sent'
+        style = self.style.WARNING if self.errors else self.style.SUCCESS
+        self.stdout.write(style(summary))
+
+    def reject(self, line, username, messages):
+        self.rejected += 1
+        for message in messages:
+            self.errors.append((line, username, message))
+
+    def import_batch(self, batch, pool):
+        valid = []
+        for line, row in batch:
+            if isinstance(row, Exception):
+                self.reject(line, '', [f'Invalid JSON: {row}'])
+                continue
+            data, problems = self.normalize(row)
+            form = UserImportForm(data)
+            if problems or not form.is_valid():
+                self.reject(line, row.get('username') or '', problems + [
+                    f'{field}: {message}' if field != '__all__' else message
+                    for field, messages in form.errors.items()
+                    for message in messages
+                ])
+                continue
+            data = form.cleaned_data
+            password = str(row.get('password') or '').strip()
+            if not password and not data['email']:
+                self.reject(line, data['username'], ['Needs a password or an email address to send a set-password link to'])
+                continue
+            key = data['username'].lower()
+            if key in self.seen_usernames:
+                self.reject(line, data['username'], ['Username appears earlier in the file'])
+                continue
+            self.seen_usernames.add(key)
+            valid.append((line, data, password))
+
+        # One query per batch instead of one per row.
+        existing = set(
+            User.objects.annotate(lower_username=Lower('username'))
+            .filter(lower_username__in=[data['username'].lower() for _, data, _ in valid])
+            .values_list('lower_username', flat=True)
+        )
+        accepted = []
+        for line, data, password in valid:
+            if data['username'].lower() in existing:
+                self.reject(line, data['username'], ['A user with that username already exists'])
+            else:
+                accepted.append((line, data, password))
+
+        with_password = [entry for entry in accepted if entry[2]]
+        jobs = [
+            (data['username'], data['email'], data['first_name'], data['last_name'], password)
+            for _, data, password in with_password
+        ]
+        hashes = dict(zip(
+            (line for line, _, _ in with_password),
+            pool.map(prepare_password, jobs, chunksize=16) if pool else map(prepare_password, jobs),
+        ))
+
+        users = []
+        for line, data, password in accepted:
+            user = User(**data)
+            if password:
+                hashed, messages = hashes[line]
+                if messages:
+                    self.reject(line, data['username'], [f'password: {message}' for message in messages])
+                    continue
+                user.password = hashed
+            else:
+                user.set_unusable_password()
+            users.append((line, user))
+
+        if self.options['dry_run']:
+            self.created += len(users)
+            return
+
+        created = self.insert(users)
+        self.created += len(created)
+        if self.options['send_invites']:
+            self.send_invites([user for user in created if not user.has_usable_password() and user.email])
+
+    def normalize(self, row):
+        """Return (form data, errors) for one raw row."""
+        errors = []
+        data = {key: value.strip() if isinstance(value, str) else value for key, value in row.items() if key}
+        data['lga'] = self.lga_value(data.get('lga')) or self.options['lga']
+        if not data.get('email_delivery'):
+            data['email_delivery'] = User.EmailDelivery.IMMEDIATE
+        else:
+            data['email_delivery'] = str(data['email_delivery']).lower()
+        for field in BOOLEAN_FIELDS:
+            default = field == 'email_notifications_enabled'
+            value = data.get(field)
+            if value is None:
+                data[field] = default
+            elif isinstance(value, str):
+                if value.lower() in TRUE_VALUES:
+                    data[field] = True
+                elif value.lower() in FALSE_VALUES:
+                    data[field] = False if value else default
+                else:
+                    errors.append(f'{field}: "{value}" is not yes or no')
+        return data, errors
+
+    def lga_value(self, value):
+        """Accept either the stored value ("lake_macquarie") or the label ("Lake Macquarie")."""
+        if not value:
+            return None
+        value = str(value).lower()
+        for choice, label in User.LGA.choices:
+            if value in (choice, label.lower()):
+                return choice
+        return value
+
+    def insert(self, users):
+        """bulk_create the batch; fall back to row-by-row if it collides with a concurrent signup."""
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user for _, user in users])
+        except IntegrityError:
+            created = []
+            for line, user in users:
+                try:
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                except IntegrityError as exc:
+                    user.pk = None
+                    self.reject(line, user.username, [f'Could not be created: {exc}'])
+                else:
+                    created.append(user)
+            return created
+        return [user for _, user in users]
+
+    def send_invites(self, users):
+        if not users:
+            return
+        # bulk_create does not return primary keys on every backend.
+        ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'pk'))
+        messages = []
+        for user in users:
+            user.pk = ids[user.username]
+            reset_url = settings.SITE_URL + reverse('password_reset_confirm', args=[
+                urlsafe_base64_encode(force_bytes(user.pk)),
+                default_token_generator.make_token(user),
+            ])
+            context = {'user': user, 'reset_url': reset_url, 'site_url': settings.SITE_URL}
+            messages.append(EmailMessage(
+                subject='Your Odyssey account is ready',
+                body=self.invite_template.render(context),
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[user.email],
+            ))
+        try:
+            with get_connection() as connection:
+                sent = connection.send_messages(messages) or 0
+        except Exception as exc:
+            metrics.EMAILS.inc(len(messages), kind='invite', outcome='failed')
+            self.stderr.write(f'Could not send {len(messages)} invitations: {exc}')
+            return
+        metrics.EMAILS.inc(sent, kind='invite', outcome='sent')
+        self.invited += sent
+
+    def report_errors(self):
+        if not self.errors:
+            return
+        if self.options['errors']:
+            with open(self.options['errors'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['line', 'username', 'error'])
+                writer.writerows(self.errors)
+            self.stderr.write(f'{len(self.errors):,} errors written to {self.options["errors"]}')
+            return
+        for line, username, message in self.errors:
+            self.stderr.write(f'line {line}{f" ({username})" if username else ""}: {message}')
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_unread_notification_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_delivery',
+            field=models.CharField(choices=[('immediate', 'Immediately'), ('hourly', 'Hourly digest'), ('daily', 'Daily digest')], default='immediate', max_length=10, verbose_name='Email delivery'),
+        ),
+    ]
@@ -15,6 +15,11 @@ class User(AbstractUser):
         LAKE_MACQUARIE = 'lake_macquarie', 'Lake Macquarie'
         PORT_STEPHENS = 'port_stephens', 'Port Stephens'
 
+    class EmailDelivery(models.TextChoices):
+        IMMEDIATE = 'immediate', 'Immediately'
+        HOURLY = 'hourly', 'Hourly digest'
+        DAILY = 'daily', 'Daily digest'
+
     role = models.CharField(
         max_length=20,
         choices=Role.choices,
@@ -28,12 +33,36 @@ class User(AbstractUser):
     child_safety_acknowledged = models.BooleanField(default=False)
     data_privacy_agreed = models.BooleanField(default=False)
     email_notifications_enabled = models.BooleanField(default=True)
+    email_delivery = models.CharField(
+        max_length=10,
+        choices=EmailDelivery.choices,
+        default=EmailDelivery.IMMEDIATE,
+        verbose_name='Email delivery',
+    )
+    # Denormalized so the nav badge never has to COUNT(*) notifications;
+    # maintained by notifications.services.
+    unread_notification_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.username} ({self.get_lga_display()})"
 
+    def save(self, *args, update_fields=None, **kwargs):
+        # The unread counter is only written by relative UPDATEs. Saving a
+        # loaded user (profile form, password change, admin) would write back
+        # the value read at the start of the request and lose any change made
+        # since, so existing rows save every other loaded field.
+        if not self._state.adding:
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            update_fields = [name for name in update_fields if name != 'unread_notification_count']
+        super().save(*args, update_fields=update_fields, **kwargs)
+
     @property
     def is_admin(self):
         return self.role == self.Role.ADMIN
@@ -1,3 +1,109 @@
-from django.test import TestCase
+import re
+import tempfile
+import time
+from datetime import datetime
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from notifications.services import adjust_unread_count
+
+from .backends import CachedModelBackend
+from .models import User
+
+
+@override_settings(USER_CACHE_TIMEOUT=300)
+class CachedUserTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cached', password='pw', lga=User.LGA.NEWCASTLE)
+        self.backend = CachedModelBackend()
+
+    def test_second_lookup_is_served_from_cache(self):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_save_and_counter_updates_invalidate(self):
+        self.backend.get_user(self.user.pk)
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name, 'Renamed')
+
+        adjust_unread_count(self.user.pk, 2)
+        self.assertEqual(self.backend.get_user(self.user.pk).unread_notification_count, 2)
+
+    def test_inactive_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.user.refresh_from_db()
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTests(TestCase):
+
+    def test_import_reports_bad_rows_and_invites_passwordless_users(self):
+        User.objects.create_user(username='taken', lga=User.LGA.NEWCASTLE)
+        rows = (
+            'username,email,lga,password\n'
+            'alex,alex@example.com,Lake Macquarie,Harbour-lights-42\n'
+            'sam,sam@example.com,newcastle,\n'
+            'Alex,other@example.com,newcastle,\n'
+            'taken,t@example.com,newcastle,\n'
+            'weak,w@example.com,newcastle,password\n'
+            'nowhere,n@example.com,atlantis,\n'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write(rows)
+            f.flush()
+            stderr = StringIO()
+            call_command('import_users', f.name, '--workers=1', '--send-invites', stdout=StringIO(), stderr=stderr)
+
+        alex = User.objects.get(username='alex')
+        self.assertEqual(alex.lga, User.LGA.LAKE_MACQUARIE)
+        self.assertTrue(alex.check_password('Harbour-lights-42'))
+        self.assertFalse(User.objects.get(username='sam').has_usable_password())
+        self.assertFalse(User.objects.filter(username__in=['Alex', 'weak', 'nowhere']).exists())
+        self.assertEqual([message.to for message in mail.outbox], [['sam@example.com']])
+        self.assertIn('/accounts/password-reset/', mail.outbox[0].body)
+        for line in ('line 4', 'line 5', 'line 6', 'line 7'):
+            self.assertIn(line, stderr.getvalue())
+
+    def test_expired_invite_can_request_a_new_link(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('username,email,lga\nsam,sam@example.com,newcastle\n')
+            f.flush()
+            call_command('import_users', f.name, '--workers=1', '--send-invites', stdout=StringIO(), stderr=StringIO())
+        invite_link = re.search(r'http\S+/password-reset/\S+/', mail.outbox[0].body).group(0)
+
+        expired = time.time() + settings.PASSWORD_RESET_TIMEOUT + 60
+        with mock.patch.object(PasswordResetTokenGenerator, '_now', return_value=datetime.fromtimestamp(expired)):
+            response = self.client.get(invite_link, follow=True)
+            self.assertFalse(response.context['validlink'])
+
+            self.client.post(reverse('password_reset'), {'email': 'sam@example.com'})
+            self.assertEqual(len(mail.outbox), 2)
+            reset_link = re.search(r'http\S+/password-reset/\S+/', mail.outbox[1].body).group(0)
+            response = self.client.get(reset_link, follow=True)
+            self.client.post(response.redirect_chain[-1][0], {
+                'new_password1': 'Harbour-lights-42', 'new_password2': 'Harbour-lights-42',
+            })
+        self.assertTrue(User.objects.get(username='sam').check_password('Harbour-lights-42'))
+
+        # Accounts that have signed in before don't get a reset for an unusable password.
+        sam = User.objects.get(username='sam')
+        sam.set_unusable_password()
+        sam.last_login = timezone.now()
+        sam.save()
+        self.client.post(reverse('password_reset'), {'email': 'sam@example.com'})
+        self.assertEqual(len(mail.outbox), 2)
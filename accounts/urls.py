@@ -1,6 +1,7 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
+from .forms import InvitePasswordResetForm
 
 urlpatterns = [
     path('signup/', views.SignUpView.as_view(), name='signup'),
@@ -8,8 +9,9 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
     path('profile/', views.ProfileView.as_view(), name='profile'),
     path('password-reset/', auth_views.PasswordResetView.as_view(
+        form_class=InvitePasswordResetForm,
         template_name='accounts/password_reset.html',
-        email_template_name='accounts/password_reset_email.html',
+        email_template_name='accounts/email/password_reset.txt',
         success_url='/accounts/password-reset/done/'
     ), name='password_reset'),
     path('password-reset/done/', auth_views.PasswordResetDoneView.as_view(
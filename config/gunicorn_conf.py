@@ -0,0 +1,42 @@
+"""
+Gunicorn configuration for Odyssey App.
+
+Serves the WSGI application with sync workers by default. Set
+SERVER_MODE=asgi to serve config.asgi under uvicorn workers instead, which
+is needed for the realtime event streams and lets the async views
+(USE_ASYNC_VIEWS=True) overlap slow requests within a worker.
+
+To compare throughput, run the same load test against each mode:
+
+    gunicorn -c config/gunicorn_conf.py
+    SERVER_MODE=asgi USE_ASYNC_VIEWS=True gunicorn -c config/gunicorn_conf.py
+"""
+import glob
+import multiprocessing
+import os
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'config.wsgi:application'
+    worker_class = 'sync'
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+errorlog = '-'
+
+
+def on_starting(server):
+    # Start every run with fresh metrics; snapshots from a previous run would
+    # otherwise be added to the new totals.
+    metrics_dir = os.environ.get('METRICS_DIR')
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for pattern in ('metrics_*.json', 'merged.json'):
+            for path in glob.glob(os.path.join(metrics_dir, pattern)):
+                os.remove(path)
@@ -0,0 +1,462 @@
+"""
+In-process metrics with a Prometheus text-format ``/metrics`` endpoint.
+
+Metrics are declared once at import time (see the bottom of this module) and
+updated from anywhere::
+
+    from config import metrics
+    metrics.VOTES.inc(mode='direct')
+    with metrics.COMMAND_DURATION.time(command='export_data'):
+        ...
+
+Each gunicorn worker (and each management command) is its own process with
+its own registry. When ``METRICS_DIR`` is set, every process periodically
+writes a snapshot of its values to ``<METRICS_DIR>/metrics_<pid>_<start>.json``
+and ``/metrics`` adds up the snapshots of all processes. Snapshots are keyed
+on the process start time as well as the pid, so a new process that reuses
+a dead one's pid never overwrites it. Counters and histograms from processes
+that have exited are kept, so totals never go backwards: each scrape folds
+dead processes' snapshots into one ``merged.json`` and deletes them. Gauges
+only count processes that are still alive. The directory should be emptied
+when the server starts (config/gunicorn_conf.py does this). Without
+``METRICS_DIR`` the endpoint only reports the serving process.
+
+With ``METRICS_TOKEN`` set, ``/metrics`` requires ``Authorization: Bearer
+<token>``. Without one it is served to anyone only if ``METRICS_PUBLIC`` is
+set (the default in development, not in production), and is a 404 otherwise.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+# Snapshots are written at most this often per process
+SNAPSHOT_INTERVAL_SECONDS = 1.0
+
+# Counters and histograms of exited processes, folded together
+MERGED_FILE = 'merged.json'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+        self._last_snapshot = 0.0
+        self._collecting = False
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, func):
+        """Register a callable that refreshes gauges just before they are read."""
+        self.collectors.append(func)
+
+    def updated(self):
+        """Called after every update; writes a snapshot if one is due."""
+        if self._collecting:
+            return
+        if metrics_dir() and time.monotonic() - self._last_snapshot >= SNAPSHOT_INTERVAL_SECONDS:
+            try:
+                self.write_snapshot()
+            except OSError:
+                # Never fail a request over metrics; try again next interval.
+                logger.exception('Could not write metrics snapshot')
+
+    def state(self):
+        # Collectors set gauges, which would otherwise trigger a snapshot
+        # (and so another collection) from inside this one.
+        self._collecting = True
+        try:
+            for collect in self.collectors:
+                collect()
+        finally:
+            self._collecting = False
+        with self.lock:
+            return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    def write_snapshot(self):
+        directory = metrics_dir()
+        if not directory:
+            return
+        self._last_snapshot = time.monotonic()
+        pid, start = process_identity()
+        os.makedirs(directory, exist_ok=True)
+        write_json(
+            os.path.join(directory, f'metrics_{pid}_{start}.json'),
+            {'pid': pid, 'start': start, 'metrics': self.state()},
+        )
+
+    def collect(self):
+        """Return {name: {labels_key: value}} aggregated over all processes."""
+        directory = metrics_dir()
+        if not directory:
+            return self.state()
+
+        self.write_snapshot()
+        combined = {}
+
+        def add(target, values, gauges):
+            for name, samples in values.items():
+                metric = self.metrics.get(name)
+                if metric is None or (isinstance(metric, Gauge) and not gauges):
+                    continue
+                merged_samples = target.setdefault(name, {})
+                for key, value in samples.items():
+                    merged_samples[key] = metric.merge(merged_samples.get(key), value)
+
+        # One scrape at a time, so a dead process is folded exactly once.
+        with open(os.path.join(directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            merged_path = os.path.join(directory, MERGED_FILE)
+            merged = read_json(merged_path) or {'folded': [], 'metrics': {}}
+            # Snapshots already folded in whose deletion failed last time
+            folded = set(merged['folded'])
+            add(combined, merged['metrics'], gauges=False)
+
+            dead = []
+            for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+                name = os.path.basename(path)
+                if name in folded:
+                    remove(path)
+                    continue
+                snapshot = read_json(path)
+                if snapshot is None:
+                    continue
+                alive = process_alive(snapshot['pid'], snapshot.get('start'))
+                add(combined, snapshot['metrics'], gauges=alive)
+                if not alive:
+                    dead.append((path, snapshot))
+
+            if dead:
+                for _, snapshot in dead:
+                    add(merged['metrics'], snapshot['metrics'], gauges=False)
+                merged['folded'] = [
+                    name for name in folded if os.path.exists(os.path.join(directory, name))
+                ] + [os.path.basename(path) for path, _ in dead]
+                write_json(merged_path, merged)
+                for path, _ in dead:
+                    remove(path)
+        return combined
+
+    def exposition(self):
+        collected = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(collected.get(name, {}).items()):
+                lines.extend(metric.render(json.loads(key), value))
+        return '\n'.join(lines) + '\n'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self.values = {}
+        self.registry.register(self)
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return json.dumps([str(labels[name]) for name in self.labelnames])
+
+    def dump(self):
+        return dict(self.values)
+
+    def merge(self, current, value):
+        return value if current is None else current + value
+
+    def render(self, label_values, value):
+        return [f'{self.name}{format_labels(zip(self.labelnames, label_values))} {format_value(value)}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.updated()
+
+
+class Gauge(Metric):
+    """A value that goes up and down; aggregated across live processes by sum."""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            self.values[key] = value
+        self.registry.updated()
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.updated()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+        self.registry.updated()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def dump(self):
+        return {
+            key: {'buckets': list(state['buckets']), 'sum': state['sum'], 'count': state['count']}
+            for key, state in self.values.items()
+        }
+
+    def merge(self, current, value):
+        if current is None:
+            return {'buckets': list(value['buckets']), 'sum': value['sum'], 'count': value['count']}
+        current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+        current['sum'] += value['sum']
+        current['count'] += value['count']
+        return current
+
+    def render(self, label_values, value):
+        labels = list(zip(self.labelnames, label_values))
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, value['buckets']):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{format_labels(labels + [("le", format_value(bound))])} {cumulative}')
+        lines.append(f'{self.name}_bucket{format_labels(labels + [("le", "+Inf")])} {value["count"]}')
+        lines.append(f'{self.name}_sum{format_labels(labels)} {format_value(value["sum"])}')
+        lines.append(f'{self.name}_count{format_labels(labels)} {value["count"]}')
+        return lines
+
+
+def format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def format_value(value):
+    return repr(float(value))
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    """Replace path atomically, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def process_start(pid):
+    """When process pid started, in clock ticks since boot; None without /proc."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Field 22; the command name before it (field 2) may contain spaces.
+    return int(stat.rpartition(')')[2].split()[19])
+
+
+_identity = (None, None)
+
+
+def process_identity():
+    """(pid, start) for this process. Computed per pid, so forks get their own."""
+    global _identity
+    pid = os.getpid()
+    if _identity[0] != pid:
+        start = process_start(pid)
+        _identity = (pid, start if start is not None else int(time.time() * 1000))
+    return _identity
+
+
+def process_alive(pid, start):
+    """Whether the process that wrote a snapshot is still running."""
+    if (pid, start) == process_identity():
+        return True
+    if not pid_alive(pid):
+        return False
+    current = process_start(pid)
+    # Without /proc a reused pid can't be told apart; count it as alive.
+    return current is None or current == start
+
+
+def pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def metrics_view(request):
+    """Serve all metrics in the Prometheus text exposition format."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token and not getattr(settings, 'METRICS_PUBLIC', False):
+        raise Http404('Metrics are disabled without METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(
+        REGISTRY.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.write_snapshot)
+
+
+# Application metrics
+
+REQUEST_DURATION = Histogram(
+    'odyssey_request_duration_seconds',
+    'Time spent handling a request, by view',
+    ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'odyssey_request_db_queries',
+    'SQL queries run per request, by view',
+    ['view'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+VOTES = Counter(
+    'odyssey_votes_total',
+    'Votes recorded, by write mode (direct or buffered)',
+    ['mode'],
+)
+VOTE_BUFFER_FLUSHED = Counter(
+    'odyssey_vote_buffer_flushed_total',
+    'Votes written to the database by the write-behind buffer',
+)
+VOTE_BUFFER_PENDING = Gauge(
+    'odyssey_vote_buffer_pending',
+    'Votes waiting in write-behind buffers',
+)
+NOTIFICATIONS_CREATED = Counter(
+    'odyssey_notifications_created_total',
+    'Notifications created, by type',
+    ['type'],
+)
+NOTIFICATION_FANOUT = Histogram(
+    'odyssey_notification_fanout_size',
+    'Recipients per notification fan-out, by event',
+    ['event'],
+    buckets=(1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000),
+)
+COMMENTS_MODERATED = Counter(
+    'odyssey_comments_moderated_total',
+    'New comments by moderation outcome (approved, flagged, held)',
+    ['status'],
+)
+RATE_LIMITED = Counter(
+    'odyssey_rate_limited_total',
+    'Requests refused with 429 Too Many Requests, by rate limit scope',
+    ['scope'],
+)
+EMAILS = Counter(
+    'odyssey_emails_total',
+    'Notification emails attempted, by kind and outcome',
+    ['kind', 'outcome'],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'odyssey_db_pool_connections',
+    'Pooled database connections by state (checked_out, idle, waiting clients)',
+    ['alias', 'state'],
+)
+DB_POOL_WAIT = Gauge(
+    'odyssey_db_pool_wait_seconds',
+    'Time clients have spent waiting for a pooled connection since each worker started',
+    ['alias'],
+)
+COMMAND_DURATION = Histogram(
+    'odyssey_command_duration_seconds',
+    'Management command run time',
+    ['command'],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+BACKGROUND_TASKS = Counter(
+    'odyssey_background_tasks_total',
+    'Deferred tasks run, by task and outcome (ok, failed)',
+    ['task', 'outcome'],
+)
+BACKGROUND_TASKS_PENDING = Gauge(
+    'odyssey_background_tasks_pending',
+    'Deferred tasks waiting for a background worker',
+)
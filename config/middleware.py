@@ -0,0 +1,199 @@
+"""
+Per-request query and latency instrumentation.
+
+RequestProfilingMiddleware counts the SQL queries each request runs, how long
+they took, how long template rendering took and which queries were slowest.
+Every request is logged as one JSON line on the ``odyssey.requests`` logger.
+With DEBUG on, the numbers are also sent as ``X-DB-*`` response headers.
+
+Views can declare how many queries they are allowed (``query_budget`` class
+attribute on class-based views, or the ``@query_budget(n)`` decorator on
+function views). Going over budget logs a warning, or raises
+QueryBudgetExceeded when ``QUERY_BUDGET_STRICT`` is on, which the query
+budget tests do.
+
+The middleware runs in both sync and async stacks. Django keeps database
+connections per thread, and under ASGI the ORM runs in sync_to_async
+threads, so rather than wrapping the connections of the thread the
+middleware happens to run in, every connection gets one permanent
+``record_query`` wrapper that adds to the current request's profile (a
+context variable, which asgiref carries into those threads).
+"""
+import contextvars
+import heapq
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('odyssey.requests')
+
+# How many of the slowest queries to report per request
+SLOW_QUERY_COUNT = 3
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """Declare the maximum number of queries a function view may run."""
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(view_func, 'view_class', None), 'query_budget', None)
+    return budget
+
+
+_profile = contextvars.ContextVar('request_profile', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_query(execute, sql, params, many, context)
+
+
+def install_query_recorder():
+    """Add record_query to this thread's connections, once each."""
+    for connection in connections.all():
+        if record_query not in connection.execute_wrappers:
+            # First in the list, so ``connection.execute_wrapper()`` blocks,
+            # which pop the last wrapper on exit, never remove it.
+            connection.execute_wrappers.insert(0, record_query)
+
+
+class RequestProfile:
+    """Query and timing figures collected for one request."""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.slowest = []
+        self.view_name = None
+        self.budget = None
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.query_count += 1
+            self.db_time += duration
+            entry = (duration, self.query_count, sql)
+            if len(self.slowest) < SLOW_QUERY_COUNT:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.query_count > self.budget
+
+
+class RequestProfilingMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_query_recorder()
+        profile = request.profile = RequestProfile()
+        token = _profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        self.report(request, response, profile, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        # The thread-sensitive thread is the one this request's ORM calls
+        # run in.
+        await sync_to_async(install_query_recorder)()
+        profile = request.profile = RequestProfile()
+        token = _profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        self.report(request, response, profile, time.perf_counter() - start)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = request.profile
+        profile.budget = get_query_budget(view_func)
+        if request.resolver_match:
+            profile.view_name = request.resolver_match.view_name
+
+    def process_template_response(self, request, response):
+        # This middleware is outermost, so this hook runs last, just before
+        # the response is rendered.
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.profile.template_time += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, profile, total_time):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': profile.view_name,
+            'status': response.status_code,
+            'total_ms': round(total_time * 1000, 2),
+            'db_queries': profile.query_count,
+            'db_ms': round(profile.db_time * 1000, 2),
+            'template_ms': round(profile.template_time * 1000, 2),
+            'query_budget': profile.budget,
+            'slowest_queries': [
+                {'ms': round(duration * 1000, 2), 'sql': sql[:500]}
+                for duration, _, sql in sorted(profile.slowest, reverse=True)
+            ],
+        }
+
+        view = profile.view_name or 'unresolved'
+        metrics.REQUEST_DURATION.observe(
+            total_time, view=view, method=request.method, status=response.status_code,
+        )
+        metrics.REQUEST_QUERIES.observe(profile.query_count, view=view)
+
+        if settings.DEBUG:
+            response['X-DB-Queries'] = str(profile.query_count)
+            response['X-DB-Time-Ms'] = str(record['db_ms'])
+            response['X-Template-Time-Ms'] = str(record['template_ms'])
+            response['X-Request-Time-Ms'] = str(record['total_ms'])
+
+        if profile.over_budget:
+            logger.warning(json.dumps({'event': 'query_budget_exceeded', **record}))
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(
+                    f'{profile.view_name} ran {profile.query_count} queries '
+                    f'(budget {profile.budget}) for {request.method} {request.path}'
+                )
+        else:
+            logger.info(json.dumps(record))
@@ -0,0 +1,114 @@
+"""
+PostgreSQL backend that borrows connections from a psycopg_pool pool.
+
+Django 4.2 has no built-in pooling, so this backend keeps one
+``psycopg_pool.ConnectionPool`` per database alias per process. Opening a
+connection takes one from the pool and closing it (Django closes at the end
+of every request when CONN_MAX_AGE is 0) gives it back.
+
+Configure it through ``config.database.database_config(..., pool={...})``,
+which puts the pool options (``min_size``, ``max_size``, ``timeout``,
+``max_idle``...) in ``OPTIONS['pool']``. Requires ``psycopg[pool]`` (psycopg
+3) with psycopg_pool 3.2 or later, for the ``check`` option; psycopg2 has no
+compatible pool.
+
+Pool statistics (size, checked out, idle, waiting clients and time spent
+waiting) are published as ``odyssey_db_pool_*`` metrics.
+"""
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+
+from config import metrics
+
+try:
+    from psycopg import IsolationLevel
+    from psycopg_pool import ConnectionPool
+except ImportError as exc:
+    raise ImproperlyConfigured(
+        'The pooled PostgreSQL backend requires psycopg 3 with the pool extra: '
+        'pip install "psycopg[binary,pool]" "psycopg_pool>=3.2"'
+    ) from exc
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_stats():
+    """Return {alias: stats} for the pools opened in this process."""
+    with _pools_lock:
+        pools = dict(_pools)
+    stats = {}
+    for (alias, _), pool in pools.items():
+        raw = pool.get_stats()
+        size = raw.get('pool_size', 0)
+        idle = raw.get('pool_available', 0)
+        stats[alias] = {
+            'size': size,
+            'checked_out': size - idle,
+            'idle': idle,
+            'waiting': raw.get('requests_waiting', 0),
+            'wait_seconds': raw.get('requests_wait_ms', 0) / 1000,
+            'errors': raw.get('requests_errors', 0),
+        }
+    return stats
+
+
+def collect_pool_metrics():
+    for alias, stats in pool_stats().items():
+        for state in ('checked_out', 'idle', 'waiting'):
+            metrics.DB_POOL_CONNECTIONS.set(stats[state], alias=alias, state=state)
+        metrics.DB_POOL_WAIT.set(stats['wait_seconds'], alias=alias)
+
+
+metrics.REGISTRY.add_collector(collect_pool_metrics)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        # Keyed by name too: the test runner renames the database after the
+        # first connection.
+        key = (self.alias, self.settings_dict['NAME'])
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+
+        with _pools_lock:
+            if key not in _pools:
+                options = dict(self.settings_dict['OPTIONS'].get('pool') or {})
+                _pools[key] = ConnectionPool(
+                    kwargs=self.get_connection_params(),
+                    configure=self._configure_connection,
+                    check=ConnectionPool.check_connection,
+                    name=f'odyssey-{self.alias}',
+                    open=True,
+                    **options,
+                )
+            return _pools[key]
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = (
+            IsolationLevel.READ_COMMITTED if isolation_level is None
+            else IsolationLevel(isolation_level)
+        )
+        return self.pool.getconn()
+
+    def _configure_connection(self, connection):
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        if isolation_level is not None:
+            connection.isolation_level = IsolationLevel(isolation_level)
+
+    def _close(self):
+        if self.connection is not None:
+            # Back to the pool, which rolls back anything left open.
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
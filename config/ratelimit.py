@@ -0,0 +1,199 @@
+"""
+Per-user and per-IP rate limits for write endpoints.
+
+Views opt in with a ``rate_limit`` class attribute naming a scope in
+``RATE_LIMITS`` (class-based views) or the ``@rate_limit(scope)`` decorator
+(function views). ``RateLimitMiddleware`` checks POST/PUT/PATCH/DELETE
+requests to those views before the view runs and answers with 429 Too Many
+Requests and a ``Retry-After`` header once a limit is reached::
+
+    RATE_LIMITS = {
+        'vote': {'user': '30/m', 'ip': '120/m'},
+    }
+
+Rates are ``<count>/<s|m|h|d>``. Limits use a sliding window counter: the
+previous fixed window's count is weighted by how much of it still overlaps
+the sliding window, so there is no burst at window boundaries, and each
+identity costs two cache keys. Counters live in the default cache and are
+bumped with ``cache.incr`` (atomic in Redis and the local-memory cache); a
+check is one ``get_many`` for the previous windows plus one ``incr`` per
+identity. Each request is counted first and decided from the count its own
+``incr`` returned, so concurrent requests cannot overshoot a limit; a
+refused request is taken back off with ``decr``.
+
+The default cache must be shared between workers (Redis in production) for
+the limits to be global; with the local-memory cache each worker counts on
+its own, which multiplies every limit by the number of workers.
+
+Behind a reverse proxy set ``RATE_LIMIT_PROXY_COUNT`` to the number of
+proxies that append to X-Forwarded-For, or every client shares the proxy's
+address.
+"""
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.template.response import TemplateResponse
+
+from . import metrics
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def rate_limit(scope):
+    """Apply the RATE_LIMITS[scope] limits to a function view's writes."""
+    def decorator(view_func):
+        view_func.rate_limit = scope
+        return view_func
+    return decorator
+
+
+def view_rate_limit(view_func):
+    scope = getattr(view_func, 'rate_limit', None)
+    if scope is None:
+        scope = getattr(getattr(view_func, 'view_class', None), 'rate_limit', None)
+    return scope
+
+
+def parse_rate(rate):
+    """'30/m' -> (30, 60)"""
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period.strip().lower()[:1]]
+
+
+def client_ip(request):
+    proxies = getattr(settings, 'RATE_LIMIT_PROXY_COUNT', 0)
+    if proxies:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class SlidingWindowLimiter:
+    """Sliding window counter over the Django cache."""
+
+    def __init__(self, key_prefix='ratelimit'):
+        self.key_prefix = key_prefix
+
+    def keys(self, scope, identity, window, now):
+        index = int(now // window)
+        base = f'{self.key_prefix}:{scope}:{identity}:{window}'
+        return f'{base}:{index}', f'{base}:{index - 1}', now - index * window
+
+    def check(self, scope, limits, now=None):
+        """Count one request against each (identity, limit, window) in limits.
+
+        Returns 0 if allowed (and counted), otherwise the seconds to wait
+        before the tightest limit would allow another request.
+        """
+        now = time.time() if now is None else now
+        windows = [(identity, limit, window, *self.keys(scope, identity, window, now))
+                   for identity, limit, window in limits]
+        previous_counts = cache.get_many([previous for *_, previous, _ in windows])
+
+        retry_after = 0
+        for identity, limit, window, current, previous, elapsed in windows:
+            count = self.increment(current, window)
+            retry_after = max(retry_after, self.wait(
+                count - 1, previous_counts.get(previous, 0), limit, window, elapsed,
+            ))
+        if retry_after:
+            for identity, limit, window, current, previous, elapsed in windows:
+                try:
+                    cache.decr(current)
+                except ValueError:
+                    pass  # Expired in the meantime
+        return retry_after
+
+    @staticmethod
+    def increment(key, window):
+        """Add one to the count at key; returns the new count."""
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # First request in this window; keep it for two windows so it
+            # can serve as the next window's previous count.
+            if cache.add(key, 1, timeout=2 * window):
+                return 1
+            return cache.incr(key)
+
+    @staticmethod
+    def wait(current, previous, limit, window, elapsed):
+        """Seconds until current + weighted previous drops below limit (0 = now)."""
+        if current + previous * (1 - elapsed / window) < limit:
+            return 0
+        if current < limit:
+            # The previous window's weight decays until there is room.
+            seconds = window * (1 - (limit - current) / previous) - elapsed
+        else:
+            # Wait for this window to end, then for its weight to decay.
+            seconds = (window - elapsed) + window * (1 - limit / current)
+        # Exactly at the limit is still full; never report "no wait".
+        return max(seconds, 0.001)
+
+
+_limiter = SlidingWindowLimiter()
+
+
+def limits_for(request, scope):
+    config = getattr(settings, 'RATE_LIMITS', {}).get(scope, {})
+    limits = []
+    user = getattr(request, 'user', None)
+    if 'user' in config and user is not None and user.is_authenticated:
+        limits.append((f'user:{user.pk}', *parse_rate(config['user'])))
+    if 'ip' in config:
+        limits.append((f'ip:{client_ip(request)}', *parse_rate(config['ip'])))
+    return limits
+
+
+def too_many_requests(request, retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    message = f'Too many requests. Please wait {seconds} second{"s" if seconds != 1 else ""} and try again.'
+    if 'application/json' in request.headers.get('Accept', '') or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        response = JsonResponse({'error': message, 'retry_after': seconds}, status=429)
+    else:
+        response = TemplateResponse(request, '429.html', {'message': message}, status=429)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+class RateLimitMiddleware:
+    """Enforce RATE_LIMITS on views that declare a rate_limit scope.
+
+    Must come after AuthenticationMiddleware.
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in SAFE_METHODS or not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+            return None
+        scope = view_rate_limit(view_func)
+        if scope is None:
+            return None
+        limits = limits_for(request, scope)
+        if not limits:
+            return None
+        retry_after = _limiter.check(scope, limits)
+        if retry_after:
+            metrics.RATE_LIMITED.inc(scope=scope)
+            return too_many_requests(request, retry_after)
+        return None
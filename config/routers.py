@@ -0,0 +1,155 @@
+"""
+Read-replica routing.
+
+Writes always go to ``default``. Reads go to the replica only inside an
+explicit replica scope:
+
+* GET/HEAD requests to views that opt in, with a ``use_replica = True``
+  class attribute or the ``@reads_from_replica`` decorator, via
+  ``ReplicaRoutingMiddleware``;
+* code wrapped in ``use_replica()`` (a context manager or decorator), such as
+  the export_data command.
+
+Everything else reads from the primary, so a view that reads and then writes
+never does so against a stale copy. After any successful POST/PUT/PATCH/
+DELETE the middleware sets a short-lived cookie that pins that browser to
+the primary for ``READ_REPLICA_PIN_SECONDS``, so people see their own votes
+and comments straight away even if the replica lags behind.
+
+When no database named ``READ_REPLICA_ALIAS`` is configured, every read goes
+to the primary. To try it locally with two SQLite files::
+
+    cp db.sqlite3 replica.sqlite3
+    DATABASE_REPLICA_URL=sqlite:///replica.sqlite3 python manage.py runserver
+
+Writes then land in db.sqlite3 only, which makes replica lag easy to see.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'odyssey_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# A session missing on a lagging replica would log the user out (Django
+# drops the cookie), so sessions are always read from the primary.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def replica_alias():
+    """Return the replica's alias, or None if no replica is configured."""
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+    if alias and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Route reads in this block to the replica (if there is one)."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def reads_from_replica(view_func):
+    """Let a function view's GET requests read from the replica."""
+    view_func.use_replica = True
+    return view_func
+
+
+def view_uses_replica(view_func):
+    if getattr(view_func, 'use_replica', False):
+        return True
+    return getattr(getattr(view_func, 'view_class', None), 'use_replica', False)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias and _replica_reads.get() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so saving an object that was read from the replica still
+        # writes to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+
+class RequestScope:
+    """A request's replica scope, switched on by process_view.
+
+    The middleware sets the context variable to this object for the whole
+    request and process_view only flips ``enabled``, so the variable is set
+    and reset in the same context even when process_view runs in a
+    sync_to_async thread under ASGI.
+    """
+
+    def __init__(self):
+        self.enabled = False
+
+    def __bool__(self):
+        return self.enabled
+
+
+class ReplicaRoutingMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.replica_scope = RequestScope()
+        token = _replica_reads.set(request.replica_scope)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        return self.pin_to_primary(request, response)
+
+    async def __acall__(self, request):
+        request.replica_scope = RequestScope()
+        token = _replica_reads.set(request.replica_scope)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        return self.pin_to_primary(request, response)
+
+    def pin_to_primary(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_alias():
+            pin_seconds = getattr(settings, 'READ_REPLICA_PIN_SECONDS', 10)
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=pin_seconds,
+                httponly=True,
+                samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ('GET', 'HEAD')
+            and view_uses_replica(view_func)
+            and PIN_COOKIE not in request.COOKIES
+        ):
+            request.replica_scope.enabled = True
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,12 +50,16 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'accounts.User'
 
 MIDDLEWARE = [
+    'config.middleware.RequestProfilingMiddleware',
+    'config.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'motions.transitions.TransitionActorMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'config.ratelimit.RateLimitMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -75,18 +82,41 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Serve the feed, detail, home and public dashboard pages from their async
+# variants. Only worthwhile under ASGI (see config/gunicorn_conf.py).
+USE_ASYNC_VIEWS = False
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# config.tuned_sqlite is the stock SQLite backend plus WAL mode, a busy
+# timeout and immediate write transactions, so concurrent writers queue
+# instead of failing with "database is locked".
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'config.tuned_sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
 
+# Optional read replica (config/routers.py). Public GET views and exports read
+# from it; writes and everything else use default. Without a replica all
+# reads go to default. After a write the browser is pinned to default for
+# READ_REPLICA_PIN_SECONDS so people see their own changes.
+DATABASE_ROUTERS = ['config.routers.ReplicaRouter']
+READ_REPLICA_ALIAS = 'replica'
+READ_REPLICA_PIN_SECONDS = 10
+
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES[READ_REPLICA_ALIAS] = {
+        **database_config(os.environ['DATABASE_REPLICA_URL'], sqlite_path=None, sqlite_tuning=True),
+        # Tests read and write one database
+        'TEST': {'MIRROR': 'default'},
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -130,6 +160,27 @@ LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
 LOGIN_URL = 'login'
 
+# Look the logged-in user up in the cache (accounts/cache.py) rather than the
+# database on every request. Cached entries are dropped whenever the user
+# row changes. ModelBackend stays listed so sessions created before the
+# switch still resolve; it can go once SESSION_COOKIE_AGE has passed.
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+USER_CACHE_TIMEOUT = 300  # seconds; 0 disables the user cache
+
+# Cache and sessions. cached_db sessions read from the cache and only fall
+# back to the database on a miss; writes go to both. The local-memory cache
+# is per process, so multi-worker deployments need a shared cache (see
+# settings_prod).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Email settings (development - console backend)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'Odyssey <noreply@odyssey-app.com>'
@@ -137,6 +188,76 @@ DEFAULT_FROM_EMAIL = 'Odyssey <noreply@odyssey-app.com>'
 # Site URL for email links
 SITE_URL = 'http://127.0.0.1:8000'
 
+# Per-view query budgets (config/middleware.py). Over-budget requests are
+# logged; with strict budgets they raise QueryBudgetExceeded instead.
+QUERY_BUDGET_STRICT = False
+
+# Metrics endpoint (config/metrics.py). With several worker processes set
+# METRICS_DIR to a writable directory so /metrics can add up every worker's
+# numbers. Set METRICS_TOKEN to require "Authorization: Bearer <token>";
+# without a token /metrics is only served when METRICS_PUBLIC is set.
+METRICS_DIR = None
+METRICS_TOKEN = None
+METRICS_PUBLIC = True
+
+# Vote write-behind buffer (motions/vote_buffer.py). When enabled, votes are
+# coalesced in memory and written in batched upserts every FLUSH_INTERVAL_MS
+# or once MAX_ENTRIES votes are pending. Intended for live council sessions.
+VOTE_BUFFER = {
+    'ENABLED': False,
+    'FLUSH_INTERVAL_MS': 500,
+    'MAX_ENTRIES': 200,
+}
+
+# Background tasks (config/tasks.py). Notifications for published motions
+# and responses are sent after the change commits, by WORKERS threads per
+# process. With ENABLED off they run inline at commit time instead.
+BACKGROUND_TASKS = {
+    'ENABLED': True,
+    'WORKERS': 2,
+    'QUEUE_SIZE': 1000,
+}
+
+# Rate limits (config/ratelimit.py) for views with a rate_limit scope,
+# as "<count>/<s|m|h|d>" per signed-in user and per client IP. Counters live
+# in the default cache, so they are per worker unless the cache is shared.
+# Behind a reverse proxy, RATE_LIMIT_PROXY_COUNT is how many proxies append
+# to X-Forwarded-For; 0 trusts REMOTE_ADDR.
+RATE_LIMIT_ENABLED = True
+RATE_LIMITS = {
+    'vote': {'user': '30/m', 'ip': '120/m'},
+    'comment': {'user': '5/m', 'ip': '30/m'},
+    'motion_create': {'user': '5/h', 'ip': '20/h'},
+}
+RATE_LIMIT_PROXY_COUNT = 0
+
+# Comment moderation (motions/moderation.py). New comments scoring
+# HOLD_SCORE or more stay hidden until approved in the admin moderation
+# queue; FLAG_SCORE or more are shown but queued for review. BLOCKLIST_FILE
+# adds "hold: <term>" / "flag: <term>" lines to the built-in list.
+MODERATION = {
+    'ENABLED': True,
+    'BLOCKLIST_FILE': None,
+    'FLAG_SCORE': 1.0,
+    'HOLD_SCORE': 3.0,
+}
+
+# Realtime motion events (motions/events.py). The in-process backend only
+# reaches streams in the same worker; use motions.events.RedisBackend with
+# OPTIONS={'url': ...} when running more than one worker.
+MOTION_EVENTS = {
+    'BACKEND': 'motions.events.InProcessBackend',
+    'OPTIONS': {},
+    'HEARTBEAT_SECONDS': 15,
+    'MAX_STREAM_SECONDS': 300,
+    'QUEUE_SIZE': 100,
+}
+
+# Archiving (motions/archive.py). manage.py archive_motions moves motions
+# closed (rejected, or delivered) more than ARCHIVE_AFTER_MONTHS ago into the
+# compact read-only ArchivedMotion table.
+ARCHIVE_AFTER_MONTHS = 12
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
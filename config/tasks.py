@@ -0,0 +1,137 @@
+"""
+Background tasks for work a request should not wait for.
+
+``defer(func, *args, **kwargs)`` calls func once the current transaction
+commits (straight away outside one), so slow fan-out such as notifications
+and their emails never runs while the request holds locks, and never runs
+at all for changes that were rolled back. Pass ids rather than model
+instances: the task reads the committed rows itself.
+
+When ``BACKGROUND_TASKS['ENABLED']`` is set, deferred calls are queued for
+``WORKERS`` daemon threads in the same process, each with its own database
+connection. Otherwise they run inline at commit time. Tasks are best-effort,
+like the emails they mostly send: a failure is logged and counted, not
+retried. The queue is per process and held in memory. It is drained when
+the process exits normally, but tasks still queued when a process is killed
+are lost. A full queue runs the task inline rather than dropping it.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from config import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def run(func, args=(), kwargs=None):
+    """Call func, logging and counting rather than raising a failure."""
+    try:
+        func(*args, **(kwargs or {}))
+    except Exception:
+        logger.exception('Background task %s failed', task_name(func))
+        metrics.BACKGROUND_TASKS.inc(task=task_name(func), outcome='failed')
+    else:
+        metrics.BACKGROUND_TASKS.inc(task=task_name(func), outcome='ok')
+
+
+class TaskRunner:
+    """A bounded queue of calls worked through by a few daemon threads."""
+
+    def __init__(self, workers=2, queue_size=1000):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def submit(self, func, args=(), kwargs=None):
+        # Checked and queued under the lock, so nothing is queued behind the
+        # stop markers close() puts on the queue.
+        with self._lock:
+            if not self._stopped:
+                self._ensure_workers()
+                try:
+                    self._queue.put_nowait((func, args, kwargs))
+                except queue.Full:
+                    logger.warning('Background task queue full; running %s inline', task_name(func))
+                else:
+                    metrics.BACKGROUND_TASKS_PENDING.set(self._queue.qsize())
+                    return
+        run(func, args, kwargs)
+
+    def close(self, timeout=30):
+        """Finish the queued tasks and stop the workers; later tasks run inline."""
+        with self._lock:
+            self._stopped = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put((None, None, None))
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def _ensure_workers(self):
+        # Called with the lock held.
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._run, name=f'background-tasks-{len(self._threads)}', daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+            metrics.BACKGROUND_TASKS_PENDING.set(self._queue.qsize())
+            if func is None:
+                return
+            try:
+                run(func, args, kwargs)
+            finally:
+                # Each worker owns its own connection; don't hold it open
+                # between tasks.
+                connection.close()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_task_runner():
+    """Return the process-wide task runner, or None if tasks run inline."""
+    global _runner
+
+    config = getattr(settings, 'BACKGROUND_TASKS', {})
+    if not config.get('ENABLED'):
+        return None
+
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = TaskRunner(
+                    workers=config.get('WORKERS', 2),
+                    queue_size=config.get('QUEUE_SIZE', 1000),
+                )
+                atexit.register(_runner.close)
+    return _runner
+
+
+def defer(func, *args, **kwargs):
+    """Run func(*args, **kwargs) in the background once the transaction commits."""
+    def submit():
+        runner = get_task_runner()
+        if runner is None:
+            run(func, args, kwargs)
+        else:
+            runner.submit(func, args, kwargs)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,93 @@
+"""
+Shared test helpers.
+
+``QueryBudgetTestCase`` is the base for each app's query budget tests: it
+turns on ``QUERY_BUDGET_STRICT``, so going over budget fails the request,
+and logs ``user`` in. Subclasses create ``cls.user`` and the data in
+setUpTestData and call ``assertWithinBudget`` for each view.
+
+``async_views()`` routes the URLs to the async views, as
+``USE_ASYNC_VIEWS=True`` does when the URLconfs are first imported;
+``async_views(False)`` to the sync ones.
+
+``ReplicaTestCase`` adds a second, separate SQLite test database under
+``READ_REPLICA_ALIAS`` for the length of the class, so tests can see which
+database a read or write actually reached. Its tables are created from the
+models; nothing is copied from the primary.
+"""
+import importlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase, override_settings
+from django.urls import clear_url_caches
+
+# URLconfs that pick their views from USE_ASYNC_VIEWS
+ASYNC_URLCONFS = ('dashboard.urls', 'motions.urls')
+
+
+@contextmanager
+def async_views(enabled=True):
+    """Serve the async (or with enabled False, the sync) views inside the block."""
+    def reload():
+        # The root URLconf last: its include()s hold the resolved patterns.
+        for name in (*ASYNC_URLCONFS, settings.ROOT_URLCONF):
+            importlib.reload(importlib.import_module(name))
+        clear_url_caches()
+
+    try:
+        with override_settings(USE_ASYNC_VIEWS=enabled):
+            reload()
+            yield
+    finally:
+        reload()
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTestCase(TestCase):
+    """Each view must stay within its declared query budget."""
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertWithinBudget(self, url, data=None, method='get', status=200):
+        """Request url and check the view declares a budget and kept to it."""
+        response = getattr(self.client, method)(url, data)
+        self.assertEqual(response.status_code, status)
+        self.assertIsNotNone(response.wsgi_request.profile.budget, f'{url} has no query budget')
+        return response
+
+
+class ReplicaTestCase(TestCase):
+    """A TestCase with a real replica database next to the primary."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Only named in ``databases`` once it exists: the test runner checks
+        # every alias the collected tests use before any class is set up.
+        alias = settings.READ_REPLICA_ALIAS
+        cls.databases = {DEFAULT_DB_ALIAS, alias}
+        replica = {'ENGINE': 'config.tuned_sqlite', 'NAME': ':memory:', 'TEST': {'MIGRATE': False}}
+        connections.configure_settings({DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS], alias: replica})
+        connections.settings[alias] = replica
+        connections[alias].creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._drop_replica()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls._drop_replica()
+
+    @classmethod
+    def _drop_replica(cls):
+        alias = settings.READ_REPLICA_ALIAS
+        connections[alias].creation.destroy_test_db(verbosity=0)
+        del connections[alias]
+        del connections.settings[alias]
@@ -0,0 +1,64 @@
+"""
+SQLite backend tuned for a small production site with concurrent writers.
+
+Applied to every new connection:
+
+* ``journal_mode=WAL``: readers no longer block the writer or vice versa.
+* ``synchronous=NORMAL``: with WAL, only a power loss (not a crash) can lose
+  the last transactions; commits no longer fsync every time.
+* ``busy_timeout``: wait for the write lock instead of failing at once with
+  "database is locked".
+* ``mmap_size`` and ``cache_size``: serve hot pages from memory.
+
+Transactions opened by ``atomic()`` start with ``BEGIN IMMEDIATE``. A default
+(deferred) transaction that reads first and then writes has to upgrade its
+lock mid-transaction; if another connection is writing, SQLite fails that
+upgrade straight away without honouring busy_timeout. Taking the write lock
+at BEGIN makes those transactions queue instead.
+
+PRAGMA values can be overridden with ``OPTIONS['pragmas']`` and the BEGIN
+mode with ``OPTIONS['transaction_mode']`` (DEFERRED, IMMEDIATE or EXCLUSIVE).
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms
+    'mmap_size': 128 * 1024 * 1024,  # bytes
+    'cache_size': -64000,  # negative = KiB, so 64 MB
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    @property
+    def pragmas(self):
+        return {**DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode', 'IMMEDIATE').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode must be one of {", ".join(TRANSACTION_MODES)}, not "{mode}"'
+            )
+        return mode
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -2,9 +2,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('dashboard.urls')),
     path('accounts/', include('accounts.urls')),
     path('motions/', include('motions.urls')),
+    path('notifications/', include('notifications.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
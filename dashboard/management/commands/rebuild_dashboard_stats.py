@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from config import metrics
+from dashboard.models import PartitionStat
+from dashboard.stats import compute, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the per-LGA and per-jurisdiction owner dashboard statistics from '
+        'scratch, correcting any drift in the incrementally maintained counts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many stored counts are wrong without fixing them',
+        )
+
+    @metrics.COMMAND_DURATION.time(command='rebuild_dashboard_stats')
+    def handle(self, *args, **options):
+        stored = {
+            (lga, jurisdiction, metric): value
+            for lga, jurisdiction, metric, value in PartitionStat.objects.values_list(
+                'lga', 'jurisdiction', 'metric', 'value',
+            )
+        }
+        fresh = compute() if options['dry_run'] else rebuild()
+        wrong = sum(
+            1 for key in stored.keys() | fresh.keys()
+            if stored.get(key, 0) != fresh.get(key, 0)
+        )
+        verb = 'Found' if options['dry_run'] else 'Corrected'
+        partitions = len({key[:2] for key in fresh})
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {wrong:,} wrong counts across {partitions:,} partitions'
+        ))
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:08
+
+from django.db import migrations, models
+
+
+def build_partition_stats(apps, schema_editor):
+    from dashboard.stats import rebuild
+    rebuild(
+        stat_model=apps.get_model('dashboard', 'PartitionStat'),
+        motion_model=apps.get_model('motions', 'Motion'),
+        response_model=apps.get_model('motions', 'MotionResponse'),
+        archive_model=None,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        ('motions', '0005_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartitionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lga', models.CharField(max_length=20)),
+                ('jurisdiction', models.CharField(max_length=20)),
+                ('metric', models.CharField(max_length=40)),
+                ('value', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='partitionstat',
+            constraint=models.UniqueConstraint(fields=('lga', 'jurisdiction', 'metric'), name='partition_stat_unique'),
+        ),
+        migrations.RunPython(build_partition_stats, migrations.RunPython.noop),
+    ]
@@ -22,3 +22,23 @@ class Announcement(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class PartitionStat(models.Model):
+    """One running count for one (LGA, jurisdiction) partition of motions.
+
+    Maintained incrementally by dashboard/stats.py; see there for the metrics.
+    """
+
+    lga = models.CharField(max_length=20)
+    jurisdiction = models.CharField(max_length=20)
+    metric = models.CharField(max_length=40)
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lga', 'jurisdiction', 'metric'], name='partition_stat_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.lga}/{self.jurisdiction} {self.metric}={self.value}'
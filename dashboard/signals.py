@@ -0,0 +1,75 @@
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from motions.models import Motion, MotionResponse
+
+from . import stats
+
+
+@receiver(pre_save, sender=Motion)
+def remember_motion_state(sender, instance, raw=False, **kwargs):
+    """Read the stored row so the save can apply just the difference.
+
+    Read from the database rather than kept from load time, so a stale
+    in-memory copy (another request changed the motion since) still
+    produces the right deltas.
+    """
+    instance._stats_old = None
+    if raw or stats.is_paused() or instance._state.adding:
+        return
+    instance._stats_old = Motion.objects.filter(pk=instance.pk).values_list(*stats.STATE_FIELDS).first()
+
+
+@receiver(post_save, sender=Motion)
+def motion_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or stats.is_paused():
+        return
+    old = getattr(instance, '_stats_old', None)
+    new = tuple(getattr(instance, name) for name in stats.STATE_FIELDS)
+
+    deltas = stats.diff(
+        stats.motion_metrics(*old[:4]) if old else Counter(),
+        stats.motion_metrics(*new[:4]),
+    )
+    # A responded motion moving partition (or publication date) takes its
+    # response time with it.
+    if old and old[2] in stats.RESPONDED and (old[:2] != new[:2] or old[4] != new[4]):
+        responded_at = MotionResponse.objects.filter(motion=instance).values_list('created_at', flat=True).first()
+        if responded_at is not None:
+            deltas.update(stats.response_metrics(*new[:2], new[4], responded_at))
+            deltas.subtract(stats.response_metrics(*old[:2], old[4], responded_at))
+    stats.apply(deltas)
+
+
+@receiver(post_delete, sender=Motion)
+def motion_deleted(sender, instance, **kwargs):
+    if stats.is_paused():
+        return
+    deferred = instance.get_deferred_fields()
+    if deferred.intersection(stats.STATE_FIELDS):
+        # The row is gone, so the deleted values cannot be read back.
+        stats.rebuild([(instance.lga, instance.jurisdiction)] if not deferred & {'lga', 'jurisdiction'} else None)
+        return
+    deltas = Counter()
+    deltas.subtract(stats.motion_metrics(instance.lga, instance.jurisdiction, instance.status, instance.delivery_status))
+    stats.apply(deltas)
+
+
+@receiver(post_save, sender=MotionResponse)
+def response_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not stats.is_paused():
+        motion = instance.motion
+        stats.apply(stats.response_metrics(motion.lga, motion.jurisdiction, motion.published_at, instance.created_at))
+
+
+@receiver(post_delete, sender=MotionResponse)
+def response_deleted(sender, instance, **kwargs):
+    if stats.is_paused():
+        return
+    motion = Motion.objects.filter(pk=instance.motion_id).values_list('lga', 'jurisdiction', 'published_at').first()
+    if motion:
+        deltas = Counter()
+        deltas.subtract(stats.response_metrics(*motion, instance.created_at))
+        stats.apply(deltas)
@@ -0,0 +1,252 @@
+"""
+Per-partition motion statistics for the owner dashboard.
+
+A partition is one (lga, jurisdiction) pair. ``PartitionStat`` holds running
+counts per partition, so the owner dashboard reads a few dozen small rows
+instead of scanning motions and responses on every load:
+
+* ``status:<status>``: motions in each status other than draft;
+* ``delivery:<delivery_status>``: accepted and modified motions by delivery
+  status;
+* ``response_days:<n>``: responses given ``n`` whole days after the motion
+  was published, a histogram the median response time is read from.
+
+The handlers in dashboard/signals.py apply the difference whenever a motion
+or response is saved or deleted, as ``F()`` increments so concurrent writers
+never lose a count. ``QuerySet.update()`` and ``bulk_create()`` skip
+signals, so code using them calls ``rebuild()`` for the partitions it
+touched, and bulk jobs can skip the per-row work inside ``paused()`` and
+rebuild once at the end. ``manage.py rebuild_dashboard_stats`` recomputes
+everything, for the rare drift from two people editing the same motion at
+once.
+"""
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from motions.models import ArchivedMotion, Motion, MotionResponse
+
+from .models import PartitionStat
+
+PENDING = (Motion.Status.PUBLISHED, Motion.Status.UNDER_REVIEW)
+RESPONDED = (Motion.Status.ACCEPTED, Motion.Status.MODIFIED, Motion.Status.REJECTED)
+DELIVERING = (Motion.Status.ACCEPTED, Motion.Status.MODIFIED)
+
+RESPONSE_DAYS = 'response_days:'
+
+# The Motion fields the statistics depend on.
+STATE_FIELDS = ('lga', 'jurisdiction', 'status', 'delivery_status', 'published_at')
+
+_paused = contextvars.ContextVar('dashboard_stats_paused', default=False)
+
+
+@contextmanager
+def paused():
+    """Skip incremental updates in this block; call rebuild() afterwards."""
+    token = _paused.set(True)
+    try:
+        yield
+    finally:
+        _paused.reset(token)
+
+
+def is_paused():
+    return _paused.get()
+
+
+def motion_metrics(lga, jurisdiction, status, delivery_status):
+    """{(lga, jurisdiction, metric): 1} for one motion's counts."""
+    if status == Motion.Status.DRAFT:
+        return Counter()
+    metrics = Counter({(lga, jurisdiction, f'status:{status}'): 1})
+    if status in DELIVERING:
+        metrics[(lga, jurisdiction, f'delivery:{delivery_status}')] += 1
+    return metrics
+
+
+def response_metrics(lga, jurisdiction, published_at, responded_at):
+    if published_at is None:
+        return Counter()
+    days = max((responded_at - published_at).days, 0)
+    return Counter({(lga, jurisdiction, f'{RESPONSE_DAYS}{days}'): 1})
+
+
+def apply(deltas):
+    """Add each delta to its PartitionStat, creating rows as needed."""
+    for (lga, jurisdiction, metric), delta in deltas.items():
+        if not delta:
+            continue
+        rows = PartitionStat.objects.filter(lga=lga, jurisdiction=jurisdiction, metric=metric)
+        if rows.update(value=F('value') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                PartitionStat.objects.create(lga=lga, jurisdiction=jurisdiction, metric=metric, value=delta)
+        except IntegrityError:
+            # Another writer created the row first.
+            rows.update(value=F('value') + delta)
+
+
+def diff(old, new):
+    """Deltas turning the old metric counts into the new ones."""
+    deltas = Counter(new)
+    deltas.subtract(old)
+    return deltas
+
+
+def compute(motion_model=Motion, response_model=MotionResponse, archive_model=ArchivedMotion, partitions=None):
+    """Count every metric from scratch; partitions limits it to those (lga, jurisdiction) pairs.
+
+    Archived motions count like live ones. Takes the models as arguments so
+    migrations can pass historical ones (archive_model=None before the
+    archive existed).
+    """
+    motions = motion_model.objects.exclude(status=Motion.Status.DRAFT)
+    responses = response_model.objects.filter(motion__published_at__isnull=False)
+    archived = archive_model.objects.all() if archive_model is not None else None
+    if partitions is not None:
+        if not partitions:
+            return Counter()
+        match = Q()
+        for lga, jurisdiction in partitions:
+            match |= Q(lga=lga, jurisdiction=jurisdiction)
+        motions = motions.filter(match)
+        responses = responses.filter(motion__in=motion_model.objects.filter(match))
+        if archived is not None:
+            archived = archived.filter(match)
+
+    counts = Counter()
+    grouped = [motions]
+    if archived is not None:
+        grouped.append(archived)
+    for queryset in grouped:
+        rows = (
+            queryset.order_by()
+            .values_list('lga', 'jurisdiction', 'status', 'delivery_status')
+            .annotate(total=Count('pk'))
+        )
+        for lga, jurisdiction, status, delivery_status, total in rows:
+            for key, value in motion_metrics(lga, jurisdiction, status, delivery_status).items():
+                counts[key] += value * total
+    # Day differences are not portable SQL, so these are counted here.
+    rows = [responses.values_list('motion__lga', 'motion__jurisdiction', 'motion__published_at', 'created_at')]
+    if archived is not None:
+        rows.append(
+            archived.filter(published_at__isnull=False, responded_at__isnull=False)
+            .values_list('lga', 'jurisdiction', 'published_at', 'responded_at')
+        )
+    for queryset in rows:
+        for row in queryset.order_by().iterator(chunk_size=2000):
+            counts.update(response_metrics(*row))
+    return counts
+
+
+def rebuild(partitions=None, stat_model=PartitionStat, **models):
+    """Replace the stored counts (for the given partitions, or all) with fresh ones."""
+    counts = compute(partitions=partitions, **models)
+    with transaction.atomic():
+        stored = stat_model.objects.all()
+        if partitions is not None:
+            match = Q(pk__in=[])
+            for lga, jurisdiction in partitions:
+                match |= Q(lga=lga, jurisdiction=jurisdiction)
+            stored = stored.filter(match)
+        stored.delete()
+        stat_model.objects.bulk_create([
+            stat_model(lga=lga, jurisdiction=jurisdiction, metric=metric, value=value)
+            for (lga, jurisdiction, metric), value in counts.items() if value
+        ])
+    return counts
+
+
+def rebuild_for(queryset):
+    """Rebuild the partitions of the motions in queryset, after a bulk update."""
+    rebuild(set(queryset.order_by().values_list('lga', 'jurisdiction').distinct()))
+
+
+def public_rows():
+    """The status and delivery counts of every partition, for public_totals()."""
+    return PartitionStat.objects.filter(
+        Q(metric__startswith='status:') | Q(metric__startswith='delivery:'),
+    ).values_list('lga', 'jurisdiction', 'metric', 'value')
+
+
+def public_totals(rows):
+    """Public dashboard figures from public_rows(): overall, by LGA and by jurisdiction."""
+    overall, by_lga, by_jurisdiction = Counter(), Counter(), Counter()
+    for lga, jurisdiction, metric, value in rows:
+        overall[metric] += value
+        by_lga[lga, metric] += value
+        by_jurisdiction[jurisdiction, metric] += value
+
+    published = f'status:{Motion.Status.PUBLISHED}'
+    total = overall[published]
+    responded = sum(overall[f'status:{status}'] for status in RESPONDED)
+    return {
+        'total_motions': total,
+        'response_rate': round(responded / total * 100) if total else 0,
+        'status_counts': {
+            **{status: overall[f'status:{status}'] for status in RESPONDED},
+            'pending': sum(overall[f'status:{status}'] for status in PENDING),
+        },
+        'delivery_counts': {
+            status: overall[f'delivery:{status}']
+            for status in Motion.DeliveryStatus.values if status != Motion.DeliveryStatus.NOT_STARTED
+        },
+        'lga_stats': [
+            {
+                'name': name,
+                'code': code,
+                'total': by_lga[code, published],
+                'responded': sum(by_lga[code, f'status:{status}'] for status in RESPONDED),
+            }
+            for code, name in Motion._meta.get_field('lga').choices
+        ],
+        'jurisdiction_stats': {
+            jurisdiction: by_jurisdiction[jurisdiction, published] for jurisdiction in Motion.Jurisdiction.values
+        },
+    }
+
+
+def median(histogram):
+    """Median of a {value: count} histogram, or None if it is empty."""
+    values = sorted(histogram)
+    total = sum(histogram.values())
+    if not total:
+        return None
+
+    def nth(n):
+        seen = 0
+        for value in values:
+            seen += histogram[value]
+            if n < seen:
+                return value
+
+    return (nth((total - 1) // 2) + nth(total // 2)) / 2
+
+
+def summarize(lga, jurisdictions=None):
+    """Dashboard totals for an LGA, optionally only some jurisdictions. One query."""
+    rows = PartitionStat.objects.filter(lga=lga)
+    if jurisdictions is not None:
+        rows = rows.filter(jurisdiction__in=jurisdictions)
+    totals = Counter()
+    for metric, value in rows.values_list('metric', 'value'):
+        totals[metric] += value
+
+    statuses = {status: totals[f'status:{status}'] for status in Motion.Status.values if status != Motion.Status.DRAFT}
+    response_days = {
+        int(metric[len(RESPONSE_DAYS):]): value
+        for metric, value in totals.items() if metric.startswith(RESPONSE_DAYS) and value > 0
+    }
+    return {
+        'statuses': statuses,
+        'pending': sum(statuses[status] for status in PENDING),
+        'responded': sum(statuses[status] for status in RESPONDED),
+        'delivery': {status: totals[f'delivery:{status}'] for status in Motion.DeliveryStatus.values},
+        'median_response_days': median(response_days),
+        'responses_timed': sum(response_days.values()),
+    }
@@ -1,3 +1,235 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from accounts.models import User
+from config import metrics
+from config.testing import QueryBudgetTestCase, async_views
+from motions.models import Motion, MotionResponse
+from .models import PartitionStat
+from .views import AsyncHomeView, AsyncPublicDashboardView, HomeView, PublicDashboardView
+from .stats import compute, median, summarize
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('youth', password='pass', lga='newcastle')
+        owner = User.objects.create_user('owner', password='pass', lga='lake_macquarie', role='owner')
+        for i, lga in enumerate(['newcastle', 'lake_macquarie', 'port_stephens'] * 3):
+            motion = Motion.objects.create(
+                title=f'Motion {i}', evidence='Evidence', proposed_action='Action',
+                resource_ask='Ask', success_measures='Measures', lga=lga,
+                author=cls.user, status='published',
+            )
+            if i % 2:
+                MotionResponse.objects.create(
+                    motion=motion, accountable_owner=owner, decision='accept', reasons='Reasons',
+                )
+
+    def test_home(self):
+        self.assertWithinBudget(reverse('home'))
+
+    def test_public_dashboard(self):
+        self.assertWithinBudget(reverse('public_dashboard'))
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class AsyncViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('youth', password='pass', lga='newcastle')
+        owner = User.objects.create_user('owner', password='pass', lga='newcastle', role='owner')
+        for i in range(3):
+            motion = Motion.objects.create(
+                title=f'Motion {i}', evidence='Evidence', proposed_action='Action',
+                resource_ask='Ask', success_measures='Measures', lga='newcastle',
+                author=cls.user, status='published', published_at=timezone.now(),
+            )
+        MotionResponse.objects.create(
+            motion=motion, accountable_owner=owner, decision='accept', reasons='Reasons',
+        )
+
+    def setUp(self):
+        self.async_client.force_login(self.user)
+
+    def test_switch(self):
+        with async_views(False):
+            self.assertIs(resolve(reverse('home')).func.view_class, HomeView)
+            self.assertIs(resolve(reverse('public_dashboard')).func.view_class, PublicDashboardView)
+        with async_views():
+            self.assertIs(resolve(reverse('home')).func.view_class, AsyncHomeView)
+            self.assertIs(resolve(reverse('public_dashboard')).func.view_class, AsyncPublicDashboardView)
+
+    async def test_home(self):
+        with async_views():
+            response = await self.async_client.get(reverse('home'))
+            self.assertTrue(response.resolver_match.func.view_class.view_is_async)
+            self.assertEqual(response.context['total_motions'], 3)
+            self.assertEqual(response.context['total_responses'], 1)
+            self.assertEqual(len(response.context['recent_motions']), 3)
+
+    async def test_public_dashboard(self):
+        with async_views():
+            response = await self.async_client.get(reverse('public_dashboard'))
+            self.assertTrue(response.resolver_match.func.view_class.view_is_async)
+            self.assertContains(response, 'Motion 2')
+            self.assertEqual(len(response.context['recent_responses']), 1)
+
+
+class MetricsEndpointTests(TestCase):
+
+    def test_request_metrics_are_exposed(self):
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'odyssey_request_duration_seconds_count{view="home",method="GET",status="200"}')
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None, METRICS_PUBLIC=False)
+    def test_disabled_without_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    def test_exited_processes_are_folded_into_one_file(self):
+        finished = subprocess.Popen(['true'])
+        finished.wait()
+        votes = metrics.VOTES.key({'mode': 'direct'})
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            pid, start = metrics.process_identity()
+
+            def snapshot(pid, start, value):
+                with open(os.path.join(directory, f'metrics_{pid}_{start}.json'), 'w') as f:
+                    json.dump({'pid': pid, 'start': start, 'metrics': {
+                        'odyssey_votes_total': {votes: value},
+                        'odyssey_vote_buffer_pending': {'[]': 100},
+                    }}, f)
+
+            # An earlier process with this process's pid, and an exited one.
+            snapshot(pid, start - 1, 5)
+            snapshot(finished.pid, start, 3)
+            own = metrics.REGISTRY.state()
+            collected = metrics.REGISTRY.collect()
+            self.assertEqual(collected['odyssey_votes_total'][votes], own['odyssey_votes_total'].get(votes, 0) + 8)
+            self.assertEqual(
+                collected.get('odyssey_vote_buffer_pending', {}).get('[]'),
+                own['odyssey_vote_buffer_pending'].get('[]'),
+            )
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if name.endswith('.json')),
+                ['merged.json', f'metrics_{pid}_{start}.json'],
+            )
+            # Later scrapes count the folded values once.
+            metrics.VOTES.inc(mode='direct')
+            self.assertEqual(metrics.REGISTRY.collect()['odyssey_votes_total'][votes], collected['odyssey_votes_total'][votes] + 1)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class OwnerDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.youth = User.objects.create_user('youth', password='pass', lga='newcastle')
+        cls.owner = User.objects.create_user('owner', password='pass', lga='newcastle', role='owner')
+
+    def setUp(self):
+        cache.clear()
+
+    def motion(self, title, **fields):
+        fields = {'lga': 'newcastle', 'status': 'published', 'published_at': timezone.now(), **fields}
+        return Motion.objects.create(
+            title=title, evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+            success_measures='Measures', author=self.youth, **fields,
+        )
+
+    def stored(self):
+        return {
+            (lga, jurisdiction, metric): value
+            for lga, jurisdiction, metric, value in PartitionStat.objects.exclude(value=0).values_list(
+                'lga', 'jurisdiction', 'metric', 'value',
+            )
+        }
+
+    def test_counts_follow_changes(self):
+        now = timezone.now()
+        overdue = self.motion('Overdue bus shelter', response_deadline=now - timedelta(days=2))
+        self.motion('Skate park lights', response_deadline=now + timedelta(days=20))
+        self.motion('State rail fares', jurisdiction='state')
+        self.motion('Draft idea', status='draft')
+        self.motion('Beach access', lga='port_stephens')
+        slow = self.motion('Library hours', published_at=now - timedelta(days=10))
+
+        self.client.force_login(self.owner)
+        self.client.post(reverse('motion_respond', args=[slow.pk]), {
+            'decision': 'accept', 'reasons': 'Yes', 'milestones-TOTAL_FORMS': '0', 'milestones-INITIAL_FORMS': '0',
+        })
+        slow.refresh_from_db()
+        slow.delivery_status = Motion.DeliveryStatus.ON_TRACK
+        slow.save()
+        slow.jurisdiction = 'state'
+        slow.save()
+        overdue.delete()
+        self.assertEqual(self.stored(), {key: value for key, value in compute().items() if value})
+
+        summary = summarize('newcastle')
+        self.assertEqual((summary['pending'], summary['responded']), (2, 1))
+        self.assertEqual(summary['delivery']['on_track'], 1)
+        self.assertEqual(summary['median_response_days'], 10)
+        self.assertEqual(summarize('newcastle', ['local'])['pending'], 1)
+
+        # Bulk admin updates rebuild the partitions they touched.
+        admin = User.objects.create_superuser('council_admin', 'council@example.com', 'pass', lga='newcastle')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:motions_motion_changelist'), {
+            'action': 'mark_completed', '_selected_action': [slow.pk],
+        })
+        self.assertEqual(summarize('newcastle')['delivery'], {
+            'not_started': 0, 'on_track': 0, 'delayed': 0, 'completed': 1,
+        })
+
+    def test_median(self):
+        self.assertIsNone(median({}))
+        self.assertEqual(median({1: 1, 5: 1}), 3)
+        self.assertEqual(median({0: 2, 4: 1, 9: 1}), 2)
+
+    def test_owner_dashboard(self):
+        now = timezone.now()
+        self.motion('Overdue bus shelter', response_deadline=now - timedelta(days=2))
+        self.motion('Skate park lights', response_deadline=now + timedelta(days=20))
+        self.motion('Beach access', lga='port_stephens')
+
+        self.client.force_login(self.youth)
+        self.assertEqual(self.client.get(reverse('owner_dashboard')).status_code, 403)
+
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('owner_dashboard'))
+        self.assertContains(response, 'Overdue since')
+        self.assertContains(response, 'Skate park lights')
+        self.assertNotContains(response, 'Beach access')
+        self.assertEqual((response.context['stats']['pending'], response.context['overdue_count']), (2, 1))
+        self.assertContains(response, 'Response Times')
+
+    def test_superuser_without_lga(self):
+        self.motion('Skate park lights')
+        self.motion('Beach access', lga='port_stephens')
+        superuser = User.objects.create_superuser('root', 'root@example.com', 'pass')
+        self.assertEqual(superuser.lga, '')
+        self.client.force_login(superuser)
+
+        response = self.client.get(reverse('owner_dashboard'))
+        self.assertEqual(response.context['lga'], User.LGA.values[0])
+        response = self.client.get(reverse('owner_dashboard'), {'lga': 'port_stephens'})
+        self.assertContains(response, 'Beach access')
@@ -1,7 +1,16 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.USE_ASYNC_VIEWS:
+    home_view = views.AsyncHomeView
+    public_dashboard_view = views.AsyncPublicDashboardView
+else:
+    home_view = views.HomeView
+    public_dashboard_view = views.PublicDashboardView
+
 urlpatterns = [
-    path('', views.HomeView.as_view(), name='home'),
-    path('dashboard/', views.PublicDashboardView.as_view(), name='public_dashboard'),
+    path('', home_view.as_view(), name='home'),
+    path('dashboard/', public_dashboard_view.as_view(), name='public_dashboard'),
+    path('dashboard/owner/', views.OwnerDashboardView.as_view(), name='owner_dashboard'),
 ]
@@ -1,14 +1,34 @@
+import asyncio
+from itertools import chain
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.cache import cache
 from django.shortcuts import render
 from django.views.generic import TemplateView
-from django.db.models import Count, Q, Avg
+from django.db.models import Count, F, Q, Avg
 from django.utils import timezone
 from datetime import timedelta
-from motions.models import Motion, MotionResponse
+from accounts.models import User
+from motions.analytics import response_latency
+from motions.models import ArchivedMotion, Milestone, Motion, MotionResponse
+from motions.services import RESPONSE_DEADLINE_DAYS
+from . import stats
 from .models import Announcement
 
+OWNER_QUEUE_SIZE = 25
+# Response-time distributions change slowly and scan the LGA's responses.
+RESPONSE_TIMES_CACHE_SECONDS = 600
+RESPONSE_TIMES_MONTHS = 12
+
+
+def archived_responses():
+    return ArchivedMotion.objects.filter(responded_at__isnull=False)
+
 
 class HomeView(TemplateView):
     template_name = 'dashboard/home.html'
+    query_budget = 7
+    use_replica = True
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -27,73 +47,166 @@ class HomeView(TemplateView):
 
         # Quick stats
         context['total_motions'] = Motion.objects.filter(status='published').count()
-        context['total_responses'] = MotionResponse.objects.count()
+        context['total_responses'] = MotionResponse.objects.count() + archived_responses().count()
 
         return context
 
 
+class AsyncHomeView(HomeView):
+    """HomeView on the async ORM, with its five queries gathered together.
+
+    On Django 4.2 the async ORM runs each query through
+    sync_to_async(thread_sensitive=True), so gathered queries still run one
+    after another on a single thread rather than concurrently.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        recent_motions, announcements, total_motions, responses, archived = await asyncio.gather(
+            alist(Motion.objects.filter(status='published').order_by('-published_at')[:5]),
+            alist(Announcement.objects.filter(is_pinned=True).filter(
+                Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+            )[:3]),
+            Motion.objects.filter(status='published').acount(),
+            MotionResponse.objects.acount(),
+            archived_responses().acount(),
+        )
+
+        context = {
+            'recent_motions': recent_motions,
+            'announcements': announcements,
+            'total_motions': total_motions,
+            'total_responses': responses + archived,
+        }
+        return await sync_to_async(render)(request, self.template_name, context)
+
+
 class PublicDashboardView(TemplateView):
+    """Public totals, read from the precomputed per-partition counts in
+    dashboard/stats.py, so archived motions keep counting."""
     template_name = 'dashboard/public_dashboard.html'
+    query_budget = 4
+    use_replica = True
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context.update(stats.public_totals(stats.public_rows()))
 
-        # Overall stats
-        published_motions = Motion.objects.filter(status='published')
-        context['total_motions'] = published_motions.count()
+        # Recent responses
+        context['recent_responses'] = MotionResponse.objects.select_related(
+            'motion', 'accountable_owner'
+        ).order_by('-created_at')[:5]
 
-        # Response statistics
-        motions_with_response = Motion.objects.exclude(
-            status__in=['draft', 'published', 'under_review']
-        ).count()
+        return context
 
-        if context['total_motions'] > 0:
-            context['response_rate'] = round(
-                (motions_with_response / context['total_motions']) * 100
-            )
-        else:
-            context['response_rate'] = 0
-
-        # Motions by status with traffic light
-        context['status_counts'] = {
-            'accepted': Motion.objects.filter(status='accepted').count(),
-            'modified': Motion.objects.filter(status='modified').count(),
-            'rejected': Motion.objects.filter(status='rejected').count(),
-            'pending': Motion.objects.filter(status__in=['published', 'under_review']).count(),
-        }
 
-        # Delivery status breakdown
-        context['delivery_counts'] = {
-            'on_track': Motion.objects.filter(delivery_status='on_track').count(),
-            'delayed': Motion.objects.filter(delivery_status='delayed').count(),
-            'completed': Motion.objects.filter(delivery_status='completed').count(),
-        }
+class AsyncPublicDashboardView(PublicDashboardView):
+    """PublicDashboardView on the async ORM, with its two queries gathered together.
 
-        # By LGA
-        context['lga_stats'] = []
-        for lga_code, lga_name in [('newcastle', 'Newcastle'), ('lake_macquarie', 'Lake Macquarie'), ('port_stephens', 'Port Stephens')]:
-            lga_motions = Motion.objects.filter(lga=lga_code, status='published')
-            lga_responded = Motion.objects.filter(
-                lga=lga_code
-            ).exclude(status__in=['draft', 'published', 'under_review']).count()
-
-            context['lga_stats'].append({
-                'name': lga_name,
-                'code': lga_code,
-                'total': lga_motions.count(),
-                'responded': lga_responded,
-            })
-
-        # By Jurisdiction
-        context['jurisdiction_stats'] = {
-            'local': Motion.objects.filter(jurisdiction='local', status='published').count(),
-            'state': Motion.objects.filter(jurisdiction='state', status='published').count(),
-            'federal': Motion.objects.filter(jurisdiction='federal', status='published').count(),
-        }
+    As in AsyncHomeView, they do not run concurrently on Django 4.2.
+    """
 
-        # Recent responses
-        context['recent_responses'] = MotionResponse.objects.select_related(
-            'motion', 'accountable_owner'
-        ).order_by('-created_at')[:5]
+    async def get(self, request, *args, **kwargs):
+        rows, recent_responses = await asyncio.gather(
+            alist(stats.public_rows()),
+            alist(MotionResponse.objects.select_related(
+                'motion', 'accountable_owner'
+            ).order_by('-created_at')[:5]),
+        )
+        context = {
+            **stats.public_totals(rows),
+            'recent_responses': recent_responses,
+        }
+        return await sync_to_async(render)(request, self.template_name, context)
+
+
+class OwnerDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """What is waiting on an accountable owner: their LGA's pending queue,
+    overdue motions and milestones, recent responses and response-time
+    statistics.
+
+    The totals come from the precomputed per-partition counts in
+    dashboard/stats.py; only the queues read motions, through
+    motion_queue_idx.
+    """
+    template_name = 'dashboard/owner_dashboard.html'
+    query_budget = 12  # 7 while the response times are cached
+    use_replica = True
+
+    def test_func(self):
+        user = self.request.user
+        return user.is_accountable_owner or user.is_admin or user.is_staff
+
+    def response_times(self, lga, jurisdiction, now):
+        def compute():
+            since = timezone.localtime(now - timedelta(days=31 * RESPONSE_TIMES_MONTHS)).replace(
+                day=1, hour=0, minute=0, second=0, microsecond=0,
+            )
+            return {
+                'jurisdiction': [] if jurisdiction else response_latency('jurisdiction', lga=lga),
+                'owner': response_latency('owner', lga=lga, jurisdiction=jurisdiction),
+                'month': sorted(
+                    response_latency('month', lga=lga, jurisdiction=jurisdiction, since=since),
+                    key=lambda row: row['group'],
+                ),
+            }
+        key = f'response_times:{lga}:{jurisdiction or "all"}'
+        return cache.get_or_set(key, compute, RESPONSE_TIMES_CACHE_SECONDS)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user = self.request.user
+        now = timezone.now()
+
+        # Admins can look at any LGA; owners see their own.
+        lga = user.lga
+        if (user.is_admin or user.is_staff) and self.request.GET.get('lga') in User.LGA.values:
+            lga = self.request.GET['lga']
+        elif lga not in User.LGA.values:
+            # Superusers made by createsuperuser have no LGA.
+            lga = User.LGA.values[0]
+        jurisdiction = self.request.GET.get('jurisdiction')
+        if jurisdiction not in Motion.Jurisdiction.values:
+            jurisdiction = None
+
+        motions = Motion.objects.filter(lga=lga)
+        if jurisdiction:
+            motions = motions.filter(jurisdiction=jurisdiction)
+        pending = motions.filter(status__in=stats.PENDING)
+
+        context.update({
+            'lga': lga,
+            'lga_name': User.LGA(lga).label,
+            'lgas': User.LGA.choices if user.is_admin or user.is_staff else [],
+            'jurisdiction': jurisdiction,
+            'jurisdictions': Motion.Jurisdiction.choices,
+            'stats': stats.summarize(lga, [jurisdiction] if jurisdiction else None),
+            'overdue_count': pending.filter(response_deadline__lt=now).count(),
+            'queue': sorted(
+                # One index-ordered scan per status; status IN (...) would
+                # sort the LGA's whole queue to return the first few.
+                chain.from_iterable(
+                    pending.filter(status=status).order_by(
+                        F('response_deadline').asc(nulls_last=True), 'pk',
+                    )[:OWNER_QUEUE_SIZE]
+                    for status in stats.PENDING
+                ),
+                key=lambda motion: (motion.response_deadline is None, motion.response_deadline or now, motion.pk),
+            )[:OWNER_QUEUE_SIZE],
+            # Through milestone_overdue_idx, oldest first.
+            'overdue_milestones': Milestone.objects.overdue(timezone.localdate(now)).filter(
+                response__motion__lga=lga,
+                **({'response__motion__jurisdiction': jurisdiction} if jurisdiction else {}),
+            ).select_related('response__motion')[:OWNER_QUEUE_SIZE],
+            'recent_responses': MotionResponse.objects.filter(
+                motion__lga=lga, **({'motion__jurisdiction': jurisdiction} if jurisdiction else {}),
+            ).select_related('motion', 'accountable_owner').order_by('-created_at')[:10],
+            'response_times': self.response_times(lga, jurisdiction, now),
+            'deadline_days': RESPONSE_DEADLINE_DAYS,
+            'now': now,
+        })
         return context
+
+
+async def alist(queryset):
+    """Evaluate a queryset with the async ORM."""
+    return [obj async for obj in queryset]
@@ -1,9 +1,25 @@
 import csv
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.http import HttpResponse
 from django.utils import timezone
 from django.utils.html import format_html
-from .models import Motion, MotionResponse, Vote, Comment
+from django.utils.text import Truncator
+from dashboard.stats import rebuild_for
+from .delivery import rollup_delivery_status, tracked_motions
+from .transitions import update_states
+from .models import ArchivedMotion, Motion, MotionResponse, Milestone, StatusTransition, Vote, Comment, ModerationQueueItem
+
+
+class StatusTransitionInline(admin.TabularInline):
+    model = StatusTransition
+    fields = ['created_at', 'field', 'from_state', 'to_state', 'actor']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    verbose_name_plural = 'Status history'
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Motion)
@@ -13,7 +29,8 @@ class MotionAdmin(admin.ModelAdmin):
     search_fields = ['title', 'evidence', 'proposed_action']
     readonly_fields = ['created_at', 'updated_at', 'published_at']
     ordering = ['-created_at']
-    actions = ['export_as_csv', 'mark_on_track', 'mark_delayed', 'mark_completed']
+    inlines = [StatusTransitionInline]
+    actions = ['export_as_csv', 'mark_on_track', 'mark_delayed', 'mark_completed', 'recalculate_delivery_status']
 
     fieldsets = (
         ('Motion Details', {
@@ -91,17 +108,45 @@ class MotionAdmin(admin.ModelAdmin):
 
         return response
 
+    def set_delivery_status(self, request, queryset, delivery_status):
+        """Set delivery status by hand on motions that don't track milestones."""
+        tracked = tracked_motions()
+        manual = queryset.exclude(pk__in=tracked)
+        updated = update_states(manual, delivery_status=delivery_status)
+        rebuild_for(manual)
+        skipped = queryset.filter(pk__in=tracked).count()
+        if skipped:
+            self.message_user(
+                request,
+                f'Skipped {skipped} motion{"s" if skipped != 1 else ""} with active milestones; '
+                f'their delivery status follows the milestones.',
+                messages.WARNING,
+            )
+        return updated
+
     @admin.action(description='Mark delivery as On Track')
     def mark_on_track(self, request, queryset):
-        queryset.update(delivery_status='on_track')
+        self.set_delivery_status(request, queryset, 'on_track')
 
     @admin.action(description='Mark delivery as Delayed')
     def mark_delayed(self, request, queryset):
-        queryset.update(delivery_status='delayed')
+        self.set_delivery_status(request, queryset, 'delayed')
 
     @admin.action(description='Mark delivery as Completed')
     def mark_completed(self, request, queryset):
-        queryset.update(delivery_status='completed')
+        self.set_delivery_status(request, queryset, 'completed')
+
+    @admin.action(description='Recalculate delivery status from milestones')
+    def recalculate_delivery_status(self, request, queryset):
+        changed = sum(rollup_delivery_status(queryset.values_list('pk', flat=True)).values())
+        self.message_user(request, f'Updated the delivery status of {changed} motion{"s" if changed != 1 else ""}.')
+
+
+class MilestoneInline(admin.TabularInline):
+    model = Milestone
+    fields = ['title', 'due_date', 'status', 'completed_at']
+    readonly_fields = ['completed_at']
+    extra = 0
 
 
 @admin.register(MotionResponse)
@@ -110,6 +155,7 @@ class MotionResponseAdmin(admin.ModelAdmin):
     list_filter = ['decision']
     search_fields = ['motion__title', 'reasons']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [MilestoneInline]
     actions = ['export_as_csv']
 
     @admin.action(description='Export selected responses as CSV')
@@ -139,6 +185,94 @@ class MotionResponseAdmin(admin.ModelAdmin):
         return response
 
 
+class OverdueFilter(admin.SimpleListFilter):
+    title = 'overdue'
+    parameter_name = 'overdue'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Overdue')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.overdue()
+        return queryset
+
+
+@admin.register(Milestone)
+class MilestoneAdmin(admin.ModelAdmin):
+    list_display = ['title', 'motion', 'due_date', 'status', 'completed_at']
+    list_filter = [OverdueFilter, 'status', 'response__motion__lga']
+    search_fields = ['title', 'response__motion__title']
+    list_select_related = ['response__motion']
+    readonly_fields = ['completed_at', 'created_at', 'updated_at']
+    raw_id_fields = ['response']
+    actions = ['mark_in_progress', 'mark_completed']
+
+    @admin.display(description='Motion', ordering='response__motion__title')
+    def motion(self, obj):
+        return obj.response.motion
+
+    def set_status(self, request, queryset, status):
+        queryset = queryset.exclude(status=status)
+        motion_ids = set(queryset.values_list('response__motion_id', flat=True))
+        updated = queryset.update(
+            status=status,
+            completed_at=timezone.now() if status == Milestone.Status.COMPLETED else None,
+            updated_at=timezone.now(),
+        )
+        rollup_delivery_status(motion_ids)
+        self.message_user(request, f'Updated {updated} milestone{"s" if updated != 1 else ""}.')
+
+    @admin.action(description='Mark selected milestones as In Progress')
+    def mark_in_progress(self, request, queryset):
+        self.set_status(request, queryset, Milestone.Status.IN_PROGRESS)
+
+    @admin.action(description='Mark selected milestones as Completed')
+    def mark_completed(self, request, queryset):
+        self.set_status(request, queryset, Milestone.Status.COMPLETED)
+
+
+@admin.register(StatusTransition)
+class StatusTransitionAdmin(admin.ModelAdmin):
+    """The audit trail; read-only, since it is append-only."""
+
+    list_display = ['created_at', 'motion', 'field', 'from_state', 'to_state', 'actor']
+    list_filter = ['field', 'to_state']
+    search_fields = ['motion__title']
+    list_select_related = ['motion', 'actor']
+    date_hierarchy = 'created_at'
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedMotion)
+class ArchivedMotionAdmin(admin.ModelAdmin):
+    """Closed motions moved out of the live tables; read-only."""
+
+    list_display = ['title', 'lga', 'jurisdiction', 'status', 'delivery_status', 'closed_at', 'archived_at']
+    list_filter = ['status', 'lga', 'jurisdiction']
+    search_fields = ['title']
+    date_hierarchy = 'closed_at'
+    exclude = ['payload']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Vote)
 class VoteAdmin(admin.ModelAdmin):
     list_display = ['motion', 'user', 'vote_type', 'created_at']
@@ -148,15 +282,61 @@ class VoteAdmin(admin.ModelAdmin):
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
-    list_display = ['motion', 'author', 'is_hidden', 'created_at']
-    list_filter = ['is_hidden']
+    list_display = ['motion', 'author', 'reply_depth', 'is_hidden', 'moderation_status', 'created_at']
+    list_filter = ['is_hidden', 'moderation_status']
     search_fields = ['content', 'author__username']
+    list_select_related = ['motion', 'author']
+    # Changing the parent would leave the stored thread path stale.
+    readonly_fields = ['parent', 'moderation_score', 'moderation_reasons', 'reviewed_by', 'reviewed_at']
     actions = ['hide_comments', 'show_comments']
 
-    @admin.action(description='Hide selected comments')
+    @admin.display(description='Depth')
+    def reply_depth(self, obj):
+        return obj.depth
+
+    @admin.action(description='Hide selected comments and their replies')
     def hide_comments(self, request, queryset):
-        queryset.update(is_hidden=True)
+        updated = queryset.set_hidden(True)
+        self.message_user(request, f'Hid {updated} comment{"s" if updated != 1 else ""}.')
 
-    @admin.action(description='Show selected comments')
+    @admin.action(description='Show selected comments and their replies')
     def show_comments(self, request, queryset):
-        queryset.update(is_hidden=False)
+        updated = queryset.set_hidden(False)
+        self.message_user(request, f'Restored {updated} comment{"s" if updated != 1 else ""}.')
+
+
+@admin.register(ModerationQueueItem)
+class ModerationQueueAdmin(admin.ModelAdmin):
+    """Bulk review of held and flagged comments, highest score first."""
+
+    list_display = ['excerpt', 'author', 'motion', 'moderation_status', 'moderation_score', 'moderation_reasons', 'created_at']
+    list_filter = ['moderation_status', 'motion__lga']
+    search_fields = ['content', 'author__username']
+    list_select_related = ['motion', 'author']
+    list_per_page = 100
+    ordering = ['-moderation_score', 'created_at']
+    actions = ['approve_comments', 'reject_comments']
+    fields = ['motion', 'author', 'content', 'moderation_status', 'moderation_score', 'moderation_reasons', 'created_at']
+    readonly_fields = fields
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(
+            moderation_status__in=[Comment.ModerationStatus.HELD, Comment.ModerationStatus.FLAGGED],
+        )
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Comment')
+    def excerpt(self, obj):
+        return Truncator(obj.content).chars(120)
+
+    @admin.action(description='Approve selected comments')
+    def approve_comments(self, request, queryset):
+        updated = queryset.approve(request.user)
+        self.message_user(request, f'Approved {updated} comment{"s" if updated != 1 else ""}.')
+
+    @admin.action(description='Reject selected comments (hides their replies too)')
+    def reject_comments(self, request, queryset):
+        updated = queryset.reject(request.user)
+        self.message_user(request, f'Rejected {updated} comment{"s" if updated != 1 else ""}.')
@@ -0,0 +1,236 @@
+"""
+Response-time (SLA) analytics: how long published motions wait for their
+official response.
+
+Latency is ``MotionResponse.created_at - Motion.published_at`` in days, or
+``responded_at - published_at`` for archived motions, which count like live
+ones (as in dashboard/stats.py). The database computes it (``DaysBetween``)
+and sorts the latencies within each group, live and archived together in
+one UNION ALL. Python only reads the sorted ``(group, latency)`` pairs
+off the cursor; it never builds a model instance. Percentiles then index
+straight into each sorted group (linear interpolation between the closest
+ranks, as numpy's default), and histogram buckets are found by bisecting
+it, so a group of n responses costs O(log n) after the fetch.
+
+Groups are ``lga``, ``jurisdiction``, ``owner`` (the accountable owner's
+username) or ``month`` (the month the response was given)::
+
+    response_latency('owner', lga='newcastle')
+    [{'group': 'cr_smith', 'count': 41, 'p50': 6.2, 'p90': 19.8, ...}, ...]
+
+``time_in_state()`` reports, from the status transition log, how long
+motions stay in each status or delivery status.
+
+All figures are in days.
+"""
+from bisect import bisect_left
+from datetime import datetime
+from itertools import groupby, pairwise
+from operator import itemgetter
+
+from django.db.models import (
+    Avg, Case, Count, DateField, DateTimeField, F, FloatField, Func, Max, Min, OuterRef, Q, Subquery, Sum,
+    Value, When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedMotion, Motion, MotionResponse, StatusTransition
+from .transitions import FIELDS
+
+# Group -> (expression on MotionResponse, expression on ArchivedMotion)
+GROUPS = {
+    'lga': (F('motion__lga'), F('lga')),
+    'jurisdiction': (F('motion__jurisdiction'), F('jurisdiction')),
+    'owner': (F('accountable_owner__username'), F('accountable_owner__username')),
+    'month': None,  # see month_of()
+}
+
+# Upper bounds in days; the last bucket is open-ended.
+BUCKET_EDGES = (1, 3, 7, 14, 28, 56, 90)
+BUCKET_LABELS = tuple(
+    [f'<{BUCKET_EDGES[0]}d']
+    + [f'{low}-{high}d' for low, high in zip(BUCKET_EDGES, BUCKET_EDGES[1:])]
+    + [f'{BUCKET_EDGES[-1]}d+']
+)
+PERCENTILES = (50, 90, 99)
+
+
+
+class DaysBetween(Func):
+    """Fractional days from start to end, as a float computed in SQL.
+
+    Django's own datetime subtraction on SQLite goes through a Python
+    function and a timedelta per row, which costs more than the query.
+    """
+    arity = 2
+    output_field = FloatField()
+    template = 'EXTRACT(EPOCH FROM (%(expressions)s)) / 86400'
+    arg_joiner = ' - '
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='(julianday(%(expressions)s))',
+            arg_joiner=') - julianday(', **extra_context,
+        )
+
+
+def latencies(**filters):
+    """Responses to published motions, annotated with latency in days."""
+    return MotionResponse.objects.filter(motion__published_at__isnull=False, **filters).annotate(
+        latency=DaysBetween('created_at', 'motion__published_at'),
+    )
+
+
+def archived_latencies(**filters):
+    """Archived motions that were published and responded to, annotated like latencies()."""
+    return ArchivedMotion.objects.filter(
+        published_at__isnull=False, responded_at__isnull=False, **filters,
+    ).annotate(latency=DaysBetween('responded_at', 'published_at'))
+
+
+def month_starts(first, last):
+    """Local month starts from first's month to the one after last's."""
+    first = timezone.localtime(first)
+    last = timezone.localtime(last)
+    starts = []
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        starts.append(timezone.make_aware(datetime(year, month, 1)))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    # The end of last's month, which is 1 January after a December.
+    starts.append(timezone.make_aware(datetime(year, month, 1)))
+    return starts
+
+
+def month_of(field, starts):
+    """A CASE expression giving the (local) month of each row's field.
+
+    TruncMonth converts time zones row by row in Python on SQLite; plain
+    range comparisons against precomputed month boundaries stay in SQL.
+    """
+    if not starts:
+        return Value(None, output_field=DateField())
+    return Case(
+        *[
+            When(**{f'{field}__gte': start, f'{field}__lt': end}, then=Value(start.date()))
+            for start, end in pairwise(starts)
+        ],
+        output_field=DateField(),
+    )
+
+
+def percentile(ordered, q):
+    """The q-th percentile (0-100) of a sorted, non-empty sequence."""
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def histogram(ordered):
+    """Counts per BUCKET_LABELS bucket of a sorted sequence of days."""
+    bounds = [0] + [bisect_left(ordered, edge) for edge in BUCKET_EDGES] + [len(ordered)]
+    return {label: high - low for label, low, high in zip(BUCKET_LABELS, bounds, bounds[1:])}
+
+
+def summarize(ordered):
+    """Distribution of a sorted, non-empty sequence of days."""
+    summary = {'count': len(ordered), 'mean': sum(ordered) / len(ordered), 'max': ordered[-1]}
+    for q in PERCENTILES:
+        summary[f'p{q}'] = percentile(ordered, q)
+    summary['buckets'] = histogram(ordered)
+    return summary
+
+
+def response_latency(by, lga=None, jurisdiction=None, since=None):
+    """Latency distribution per group, largest groups first.
+
+    by is one of GROUPS; lga, jurisdiction and since (a datetime, on the
+    response) narrow the responses counted.
+    """
+    if by not in GROUPS:
+        raise ValueError(f'Cannot group response times by {by!r}; choose from {", ".join(GROUPS)}')
+    filters, archived_filters = {}, {}
+    if lga:
+        filters['motion__lga'] = archived_filters['lga'] = lga
+    if jurisdiction:
+        filters['motion__jurisdiction'] = archived_filters['jurisdiction'] = jurisdiction
+    if since:
+        filters['created_at__gte'] = archived_filters['responded_at__gte'] = since
+    responses = latencies(**filters)
+    archived = archived_latencies(**archived_filters)
+
+    if by == 'month':
+        bounds = [
+            *responses.aggregate(first=Min('created_at'), last=Max('created_at')).values(),
+            *archived.aggregate(first=Min('responded_at'), last=Max('responded_at')).values(),
+        ]
+        bounds = [bound for bound in bounds if bound is not None]
+        starts = month_starts(min(bounds), max(bounds)) if bounds else []
+        group, archived_group = month_of('created_at', starts), month_of('responded_at', starts)
+    else:
+        group, archived_group = GROUPS[by]
+    rows = (
+        responses.annotate(group=group).order_by().values_list('group', 'latency')
+        .union(archived.annotate(group=archived_group).order_by().values_list('group', 'latency'), all=True)
+        .order_by('group', 'latency')
+    )
+
+    results = []
+    for group, pairs in groupby(rows.iterator(chunk_size=5000), key=itemgetter(0)):
+        # Clock skew or back-dated data can put a response before publication.
+        ordered = [max(latency, 0.0) for _, latency in pairs]
+        results.append({'group': group, **summarize(ordered)})
+    results.sort(key=lambda result: -result['count'])
+    return results
+
+
+def time_in_state(field='status', lga=None, jurisdiction=None, since=None, until=None, now=None):
+    """Days spent in each state of field ('status' or 'delivery_status').
+
+    Every entry into a state (made between since and until, when given) is
+    counted, lasting until the motion's next transition of that field, or
+    until now if it is still there. One aggregate query; the end of each
+    stay is looked up through transition_motion_idx::
+
+        time_in_state('delivery_status', lga='newcastle')
+        [{'state': 'not_started', 'entries': 410, 'current': 95, 'mean': 12.5, 'max': 201.0, 'total': 5125.0}, ...]
+    """
+    if field not in FIELDS:
+        raise ValueError(f'Cannot report time in state for {field!r}; choose from {", ".join(FIELDS)}')
+    now = now or timezone.now()
+    entries = StatusTransition.objects.filter(field=FIELDS[field])
+    if lga:
+        entries = entries.filter(motion__lga=lga)
+    if jurisdiction:
+        entries = entries.filter(motion__jurisdiction=jurisdiction)
+    if since:
+        entries = entries.filter(created_at__gte=since)
+    if until:
+        entries = entries.filter(created_at__lt=until)
+
+    left_at = StatusTransition.objects.filter(
+        motion=OuterRef('motion'), field=OuterRef('field'), created_at__gt=OuterRef('created_at'),
+    ).order_by('created_at').values('created_at')[:1]
+    rows = (
+        entries
+        .annotate(left_at=Subquery(left_at))
+        .annotate(days=DaysBetween(Coalesce('left_at', Value(now, output_field=DateTimeField())), 'created_at'))
+        .order_by()
+        .values('to_state')
+        .annotate(
+            entries=Count('pk'),
+            current=Count('pk', filter=Q(left_at__isnull=True)),
+            mean=Avg('days'),
+            max=Max('days'),
+            total=Sum('days'),
+        )
+    )
+    order = Motion.Status.values if field == 'status' else Motion.DeliveryStatus.values
+    results = [{'state': row.pop('to_state'), **row} for row in rows]
+    results.sort(key=lambda result: order.index(result['state']) if result['state'] in order else len(order))
+    return results
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MotionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'motions'
+
+    def ready(self):
+        import motions.signals  # noqa
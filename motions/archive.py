@@ -0,0 +1,162 @@
+"""
+Archiving of closed motions, to keep the live tables small.
+
+A motion is closed once it is rejected or its delivery is completed, and it
+closed when its status or delivery status last changed (from the status
+transition log). ``archive()`` moves motions into ``ArchivedMotion`` in
+batches; per batch it reads the motions, their responses, milestones and
+status history with one query each, reduces votes and comments to counts
+with one grouped query each, writes the archive rows in one INSERT and
+deletes the originals with their votes, comments and milestones.
+
+Archived motions keep counting in the dashboard statistics: the deletes run
+with the statistics paused, and ``dashboard.stats.compute()`` reads
+``ArchivedMotion`` as well as ``Motion``. Their detail page keeps working,
+read-only, from the archive row.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from dashboard import stats
+from .models import ArchivedMotion, Comment, Milestone, Motion, MotionResponse, StatusTransition, Vote
+
+# Motions moved per transaction
+ARCHIVE_BATCH_SIZE = 200
+
+CLOSED = Q(status=Motion.Status.REJECTED) | Q(
+    status__in=[Motion.Status.ACCEPTED, Motion.Status.MODIFIED],
+    delivery_status=Motion.DeliveryStatus.COMPLETED,
+)
+
+# Motion fields kept only in the archive document
+DOCUMENT_FIELDS = (
+    'evidence', 'proposed_action', 'resource_ask', 'success_measures',
+    'safeguarding_considerations', 'inclusion_considerations', 'updated_at', 'response_deadline',
+)
+RESPONSE_FIELDS = (
+    'decision', 'reasons', 'delivery_plan', 'milestone_notes', 'due_date', 'alternative_pathway', 'created_at',
+)
+
+
+def closed_before(cutoff):
+    """Closed motions whose last status change was before cutoff, annotated with closed_at."""
+    return Motion.objects.filter(CLOSED).annotate(
+        closed_at=Coalesce(Max('transitions__created_at'), 'updated_at'),
+    ).filter(closed_at__lt=cutoff)
+
+
+def archive(motions, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive the given motions (a queryset from closed_before()); returns how many."""
+    closed = list(motions.order_by('pk').values_list('pk', 'closed_at'))
+    for start in range(0, len(closed), batch_size):
+        archive_batch(dict(closed[start:start + batch_size]))
+    return len(closed)
+
+
+def archive_batch(closed_at):
+    """Archive the motions in {motion_id: closed_at}."""
+    ids = list(closed_at)
+    with transaction.atomic():
+        motions = list(
+            Motion.objects.filter(pk__in=ids).select_for_update(of=('self',)).select_related('response__accountable_owner')
+        )
+        votes = {
+            row['motion_id']: row for row in Vote.objects.filter(motion_id__in=ids).order_by()
+            .values('motion_id').annotate(
+                approvals=Count('pk', filter=Q(vote_type=Vote.VoteType.APPROVE)),
+                disapprovals=Count('pk', filter=Q(vote_type=Vote.VoteType.DISAPPROVE)),
+            )
+        }
+        comments = dict(
+            Comment.objects.filter(motion_id__in=ids, is_hidden=False).order_by()
+            .values('motion_id').annotate(total=Count('pk')).values_list('motion_id', 'total')
+        )
+        milestones = defaultdict(list)
+        for motion_id, *row in Milestone.objects.filter(response__motion_id__in=ids).values_list(
+            'response__motion_id', 'title', 'due_date', 'status', 'completed_at',
+        ):
+            milestones[motion_id].append(row)
+        history = defaultdict(list)
+        for motion_id, *row in StatusTransition.objects.filter(motion_id__in=ids).values_list(
+            'motion_id', 'field', 'from_state', 'to_state', 'actor_id', 'created_at',
+        ):
+            history[motion_id].append(row)
+
+        archived = []
+        for motion in motions:
+            try:
+                response = motion.response
+            except MotionResponse.DoesNotExist:
+                response = None
+            document = {
+                'motion': {name: getattr(motion, name) for name in DOCUMENT_FIELDS},
+                'response': response and {
+                    **{name: getattr(response, name) for name in RESPONSE_FIELDS},
+                    'accountable_owner': response.accountable_owner.username,
+                },
+                'milestones': milestones[motion.pk],
+                'transitions': history[motion.pk],
+            }
+            counts = votes.get(motion.pk, {})
+            archived.append(ArchivedMotion(
+                id=motion.pk,
+                title=motion.title,
+                lga=motion.lga,
+                jurisdiction=motion.jurisdiction,
+                status=motion.status,
+                delivery_status=motion.delivery_status,
+                author_id=motion.author_id,
+                accountable_owner_id=response.accountable_owner_id if response else None,
+                created_at=motion.created_at,
+                published_at=motion.published_at,
+                responded_at=response.created_at if response else None,
+                closed_at=closed_at[motion.pk],
+                approvals=counts.get('approvals', 0),
+                disapprovals=counts.get('disapprovals', 0),
+                comments=comments.get(motion.pk, 0),
+                payload=ArchivedMotion.pack(document),
+            ))
+        ArchivedMotion.objects.bulk_create(archived)
+
+        # They still count, now from the archive.
+        with stats.paused():
+            Motion.objects.filter(pk__in=[motion.pk for motion in motions]).delete()
+    return len(archived)
+
+
+def detail(archived):
+    """Template context for an archived motion's read-only page."""
+    document = archived.document
+    motion = dict(document['motion'])
+    motion['response_deadline'] = motion['response_deadline'] and parse_datetime(motion['response_deadline'])
+    response = document['response']
+    if response:
+        response = {
+            **response,
+            'created_at': parse_datetime(response['created_at']),
+            'due_date': response['due_date'] and parse_date(response['due_date']),
+        }
+    today = timezone.localdate()
+    milestones = [
+        {
+            'title': title,
+            'due_date': parse_date(due_date),
+            'status': Milestone.Status(status),
+            'completed_at': completed_at and parse_datetime(completed_at),
+        }
+        for title, due_date, status, completed_at in document['milestones']
+    ]
+    for milestone in milestones:
+        milestone['is_overdue'] = milestone['status'] in Milestone.OPEN_STATUSES and milestone['due_date'] < today
+    return {
+        'motion': archived,
+        'text': motion,
+        'response': response,
+        'decision': response and MotionResponse.Decision(response['decision']),
+        'milestones': milestones,
+    }
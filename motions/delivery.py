@@ -0,0 +1,112 @@
+"""
+Delivery status derived from milestones.
+
+A motion whose response has milestones gets its ``delivery_status`` from
+them instead of being set by hand. Cancelled milestones are ignored:
+
+- every remaining milestone completed -> completed
+- any open milestone past its due date -> delayed
+- any milestone in progress or completed -> on track
+- otherwise -> not started
+
+Motions without milestones keep their manually set status, and a motion
+whose milestones are all cancelled returns to manual control, keeping the
+status it last had. The rollup is one
+grouped aggregate over the milestones plus one UPDATE per resulting status
+and batch, logs the transitions in bulk and keeps the dashboard statistics
+in step.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from dashboard import stats
+from . import transitions
+from .models import Milestone, Motion
+
+# Motions per SELECT/UPDATE, well under SQLite's bound parameter limit
+ROLLUP_BATCH_SIZE = 500
+
+
+def derive_status(total, completed, started, overdue):
+    if completed == total:
+        return Motion.DeliveryStatus.COMPLETED
+    if overdue:
+        return Motion.DeliveryStatus.DELAYED
+    if started or completed:
+        return Motion.DeliveryStatus.ON_TRACK
+    return Motion.DeliveryStatus.NOT_STARTED
+
+
+def tracked_motions():
+    """Subquery of the motion ids whose delivery status follows milestones."""
+    return Milestone.objects.tracking().values('response__motion_id')
+
+
+def derived_statuses(motion_ids=None, today=None):
+    """{motion_id: delivery status} for motions with (uncancelled) milestones."""
+    today = today or timezone.localdate()
+    milestones = Milestone.objects.tracking()
+    if motion_ids is not None:
+        milestones = milestones.filter(response__motion_id__in=motion_ids)
+    rows = milestones.order_by().values('response__motion_id').annotate(
+        total=Count('pk'),
+        completed=Count('pk', filter=Q(status=Milestone.Status.COMPLETED)),
+        started=Count('pk', filter=Q(status=Milestone.Status.IN_PROGRESS)),
+        overdue=Count('pk', filter=Q(status__in=Milestone.OPEN_STATUSES, due_date__lt=today)),
+    )
+    return {
+        row.pop('response__motion_id'): derive_status(**row)
+        for row in rows
+    }
+
+
+def rollup_delivery_status(motion_ids=None, today=None, dry_run=False):
+    """Set delivery_status from milestones; returns {status: motions changed}.
+
+    Rolls up every motion with milestones unless motion_ids is given.
+    """
+    if motion_ids is not None:
+        motion_ids = list(motion_ids)
+        derived = {}
+        for start in range(0, len(motion_ids), ROLLUP_BATCH_SIZE):
+            derived.update(derived_statuses(motion_ids[start:start + ROLLUP_BATCH_SIZE], today))
+    else:
+        derived = derived_statuses(today=today)
+
+    changed = Counter()
+    ids = list(derived)
+    now = timezone.now()
+    actor_id = transitions.current_actor_id()
+    with transaction.atomic():
+        deltas = Counter()
+        log = []
+        for start in range(0, len(ids), ROLLUP_BATCH_SIZE):
+            batch = Motion.objects.filter(pk__in=ids[start:start + ROLLUP_BATCH_SIZE])
+            stale = defaultdict(list)
+            for pk, lga, jurisdiction, status, current in batch.select_for_update().values_list(
+                'pk', 'lga', 'jurisdiction', 'status', 'delivery_status',
+            ):
+                new = derived[pk]
+                if new == current:
+                    continue
+                stale[new].append(pk)
+                log.extend(transitions.transitions(
+                    pk, {'delivery_status': current}, {'delivery_status': new}, now, actor_id,
+                ))
+                deltas.update(stats.diff(
+                    stats.motion_metrics(lga, jurisdiction, status, current),
+                    stats.motion_metrics(lga, jurisdiction, status, new),
+                ))
+            for status, pks in stale.items():
+                changed[status] += len(pks)
+                if not dry_run:
+                    Motion.objects.filter(pk__in=pks).update(delivery_status=status)
+        if not dry_run:
+            transitions.record(log)
+            if not stats.is_paused():
+                stats.apply(deltas)
+    return changed
+
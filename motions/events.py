@@ -0,0 +1,199 @@
+"""
+Realtime motion events for the detail page.
+
+Views publish vote-count and new-comment events with ``publish()``. Open
+server-sent event streams subscribe through the process-wide
+``MotionEventHub``, which fans each event out to every subscriber on that
+motion. Subscribers are plain ``asyncio.Queue`` objects, so an idle stream
+costs a coroutine and a queue and never holds a database connection.
+
+How events travel between processes is up to the backend configured in
+``settings.MOTION_EVENTS['BACKEND']``:
+
+* ``InProcessBackend`` delivers within the publishing process only. Fine
+  for a single ASGI worker.
+* ``RedisBackend`` publishes over Redis pub/sub and runs one listener per
+  process, so every worker sees every event. Requires the ``redis`` package.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class InProcessBackend:
+    """Deliver events to subscribers in the current process only."""
+
+    def __init__(self, **options):
+        self._dispatch = None
+
+    def attach(self, dispatch):
+        self._dispatch = dispatch
+
+    def publish(self, motion_id, event, data):
+        self._dispatch(motion_id, event, data)
+
+    def ensure_listening(self):
+        pass
+
+
+class RedisBackend:
+    """Share events between worker processes over Redis pub/sub."""
+
+    def __init__(self, url='redis://localhost:6379/0', channel_prefix='odyssey:motion:'):
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured('RedisBackend requires the "redis" package.') from exc
+
+        self.url = url
+        self.channel_prefix = channel_prefix
+        self._client = redis.Redis.from_url(url)
+        self._dispatch = None
+        self._listener = None
+
+    def attach(self, dispatch):
+        self._dispatch = dispatch
+
+    def publish(self, motion_id, event, data):
+        self._client.publish(
+            f'{self.channel_prefix}{motion_id}',
+            json.dumps({'event': event, 'data': data}),
+        )
+
+    def ensure_listening(self):
+        # One pattern subscription per process, shared by all open streams.
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        async with client.pubsub() as pubsub:
+            await pubsub.psubscribe(f'{self.channel_prefix}*')
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+                channel = message['channel'].decode()
+                motion_id = int(channel[len(self.channel_prefix):])
+                payload = json.loads(message['data'])
+                self._dispatch(motion_id, payload['event'], payload['data'])
+
+
+class Subscription:
+    """A bounded event queue bound to the event loop that reads it."""
+
+    def __init__(self, maxsize):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, item):
+        # Publishers are usually sync views running in worker threads.
+        try:
+            self.loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            pass  # Loop already closed
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            pass  # Slow client; it resyncs on the next event or reload
+
+
+class MotionEventHub:
+    """Fan motion events out to the streams subscribed to each motion."""
+
+    def __init__(self, backend, queue_size=100):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        backend.attach(self._dispatch)
+
+    def publish(self, motion_id, event, data):
+        self.backend.publish(motion_id, event, data)
+
+    def subscribe(self, motion_id):
+        self.backend.ensure_listening()
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscribers[motion_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, motion_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(motion_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[motion_id]
+
+    def _dispatch(self, motion_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(motion_id, ()))
+        for subscription in subscribers:
+            subscription.deliver((event, data))
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_event_hub():
+    """Return the process-wide event hub, building it on first use."""
+    global _hub
+
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                config = settings.MOTION_EVENTS
+                backend_class = import_string(config['BACKEND'])
+                _hub = MotionEventHub(
+                    backend_class(**config.get('OPTIONS', {})),
+                    queue_size=config.get('QUEUE_SIZE', 100),
+                )
+    return _hub
+
+
+def publish(motion_id, event, data):
+    """Publish an event to everyone watching a motion."""
+    get_event_hub().publish(motion_id, event, data)
+
+
+async def stream(motion_id):
+    """Yield server-sent event frames for a motion until the stream expires.
+
+    Streams are capped at ``MAX_STREAM_SECONDS``; the browser's EventSource
+    reconnects on its own, which also clears out streams whose client went
+    away without the server noticing.
+    """
+    config = settings.MOTION_EVENTS
+    heartbeat = config.get('HEARTBEAT_SECONDS', 15)
+    max_age = config.get('MAX_STREAM_SECONDS', 300)
+
+    hub = get_event_hub()
+    subscription = hub.subscribe(motion_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_age
+    try:
+        yield f'retry: {heartbeat * 1000}\n\n'
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                event, data = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=min(heartbeat, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
+    finally:
+        hub.unsubscribe(motion_id, subscription)
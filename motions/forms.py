@@ -1,5 +1,5 @@
 from django import forms
-from .models import Motion, MotionResponse, Comment
+from .models import Motion, MotionResponse, Milestone, Comment
 
 
 class MotionForm(forms.ModelForm):
@@ -37,11 +37,10 @@ class MotionForm(forms.ModelForm):
 class MotionResponseForm(forms.ModelForm):
     class Meta:
         model = MotionResponse
-        fields = ['decision', 'reasons', 'delivery_plan', 'milestones', 'due_date', 'alternative_pathway']
+        fields = ['decision', 'reasons', 'delivery_plan', 'due_date', 'alternative_pathway']
         widgets = {
             'reasons': forms.Textarea(attrs={'rows': 4}),
             'delivery_plan': forms.Textarea(attrs={'rows': 3}),
-            'milestones': forms.Textarea(attrs={'rows': 3}),
             'alternative_pathway': forms.Textarea(attrs={'rows': 3}),
             'due_date': forms.DateInput(attrs={'type': 'date'}),
         }
@@ -57,14 +56,49 @@ class MotionResponseForm(forms.ModelForm):
                 field.widget.attrs['class'] = 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-civic-blue focus:border-transparent'
 
 
+class MilestoneForm(forms.ModelForm):
+    class Meta:
+        model = Milestone
+        fields = ['title', 'due_date']
+        widgets = {
+            'title': forms.TextInput(attrs={'placeholder': 'e.g. Consultation with youth council'}),
+            'due_date': forms.DateInput(attrs={'type': 'date'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-civic-blue focus:border-transparent'
+
+
+MilestoneFormSet = forms.inlineformset_factory(
+    MotionResponse, Milestone, form=MilestoneForm, extra=3, can_delete=False,
+)
+
+
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
-        fields = ['content']
+        fields = ['content', 'parent']
         widgets = {
+            'parent': forms.HiddenInput,
             'content': forms.Textarea(attrs={
                 'rows': 3,
                 'placeholder': 'Share your thoughts on this motion...',
                 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-civic-blue focus:border-transparent'
             })
         }
+
+    def __init__(self, *args, motion=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Replies must be to a visible comment on the same motion.
+        parents = Comment.objects.filter(is_hidden=False)
+        if motion is not None:
+            parents = parents.filter(motion=motion)
+        self.fields['parent'].queryset = parents
+
+    def clean_parent(self):
+        parent = self.cleaned_data.get('parent')
+        if parent is not None and not parent.accepts_replies:
+            raise forms.ValidationError('This conversation is too deeply nested to reply to.')
+        return parent
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from config import metrics
+from motions import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Move motions closed (rejected, or delivered) more than ARCHIVE_AFTER_MONTHS ago '
+        'into the archive. Run nightly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=settings.ARCHIVE_AFTER_MONTHS,
+            help='Archive motions closed more than this many months ago',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=archive.ARCHIVE_BATCH_SIZE,
+            help='Motions moved per transaction',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many motions would be archived without moving them',
+        )
+
+    @metrics.COMMAND_DURATION.time(command='archive_motions')
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=30 * options['months'])
+        motions = archive.closed_before(cutoff)
+        if options['dry_run']:
+            total = motions.count()
+            verb = 'Would archive'
+        else:
+            total = archive.archive(motions, batch_size=options['batch_size'])
+            verb = 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total:,} motion{"s" if total != 1 else ""} closed before {cutoff:%Y-%m-%d}'
+        ))
@@ -0,0 +1,190 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from motions.models import Motion
+
+from .run_benchmarks import percentile
+
+PROFILES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    'tuned': {'ENGINE': 'config.tuned_sqlite', 'OPTIONS': {}},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare vote and comment write throughput and "database is locked" errors '
+        'with concurrent worker processes on stock and tuned SQLite'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Concurrent worker processes, like gunicorn workers (default: 8)',
+        )
+        parser.add_argument(
+            '--operations',
+            type=int,
+            default=200,
+            help='Writes per worker, alternating votes and comments (default: 200)',
+        )
+        parser.add_argument(
+            '--motions',
+            type=int,
+            default=3,
+            help='Motions the writes are spread over; fewer means hotter rows (default: 3)',
+        )
+        parser.add_argument(
+            '--profiles',
+            nargs='+',
+            choices=list(PROFILES),
+            default=list(PROFILES),
+            help='SQLite profiles to compare (default: all)',
+        )
+
+    # Every writer posts as fast as it can, which is what rate limits stop.
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def handle(self, *args, **options):
+        workers = options['workers']
+        # Benchmarks run against throwaway files, never the configured database.
+        original_settings = dict(connections.settings['default'])
+        # Lock errors are counted below rather than logged as server errors.
+        logging.getLogger('odyssey.requests').setLevel(logging.CRITICAL)
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        setup_test_environment()
+
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                template = os.path.join(directory, 'template.sqlite3')
+                self.use_database(template, PROFILES['default'])
+                call_command('migrate', verbosity=0)
+                user_ids, motion_ids = self.seed(workers, options['motions'])
+
+                results = {}
+                for profile in options['profiles']:
+                    path = os.path.join(directory, f'{profile}.sqlite3')
+                    shutil.copy(template, path)
+                    self.use_database(path, PROFILES[profile])
+                    results[profile] = self.run_profile(user_ids, motion_ids, options['operations'])
+        finally:
+            teardown_test_environment()
+            self.use_database(original_settings['NAME'], original_settings)
+
+        self.stdout.write(
+            f'{workers} workers x {options["operations"]} writes over {len(motion_ids)} motions\n'
+        )
+        self.stdout.write(
+            f'  {"profile":<10} {"writes/s":>10} {"ok":>7} {"locked":>7} {"errors":>7} '
+            f'{"p50 ms":>9} {"p95 ms":>9}'
+        )
+        for profile, result in results.items():
+            self.stdout.write(
+                f'  {profile:<10} {result["throughput"]:>10.1f} {result["ok"]:>7} {result["locked"]:>7} '
+                f'{result["errors"]:>7} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f}'
+            )
+
+    def use_database(self, path, profile):
+        connections.close_all()
+        settings_dict = dict(connections.settings['default'])
+        settings_dict.update(ENGINE=profile['ENGINE'], NAME=path, OPTIONS=dict(profile['OPTIONS']))
+        connections.settings['default'] = settings_dict
+        try:
+            del connections['default']
+        except AttributeError:
+            pass  # Not opened in this thread yet
+
+    def seed(self, workers, motion_count):
+        User.objects.bulk_create([
+            User(username=f'writer_{i}', lga=User.LGA.NEWCASTLE, password='!')
+            for i in range(workers + 1)
+        ])
+        users = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        now = timezone.now()
+        Motion.objects.bulk_create([
+            Motion(
+                title=f'Benchmark motion {i}', evidence='Evidence', proposed_action='Action',
+                resource_ask='Ask', success_measures='Measures', lga=User.LGA.NEWCASTLE,
+                author_id=users[-1], status=Motion.Status.PUBLISHED, published_at=now,
+            )
+            for i in range(motion_count)
+        ])
+        motions = list(Motion.objects.order_by('pk').values_list('pk', flat=True))
+        return users[:workers], motions
+
+    def run_profile(self, user_ids, motion_ids, operations):
+        connections.close_all()  # never share a connection with the children
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(len(user_ids) + 1)
+        queue = context.Queue()
+        processes = [
+            context.Process(
+                target=self.worker,
+                args=(index, user_id, motion_ids, operations, barrier, queue),
+            )
+            for index, user_id in enumerate(user_ids)
+        ]
+        for process in processes:
+            process.start()
+
+        barrier.wait()
+        start = time.perf_counter()
+        reports = [queue.get() for _ in processes]
+        elapsed = time.perf_counter() - start
+        for process in processes:
+            process.join()
+
+        latencies = [ms for report in reports for ms in report['latencies']]
+        ok = sum(report['ok'] for report in reports)
+        return {
+            'throughput': ok / elapsed,
+            'ok': ok,
+            'locked': sum(report['locked'] for report in reports),
+            'errors': sum(report['errors'] for report in reports),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+        }
+
+    def worker(self, index, user_id, motion_ids, operations, barrier, queue):
+        client = Client()
+        client.force_login(User.objects.get(pk=user_id))
+        report = {'ok': 0, 'locked': 0, 'errors': 0, 'latencies': []}
+
+        barrier.wait()
+        for i in range(operations):
+            motion_id = motion_ids[(index + i) % len(motion_ids)]
+            start = time.perf_counter()
+            try:
+                if i % 2:
+                    response = client.post(
+                        reverse('motion_comment', args=[motion_id]),
+                        {'content': f'Comment {i} from writer {index}'},
+                    )
+                else:
+                    response = client.post(
+                        reverse('motion_vote', args=[motion_id]),
+                        {'vote_type': 'approve' if i % 4 else 'disapprove'},
+                    )
+            except OperationalError as exc:
+                report['locked' if 'locked' in str(exc) else 'errors'] += 1
+                continue
+            finally:
+                report['latencies'].append((time.perf_counter() - start) * 1000)
+            report['ok' if response.status_code < 400 else 'errors'] += 1
+
+        connections.close_all()
+        queue.put(report)
@@ -3,6 +3,7 @@ from django.utils import timezone
 from datetime import timedelta
 from motions.models import Motion
 from notifications.services import create_notification
+from config import metrics
 
 
 class Command(BaseCommand):
@@ -15,6 +16,7 @@ class Command(BaseCommand):
             help='Show what would be done without sending notifications',
         )
 
+    @metrics.COMMAND_DURATION.time(command='check_deadlines')
     def handle(self, *args, **options):
         now = timezone.now()
         dry_run = options['dry_run']
@@ -3,6 +3,10 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from motions.models import Motion, MotionResponse, Vote, Comment
 from accounts.models import User
+from config import metrics
+from motions.analytics import BUCKET_LABELS, GROUPS, PERCENTILES, response_latency, time_in_state
+from motions.transitions import FIELDS
+from config.routers import use_replica
 
 
 class Command(BaseCommand):
@@ -23,6 +27,8 @@ class Command(BaseCommand):
             help='Export format (default: csv)',
         )
 
+    @metrics.COMMAND_DURATION.time(command='export_data')
+    @use_replica()
     def handle(self, *args, **options):
         prefix = options['output']
         timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
@@ -39,6 +45,12 @@ class Command(BaseCommand):
         # Export summary stats
         self.export_summary(f'{prefix}_summary_{timestamp}.csv')
 
+        # Export response-time distributions
+        self.export_response_times(f'{prefix}_response_times_{timestamp}.csv')
+
+        # Export time spent in each status, from the transition log
+        self.export_time_in_state(f'{prefix}_time_in_state_{timestamp}.csv')
+
         self.stdout.write(self.style.SUCCESS(f'Export complete with prefix: {prefix}'))
 
     def export_motions(self, filename):
@@ -156,3 +168,39 @@ class Command(BaseCommand):
                 writer.writerow([f'responses_{decision}', count])
 
         self.stdout.write(f'  Exported summary to {filename}')
+
+    def export_response_times(self, filename):
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ['dimension', 'group', 'responses', 'mean_days']
+                + [f'p{q}_days' for q in PERCENTILES]
+                + ['max_days']
+                + [f'bucket_{label}' for label in BUCKET_LABELS]
+            )
+
+            for dimension in GROUPS:
+                for row in response_latency(dimension):
+                    group = row['group'].strftime('%Y-%m') if dimension == 'month' else row['group']
+                    writer.writerow(
+                        [dimension, group, row['count'], round(row['mean'], 2)]
+                        + [round(row[f'p{q}'], 2) for q in PERCENTILES]
+                        + [round(row['max'], 2)]
+                        + [row['buckets'][label] for label in BUCKET_LABELS]
+                    )
+
+        self.stdout.write(f'  Exported response times to {filename}')
+
+    def export_time_in_state(self, filename):
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['field', 'state', 'entries', 'current', 'mean_days', 'max_days', 'total_days'])
+
+            for field in FIELDS:
+                for row in time_in_state(field):
+                    writer.writerow([
+                        field, row['state'], row['entries'], row['current'],
+                        round(row['mean'], 2), round(row['max'], 2), round(row['total'], 2),
+                    ])
+
+        self.stdout.write(f'  Exported time in state to {filename}')
@@ -0,0 +1,99 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from config import metrics
+from motions.moderation import get_scorer
+from motions.models import Comment
+
+# Only ever tighten: a re-score never releases a held comment.
+SEVERITY = {
+    Comment.ModerationStatus.APPROVED: 0,
+    Comment.ModerationStatus.FLAGGED: 1,
+    Comment.ModerationStatus.HELD: 2,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-score recent unreviewed comments with the current blocklist and rules, '
+        'flagging or holding any that now cross a threshold'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Re-score comments posted in the last N days (default: 7)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Comments scored and updated per batch (default: 2000)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without saving',
+        )
+
+    @metrics.COMMAND_DURATION.time(command='moderate_comments')
+    def handle(self, *args, **options):
+        scorer = get_scorer()
+        batch_size = options['batch_size']
+        comments = Comment.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=options['days']),
+            reviewed_at__isnull=True,
+            moderation_status__in=list(SEVERITY),
+        ).only('content', 'moderation_status', 'moderation_score', 'moderation_reasons', 'is_hidden')
+
+        scanned = 0
+        changed = {Comment.ModerationStatus.FLAGGED: 0, Comment.ModerationStatus.HELD: 0}
+        scoring_seconds = 0.0
+        last_pk = 0
+        while True:
+            batch = list(comments.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            scanned += len(batch)
+
+            start = time.perf_counter()
+            results = [scorer.score(comment.content) for comment in batch]
+            scoring_seconds += time.perf_counter() - start
+
+            updates = []
+            for comment, result in zip(batch, results):
+                status = scorer.decide(result)
+                if SEVERITY[status] <= SEVERITY[comment.moderation_status]:
+                    continue
+                comment.moderation_status = status
+                comment.moderation_score = result.score
+                comment.moderation_reasons = ', '.join(result.reasons)[:255]
+                if status == Comment.ModerationStatus.HELD:
+                    comment.is_hidden = True
+                changed[status] += 1
+                updates.append(comment)
+
+            if updates and not options['dry_run']:
+                with transaction.atomic():
+                    Comment.objects.bulk_update(
+                        updates,
+                        ['moderation_status', 'moderation_score', 'moderation_reasons', 'is_hidden'],
+                    )
+                    # Replies to a newly held comment go with it.
+                    held = [comment.pk for comment in updates if comment.is_hidden]
+                    Comment.objects.filter(pk__in=held).set_hidden(True)
+
+        rate = scanned / scoring_seconds if scoring_seconds else 0
+        verb = 'Would flag' if options['dry_run'] else 'Flagged'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned:,} comments ({rate:,.0f}/s scoring); '
+            f'{verb} {changed[Comment.ModerationStatus.FLAGGED]:,} and held '
+            f'{changed[Comment.ModerationStatus.HELD]:,}'
+        ))
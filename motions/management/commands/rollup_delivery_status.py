@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from config import metrics
+from motions.delivery import rollup_delivery_status
+from motions.models import Milestone, Motion
+
+
+class Command(BaseCommand):
+    help = (
+        'Derive delivery status from milestones for every motion that has them. '
+        'Run daily: milestones become overdue as dates pass, without any edit.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the status changes without making them',
+        )
+
+    @metrics.COMMAND_DURATION.time(command='rollup_delivery_status')
+    def handle(self, *args, **options):
+        changed = rollup_delivery_status(dry_run=options['dry_run'])
+        labels = dict(Motion.DeliveryStatus.choices)
+        for status, count in sorted(changed.items()):
+            self.stdout.write(f'  {labels[status]}: {count:,}')
+
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        total = sum(changed.values())
+        overdue = Milestone.objects.overdue().count()
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total:,} motion{"s" if total != 1 else ""}; {overdue:,} milestones are overdue'
+        ))
@@ -0,0 +1,317 @@
+import json
+import logging
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.conf import settings
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from motions.models import Comment, Motion, MotionResponse, Vote
+from notifications.services import notify_new_motion
+
+# name -> (description, group). 'slow' benchmarks run --slow-iterations times
+# with no warm-up.
+BENCHMARKS = {
+    'feed': ('GET the motion feed, first page', 'fast'),
+    'feed_filtered': ('GET the motion feed filtered by LGA and jurisdiction', 'fast'),
+    'detail': ('GET the most-voted motion', 'fast'),
+    'home': ('GET the home page', 'fast'),
+    'dashboard': ('GET the public dashboard', 'fast'),
+    'vote': ('POST a vote on the most-voted motion', 'fast'),
+    'comment': ('POST a comment on the most-voted motion', 'fast'),
+    'publish_fanout': ('notify_new_motion for a motion in the largest LGA', 'slow'),
+    'export_data': ('export_data management command', 'slow'),
+    'check_deadlines': ('check_deadlines management command', 'slow'),
+}
+
+
+class QueryCounter:
+    """Count statements without Django's 9000-entry debug query log limit.
+
+    Savepoint statements are skipped: they come from the transaction each run
+    is wrapped in, not from the code being measured.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Time the main request and batch paths and record query counts and p50/p95 latency as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'benchmarks',
+            nargs='*',
+            help=f'Benchmarks to run (default: all). Choices: {", ".join(BENCHMARKS)}',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=30,
+            help='Timed runs of each request benchmark (default: 30)',
+        )
+        parser.add_argument(
+            '--slow-iterations',
+            type=int,
+            default=3,
+            help='Timed runs of fan-out and management command benchmarks (default: 3)',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Untimed runs before each benchmark (default: 2)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='benchmark_results.json',
+            help='Where to write the results (default: benchmark_results.json)',
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='Baseline JSON from an earlier run to compare against',
+        )
+        parser.add_argument(
+            '--fail-threshold',
+            type=float,
+            help='With --compare, exit non-zero if any p95 or query count grows by more than this percentage',
+        )
+
+    def handle(self, *args, **options):
+        names = options['benchmarks'] or list(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f'Unknown benchmarks: {", ".join(sorted(unknown))}')
+        self.prepare()
+
+        results = {}
+        setup_test_environment()  # locmem email backend, 'testserver' host
+        # The profiling middleware would log every request (and flag budget
+        # overruns caused by the rollback savepoints); these numbers go in the
+        # results file instead.
+        request_logger = logging.getLogger('odyssey.requests')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        # Keep the rate limiter in the measured path, but out of reach.
+        unlimited = override_settings(RATE_LIMITS={
+            scope: {key: '1000000/s' for key in limits} for scope, limits in settings.RATE_LIMITS.items()
+        })
+        unlimited.enable()
+        try:
+            for name in names:
+                description, group = BENCHMARKS[name]
+                iterations = options['iterations'] if group == 'fast' else options['slow_iterations']
+                warmup = options['warmup'] if group == 'fast' else 0
+                results[name] = self.measure(getattr(self, f'bench_{name}'), iterations, warmup)
+                results[name]['description'] = description
+                self.report_line(name, results[name])
+        finally:
+            unlimited.disable()
+            request_logger.setLevel(previous_level)
+            teardown_test_environment()
+
+        data = {
+            'commit': current_commit(),
+            'recorded_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': self.dataset,
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(data, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+        if options['compare']:
+            regressions = self.compare(options['compare'], data, options['fail_threshold'])
+            if regressions:
+                raise CommandError(f'Regressions over {options["fail_threshold"]}%: {", ".join(regressions)}')
+
+    def prepare(self):
+        self.dataset = {
+            'users': User.objects.count(),
+            'motions': Motion.objects.count(),
+            'responses': MotionResponse.objects.count(),
+            'votes': Vote.objects.count(),
+            'comments': Comment.objects.count(),
+        }
+        if not self.dataset['motions']:
+            raise CommandError('No motions to benchmark; run seed_data first.')
+
+        self.motion = (
+            Motion.objects.exclude(status=Motion.Status.DRAFT)
+            .annotate(total=Count('votes'))
+            .order_by('-total')
+            .first()
+        )
+        if self.motion is None:
+            raise CommandError('No published motions to benchmark; run seed_data first.')
+
+        largest_lga = (
+            User.objects.values('lga').annotate(total=Count('pk')).order_by('-total').first()['lga']
+        )
+        self.fanout_motion = Motion.objects.filter(
+            lga=largest_lga, status=Motion.Status.PUBLISHED,
+        ).select_related('author').first() or self.motion
+
+        # A youth user who has not voted on the benchmark motion, in its LGA
+        self.user = User.objects.filter(
+            role=User.Role.YOUTH, lga=self.motion.lga,
+        ).exclude(votes__motion=self.motion).first() or User.objects.first()
+
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.vote_flip = False
+
+    def measure(self, func, iterations, warmup):
+        """Run func repeatedly, each run rolled back so the dataset stays the same."""
+        timings = []
+        queries = []
+        for i in range(warmup + iterations):
+            counter = QueryCounter()
+            with transaction.atomic(), connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(counter.count)
+
+        return {
+            'iterations': iterations,
+            'queries': max(queries),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+        }
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        if response.status_code != 200:
+            raise CommandError(f'GET {url} returned {response.status_code}')
+        # Render streamed/lazy content inside the timing window.
+        response.content
+
+    def bench_feed(self):
+        self.get(reverse('motion_feed'))
+
+    def bench_feed_filtered(self):
+        self.get(reverse('motion_feed'), lga=self.motion.lga, jurisdiction=Motion.Jurisdiction.LOCAL)
+
+    def bench_detail(self):
+        self.get(reverse('motion_detail', args=[self.motion.pk]))
+
+    def bench_home(self):
+        self.get(reverse('home'))
+
+    def bench_dashboard(self):
+        self.get(reverse('public_dashboard'))
+
+    def bench_vote(self):
+        self.vote_flip = not self.vote_flip
+        vote_type = Vote.VoteType.APPROVE if self.vote_flip else Vote.VoteType.DISAPPROVE
+        response = self.client.post(
+            reverse('motion_vote', args=[self.motion.pk]),
+            {'vote_type': vote_type},
+        )
+        if response.status_code >= 400:
+            raise CommandError(f'Vote returned {response.status_code}')
+
+    def bench_comment(self):
+        response = self.client.post(
+            reverse('motion_comment', args=[self.motion.pk]),
+            {'content': 'Benchmark comment: more late night buses please.'},
+        )
+        if response.status_code >= 400:
+            raise CommandError(f'Comment returned {response.status_code}')
+
+    def bench_publish_fanout(self):
+        notify_new_motion(self.fanout_motion)
+
+    def bench_export_data(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('export_data', output=os.path.join(directory, 'bench'), stdout=StringIO())
+
+    def bench_check_deadlines(self):
+        call_command('check_deadlines', stdout=StringIO())
+
+    def report_line(self, name, result):
+        self.stdout.write(
+            f'  {name:<16} p50 {result["p50_ms"]:>10.2f} ms   p95 {result["p95_ms"]:>10.2f} ms   '
+            f'queries {result["queries"]:>7}'
+        )
+
+    def compare(self, path, current, threshold):
+        with open(path) as f:
+            baseline = json.load(f)
+
+        self.stdout.write(f'\nCompared with {path} (commit {baseline.get("commit")}):')
+        if baseline.get('dataset') != current['dataset']:
+            self.stdout.write(self.style.WARNING('  Datasets differ; timings may not be comparable.'))
+
+        regressions = []
+        for name, result in current['results'].items():
+            before = baseline['results'].get(name)
+            if before is None:
+                continue
+            changes = {
+                metric: self.change(before[metric], result[metric])
+                for metric in ('p50_ms', 'p95_ms', 'queries')
+            }
+            line = f'  {name:<16} ' + '   '.join(
+                f'{metric} {before[metric]} -> {result[metric]} ({change:+.1f}%)'
+                for metric, change in changes.items()
+            )
+            regressed = threshold is not None and (
+                changes['p95_ms'] > threshold or changes['queries'] > threshold
+            )
+            if regressed:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return regressions
+
+    def change(self, before, after):
+        if not before:
+            return 0.0 if not after else 100.0
+        return (after - before) / before * 100
@@ -0,0 +1,401 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from dashboard import stats
+from motions import transitions
+from motions.delivery import rollup_delivery_status
+from motions.models import Comment, Milestone, Motion, MotionResponse, Vote
+from motions.services import RESPONSE_DEADLINE_DAYS
+from notifications.models import Notification
+
+# Every seeded username starts with this, so seed data can be found and removed.
+SEED_PREFIX = 'seed_'
+SEED_PASSWORD = 'odyssey-seed'
+
+# Full-size volumes; --scale multiplies all of them.
+DEFAULT_VOLUMES = {
+    'users': 50_000,
+    'motions': 100_000,
+    'votes': 5_000_000,
+    'comments': 1_000_000,
+}
+
+LGA_WEIGHTS = {
+    User.LGA.NEWCASTLE: 45,
+    User.LGA.LAKE_MACQUARIE: 35,
+    User.LGA.PORT_STEPHENS: 20,
+}
+STATUS_WEIGHTS = {
+    Motion.Status.DRAFT: 5,
+    Motion.Status.PUBLISHED: 55,
+    Motion.Status.UNDER_REVIEW: 10,
+    Motion.Status.ACCEPTED: 12,
+    Motion.Status.MODIFIED: 8,
+    Motion.Status.REJECTED: 10,
+}
+JURISDICTION_WEIGHTS = {
+    Motion.Jurisdiction.LOCAL: 70,
+    Motion.Jurisdiction.STATE: 25,
+    Motion.Jurisdiction.FEDERAL: 5,
+}
+DECISIONS = {
+    Motion.Status.ACCEPTED: MotionResponse.Decision.ACCEPT,
+    Motion.Status.MODIFIED: MotionResponse.Decision.MODIFY,
+    Motion.Status.REJECTED: MotionResponse.Decision.REJECT,
+}
+# One in this many users is an accountable owner
+OWNER_EVERY = 500
+
+WORDS = (
+    'youth bus late night safe park library skate lighting transport housing '
+    'mental health jobs training sport climate beach pathway cycle community '
+    'centre free wifi study space art music festival water trees shade hub '
+    'apprenticeship mentoring council school traffic crossing bins recycling'
+).split()
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize() + '.'
+
+
+def weighted(rng, weights, k=1):
+    return rng.choices(list(weights), weights=list(weights.values()), k=k)
+
+
+def random_between(rng, start, end):
+    return start + (end - start) * rng.random()
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at values we set."""
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Generate realistic synthetic users, motions, votes, comments and responses for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Multiply all default volumes (default: 1.0, i.e. 50k users, 100k motions, 5M votes, 1M comments)',
+        )
+        for name in DEFAULT_VOLUMES:
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                help=f'Number of {name} to create (overrides --scale)',
+            )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per INSERT (default: 5000)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed, so runs are reproducible (default: 42)',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove previously seeded data first',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        volumes = {
+            name: options[name] if options[name] is not None else int(default * options['scale'])
+            for name, default in DEFAULT_VOLUMES.items()
+        }
+
+        seeded_users = User.objects.filter(username__startswith=SEED_PREFIX)
+        if options['clear']:
+            self.step('Removing previous seed data', self.clear)
+        elif seeded_users.exists():
+            raise CommandError('Seed data already exists; re-run with --clear to replace it.')
+
+        if volumes['users'] < 1 or volumes['motions'] < 1:
+            raise CommandError('Need at least one user and one motion.')
+
+        started = time.perf_counter()
+        with explicit_timestamps(User, Motion, MotionResponse, Milestone, Vote, Comment):
+            users = self.step('Users', self.create_users, volumes['users'])
+            motions = self.step('Motions', self.create_motions, volumes['motions'], users)
+            self.step('Responses', self.create_responses, motions, users)
+            self.step('Status history', self.create_transitions)
+            self.step('Milestones', self.create_milestones)
+            weights = self.engagement_weights(motions)
+            self.step('Votes', self.create_votes, volumes['votes'], weights, users)
+            self.step('Comments', self.create_comments, volumes['comments'], weights, users)
+        self.step('Dashboard statistics', stats.rebuild)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.perf_counter() - started:.0f}s; database now has '
+            f'{User.objects.count():,} users, {Motion.objects.count():,} motions, '
+            f'{Vote.objects.count():,} votes and {Comment.objects.count():,} comments'
+        ))
+
+    def step(self, label, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(f'  {label}: {time.perf_counter() - start:.1f}s')
+        return result
+
+    def insert(self, model, rows):
+        """bulk_create an iterable of unsaved instances in batches; returns the row count."""
+        total = 0
+        batch = []
+        with transaction.atomic():
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    model.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                model.objects.bulk_create(batch)
+                total += len(batch)
+        return total
+
+    def clear(self):
+        seeded_motions = Motion.objects.filter(author__username__startswith=SEED_PREFIX)
+        Vote.objects.filter(motion__in=seeded_motions).delete()
+        Comment.objects.filter(motion__in=seeded_motions).delete()
+        # The dashboard statistics are rebuilt once seeding finishes.
+        with stats.paused():
+            MotionResponse.objects.filter(motion__in=seeded_motions).delete()
+            seeded_motions.delete()
+        Notification.objects.filter(user__username__startswith=SEED_PREFIX).delete()
+        User.objects.filter(username__startswith=SEED_PREFIX).delete()
+
+    def create_users(self, count):
+        """Returns {'lga': {'youth': [ids], 'owner': [ids]}}."""
+        rng = self.rng
+        password = make_password(SEED_PASSWORD)
+        deliveries = {
+            User.EmailDelivery.IMMEDIATE: 80,
+            User.EmailDelivery.HOURLY: 5,
+            User.EmailDelivery.DAILY: 15,
+        }
+        lgas = weighted(rng, LGA_WEIGHTS, count)
+
+        def rows():
+            for i, lga in enumerate(lgas):
+                joined = self.now - timedelta(days=rng.uniform(0, 900))
+                yield User(
+                    username=f'{SEED_PREFIX}{i}',
+                    email=f'{SEED_PREFIX}{i}@example.com',
+                    password=password,
+                    lga=lga,
+                    role=User.Role.ACCOUNTABLE_OWNER if i % OWNER_EVERY == 0 else User.Role.YOUTH,
+                    child_safety_acknowledged=True,
+                    data_privacy_agreed=True,
+                    email_notifications_enabled=rng.random() < 0.9,
+                    email_delivery=weighted(rng, deliveries)[0],
+                    date_joined=joined,
+                    created_at=joined,
+                    updated_at=joined,
+                )
+
+        self.insert(User, rows())
+
+        users = {lga: {'youth': [], 'owner': []} for lga in LGA_WEIGHTS}
+        for pk, lga, role in User.objects.filter(username__startswith=SEED_PREFIX).values_list('pk', 'lga', 'role'):
+            users[lga]['owner' if role == User.Role.ACCOUNTABLE_OWNER else 'youth'].append(pk)
+        return users
+
+    def create_motions(self, count, users):
+        """Returns a list of (pk, lga, status, published_at) tuples."""
+        rng = self.rng
+        statuses = weighted(rng, STATUS_WEIGHTS, count)
+        lgas = weighted(rng, LGA_WEIGHTS, count)
+
+        def rows():
+            for status, lga in zip(statuses, lgas):
+                authors = users[lga]['youth'] or users[lga]['owner']
+                if not authors:
+                    continue
+                created = self.now - timedelta(days=rng.uniform(0, 730))
+                published = None
+                deadline = None
+                if status != Motion.Status.DRAFT:
+                    published = created + timedelta(hours=rng.uniform(0, 72))
+                    deadline = published + timedelta(days=RESPONSE_DEADLINE_DAYS)
+                if status in (Motion.Status.ACCEPTED, Motion.Status.MODIFIED):
+                    delivery = rng.choice(Motion.DeliveryStatus.values)
+                else:
+                    delivery = Motion.DeliveryStatus.NOT_STARTED
+                yield Motion(
+                    title=sentence(rng, 3, 9)[:200],
+                    evidence=sentence(rng, 30, 120),
+                    proposed_action=sentence(rng, 15, 60),
+                    resource_ask=sentence(rng, 5, 25),
+                    success_measures=sentence(rng, 10, 40),
+                    jurisdiction=weighted(rng, JURISDICTION_WEIGHTS)[0],
+                    lga=lga,
+                    status=status,
+                    delivery_status=delivery,
+                    author_id=rng.choice(authors),
+                    created_at=created,
+                    updated_at=published or created,
+                    published_at=published,
+                    response_deadline=deadline,
+                )
+
+        self.insert(Motion, rows())
+        return list(
+            Motion.objects.filter(author__username__startswith=SEED_PREFIX)
+            .order_by('pk')
+            .values_list('pk', 'lga', 'status', 'published_at')
+        )
+
+    def create_responses(self, motions, users):
+        rng = self.rng
+
+        def rows():
+            for pk, lga, status, published in motions:
+                decision = DECISIONS.get(status)
+                owners = users[lga]['owner']
+                if decision is None or not owners:
+                    continue
+                # Most responses land within the deadline, with a long tail of late ones.
+                responded = min(published + timedelta(days=rng.lognormvariate(2.8, 0.6)), self.now)
+                planned = decision != MotionResponse.Decision.REJECT
+                yield MotionResponse(
+                    motion_id=pk,
+                    accountable_owner_id=rng.choice(owners),
+                    decision=decision,
+                    reasons=sentence(rng, 20, 80),
+                    delivery_plan=sentence(rng, 20, 60) if planned else '',
+                    milestone_notes=sentence(rng, 10, 30) if planned else '',
+                    due_date=(responded + timedelta(days=rng.randint(30, 365))).date() if planned else None,
+                    alternative_pathway='' if planned else sentence(rng, 10, 40),
+                    created_at=responded,
+                    updated_at=responded,
+                )
+
+        return self.insert(MotionResponse, rows())
+
+    def create_transitions(self):
+        # Before the milestone rollup, which logs its own changes on top.
+        return transitions.backfill(Motion.objects.filter(author__username__startswith=SEED_PREFIX))
+
+    def create_milestones(self):
+        """Milestones for most delivery plans, then their motions' delivery status."""
+        rng = self.rng
+        today = self.now.date()
+        responses = MotionResponse.objects.filter(
+            motion__author__username__startswith=SEED_PREFIX, due_date__isnull=False,
+        ).order_by('pk').values_list('pk', 'created_at', 'due_date')
+
+        def rows():
+            for pk, responded, due in responses.iterator():
+                # The rest keep only their free-text notes.
+                if rng.random() < 0.2:
+                    continue
+                start = responded.date()
+                count = rng.randint(2, 5)
+                for i in range(1, count + 1):
+                    due_date = start + (due - start) * i / count
+                    elapsed = (today - due_date).days
+                    if elapsed > 0:
+                        # Past due: mostly done, some running late.
+                        status = weighted(rng, {'completed': 80, 'in_progress': 15, 'not_started': 4, 'cancelled': 1})[0]
+                    elif elapsed > -60:
+                        status = weighted(rng, {'completed': 20, 'in_progress': 60, 'not_started': 20})[0]
+                    else:
+                        status = weighted(rng, {'in_progress': 10, 'not_started': 90})[0]
+                    completed = None
+                    if status == Milestone.Status.COMPLETED:
+                        completed = min(
+                            responded + (due_date - start) + timedelta(days=rng.uniform(-14, 14)), self.now,
+                        )
+                    yield Milestone(
+                        response_id=pk,
+                        title=sentence(rng, 3, 8)[:200],
+                        due_date=due_date,
+                        status=status,
+                        completed_at=completed,
+                        created_at=responded,
+                        updated_at=completed or responded,
+                    )
+
+        created = self.insert(Milestone, rows())
+        # The dashboard statistics are rebuilt once seeding finishes.
+        with stats.paused():
+            rollup_delivery_status()
+        return created
+
+    def engagement_weights(self, motions):
+        """Skewed share of engagement per published motion: most get a little, a few get a lot."""
+        live = [motion for motion in motions if motion[3] is not None]
+        weights = [self.rng.paretovariate(1.5) for _ in live]
+        total = sum(weights)
+        return [(motion, weight / total) for motion, weight in zip(live, weights)]
+
+    def create_votes(self, count, weights, users):
+        rng = self.rng
+
+        def rows():
+            for (pk, lga, _, published), share in weights:
+                pool = users[lga]['youth']
+                for user_id in rng.sample(pool, min(round(count * share), len(pool))):
+                    voted = random_between(rng, published, self.now)
+                    yield Vote(
+                        motion_id=pk,
+                        user_id=user_id,
+                        vote_type=Vote.VoteType.APPROVE if rng.random() < 0.7 else Vote.VoteType.DISAPPROVE,
+                        created_at=voted,
+                    )
+
+        return self.insert(Vote, rows())
+
+    def create_comments(self, count, weights, users):
+        rng = self.rng
+
+        def rows():
+            for (pk, lga, _, published), share in weights:
+                pool = users[lga]['youth']
+                if not pool:
+                    continue
+                for _ in range(round(count * share)):
+                    posted = random_between(rng, published, self.now)
+                    yield Comment(
+                        motion_id=pk,
+                        author_id=rng.choice(pool),
+                        content=sentence(rng, 5, 60),
+                        is_hidden=rng.random() < 0.02,
+                        created_at=posted,
+                        updated_at=posted,
+                    )
+
+        return self.insert(Comment, rows())
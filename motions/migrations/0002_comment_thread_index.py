@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('motions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['motion', 'is_hidden', 'created_at'], name='comment_thread_idx'),
+        ),
+    ]
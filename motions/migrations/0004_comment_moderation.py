@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('motions', '0003_threaded_comments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationQueueItem',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'comment awaiting review',
+                'verbose_name_plural': 'moderation queue',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('motions.comment',),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='moderation_reasons',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='moderation_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='moderation_status',
+            field=models.CharField(choices=[('approved', 'Approved'), ('flagged', 'Flagged for review'), ('held', 'Held for review'), ('rejected', 'Rejected')], default='approved', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reviewed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reviewed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('moderation_status__in', ['flagged', 'held'])), fields=['-moderation_score'], name='comment_moderation_queue_idx'),
+        ),
+    ]
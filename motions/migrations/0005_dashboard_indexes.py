@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('motions', '0004_comment_moderation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='motion',
+            index=models.Index(fields=['lga', 'status', 'response_deadline', 'jurisdiction'], name='motion_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motionresponse',
+            index=models.Index(fields=['created_at'], name='response_created_idx'),
+        ),
+    ]
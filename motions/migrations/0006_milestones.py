@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('motions', '0005_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='motionresponse',
+            old_name='milestones',
+            new_name='milestone_notes',
+        ),
+        migrations.CreateModel(
+            name='Milestone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('due_date', models.DateField()),
+                ('status', models.CharField(choices=[('not_started', 'Not Started'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='not_started', max_length=20)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('response', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milestones', to='motions.motionresponse')),
+            ],
+            options={
+                'ordering': ['due_date', 'pk'],
+                'indexes': [models.Index(fields=['status', 'due_date'], name='milestone_overdue_idx')],
+            },
+        ),
+    ]
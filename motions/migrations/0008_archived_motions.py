@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('motions', '0007_status_transitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMotion',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('lga', models.CharField(choices=[('newcastle', 'Newcastle'), ('lake_macquarie', 'Lake Macquarie'), ('port_stephens', 'Port Stephens')], max_length=20)),
+                ('jurisdiction', models.CharField(choices=[('local', 'Local Council'), ('state', 'NSW State'), ('federal', 'Commonwealth')], max_length=20)),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('published', 'Published'), ('under_review', 'Under Review'), ('accepted', 'Accepted'), ('modified', 'Modified'), ('rejected', 'Rejected')], max_length=20)),
+                ('delivery_status', models.CharField(choices=[('not_started', 'Not Started'), ('on_track', 'On Track'), ('delayed', 'Delayed'), ('completed', 'Completed')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('published_at', models.DateTimeField(null=True)),
+                ('responded_at', models.DateTimeField(null=True)),
+                ('closed_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('approvals', models.PositiveIntegerField(default=0)),
+                ('disapprovals', models.PositiveIntegerField(default=0)),
+                ('comments', models.PositiveIntegerField(default=0)),
+                ('payload', models.BinaryField()),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_motions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-closed_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:13
+
+import json
+import zlib
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_owners(apps, schema_editor):
+    """Set accountable_owner from the username in each archived document."""
+    ArchivedMotion = apps.get_model('motions', 'ArchivedMotion')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    rows = ArchivedMotion.objects.filter(responded_at__isnull=False).values_list('pk', 'payload')
+    owners = {}
+    for pk, payload in rows.iterator(chunk_size=1000):
+        response = json.loads(zlib.decompress(payload))['response']
+        if response:
+            owners.setdefault(response['accountable_owner'], []).append(pk)
+    user_ids = dict(User.objects.filter(username__in=owners).values_list('username', 'pk'))
+    for username, pks in owners.items():
+        if username in user_ids:
+            for start in range(0, len(pks), 500):
+                ArchivedMotion.objects.filter(pk__in=pks[start:start + 500]).update(
+                    accountable_owner_id=user_ids[username],
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('motions', '0008_archived_motions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedmotion',
+            name='accountable_owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_responses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_owners, migrations.RunPython.noop),
+    ]
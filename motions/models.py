@@ -1,5 +1,32 @@
+import json
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
 from django.db import models
+from django.db.models import Count, F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+class MotionQuerySet(models.QuerySet):
+
+    def with_counts(self):
+        """Annotate vote and comment counts so listing them costs no extra queries."""
+        def count_of(model, **filters):
+            rows = model.objects.filter(motion=OuterRef('pk'), **filters).order_by()
+            return Coalesce(
+                Subquery(rows.values('motion').annotate(total=Count('pk')).values('total')),
+                0,
+            )
+
+        return self.annotate(
+            num_approvals=count_of(Vote, vote_type=Vote.VoteType.APPROVE),
+            num_disapprovals=count_of(Vote, vote_type=Vote.VoteType.DISAPPROVE),
+            num_comments=count_of(Comment, is_hidden=False),
+        )
 
 
 class Motion(models.Model):
@@ -79,20 +106,39 @@ class Motion(models.Model):
     published_at = models.DateTimeField(null=True, blank=True)
     response_deadline = models.DateTimeField(null=True, blank=True)
 
+    objects = MotionQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Owner dashboard queue: an LGA's pending motions by deadline,
+            # with jurisdiction filtered from the index.
+            models.Index(fields=['lga', 'status', 'response_deadline', 'jurisdiction'], name='motion_queue_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    # The count properties use the with_counts() annotations when present.
+
     @property
     def approval_count(self):
+        if hasattr(self, 'num_approvals'):
+            return self.num_approvals
         return self.votes.filter(vote_type='approve').count()
 
     @property
     def disapproval_count(self):
+        if hasattr(self, 'num_disapprovals'):
+            return self.num_disapprovals
         return self.votes.filter(vote_type='disapprove').count()
 
+    @property
+    def comment_count(self):
+        if hasattr(self, 'num_comments'):
+            return self.num_comments
+        return self.comments.filter(is_hidden=False).count()
+
 
 class MotionResponse(models.Model):
     """Official response to a motion from an Accountable Owner."""
@@ -117,7 +163,8 @@ class MotionResponse(models.Model):
 
     # For accepted/modified motions
     delivery_plan = models.TextField(blank=True)
-    milestones = models.TextField(blank=True)
+    # Free-text milestones from before Milestone existed; kept for reference.
+    milestone_notes = models.TextField(blank=True)
     due_date = models.DateField(null=True, blank=True)
 
     # For rejected motions
@@ -126,10 +173,194 @@ class MotionResponse(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Most recent responses first, for the dashboards.
+            models.Index(fields=['created_at'], name='response_created_idx'),
+        ]
+
     def __str__(self):
         return f"Response to: {self.motion.title}"
 
 
+class MilestoneQuerySet(models.QuerySet):
+
+    def tracking(self):
+        """Milestones that drive delivery status: all but cancelled ones."""
+        return self.exclude(status=Milestone.Status.CANCELLED)
+
+    def open(self):
+        return self.filter(status__in=Milestone.OPEN_STATUSES)
+
+    def overdue(self, today=None):
+        """Open milestones whose due date has passed (uses milestone_overdue_idx)."""
+        today = today or timezone.localdate()
+        return self.open().filter(due_date__lt=today)
+
+
+class Milestone(models.Model):
+    """A dated delivery step promised in a response.
+
+    Motions whose response has milestones get their delivery_status derived
+    from them (see motions.delivery).
+    """
+
+    class Status(models.TextChoices):
+        NOT_STARTED = 'not_started', 'Not Started'
+        IN_PROGRESS = 'in_progress', 'In Progress'
+        COMPLETED = 'completed', 'Completed'
+        CANCELLED = 'cancelled', 'Cancelled'
+
+    OPEN_STATUSES = [Status.NOT_STARTED, Status.IN_PROGRESS]
+
+    response = models.ForeignKey(
+        MotionResponse,
+        on_delete=models.CASCADE,
+        related_name='milestones',
+    )
+    title = models.CharField(max_length=200)
+    due_date = models.DateField()
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.NOT_STARTED,
+    )
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MilestoneQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['due_date', 'pk']
+        indexes = [
+            # Overdue milestones across the portfolio: one range scan per
+            # open status. (Not a partial index: SQLite can't match its
+            # condition against the bound parameters Django sends.)
+            models.Index(fields=['status', 'due_date'], name='milestone_overdue_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def is_overdue(self):
+        return self.status in self.OPEN_STATUSES and self.due_date < timezone.localdate()
+
+    def save(self, *args, **kwargs):
+        if self.status == self.Status.COMPLETED:
+            if self.completed_at is None:
+                self.completed_at = timezone.now()
+        else:
+            self.completed_at = None
+        super().save(*args, **kwargs)
+
+
+class StatusTransition(models.Model):
+    """One change of a motion's status or delivery status. Append-only.
+
+    Written by motions.transitions for every save and bulk update; the
+    first row for a motion has an empty from_state.
+    """
+
+    class Field(models.IntegerChoices):
+        STATUS = 1, 'Status'
+        DELIVERY_STATUS = 2, 'Delivery status'
+
+    # (motion, created_at) below serves lookups by motion, so the foreign
+    # key doesn't get an index of its own.
+    motion = models.ForeignKey(
+        Motion,
+        on_delete=models.CASCADE,
+        related_name='transitions',
+        db_index=False,
+    )
+    field = models.PositiveSmallIntegerField(choices=Field.choices)
+    from_state = models.CharField(max_length=20, blank=True)
+    to_state = models.CharField(max_length=20)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at', 'pk']
+        indexes = [
+            # All transitions for a motion, in order.
+            models.Index(fields=['motion', 'created_at'], name='transition_motion_idx'),
+            # All transitions in a time window.
+            models.Index(fields=['created_at'], name='transition_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.motion_id} {self.get_field_display()}: {self.from_state or "-"} -> {self.to_state}'
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Status transitions are append-only.')
+        super().save(*args, **kwargs)
+
+
+class ArchivedMotion(models.Model):
+    """A closed motion moved out of the live tables (see motions.archive).
+
+    Keeps the motion's id, so its links still work, and as columns the
+    fields listings, the dashboard statistics and the response-time
+    analytics need. Votes and comments
+    are reduced to their final counts; the rest of the motion, its response,
+    milestones and status history are one zlib-compressed JSON document.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    lga = models.CharField(max_length=20, choices=Motion._meta.get_field('lga').choices)
+    jurisdiction = models.CharField(max_length=20, choices=Motion.Jurisdiction.choices)
+    status = models.CharField(max_length=20, choices=Motion.Status.choices)
+    delivery_status = models.CharField(max_length=20, choices=Motion.DeliveryStatus.choices)
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_motions',
+    )
+    accountable_owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_responses',
+    )
+
+    created_at = models.DateTimeField()
+    published_at = models.DateTimeField(null=True)
+    responded_at = models.DateTimeField(null=True)
+    closed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    approvals = models.PositiveIntegerField(default=0)
+    disapprovals = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+
+    payload = models.BinaryField()
+
+    class Meta:
+        ordering = ['-closed_at']
+
+    def __str__(self):
+        return self.title
+
+    @staticmethod
+    def pack(document):
+        return zlib.compress(json.dumps(document, cls=DjangoJSONEncoder, separators=(',', ':')).encode())
+
+    @cached_property
+    def document(self):
+        return json.loads(zlib.decompress(self.payload))
+
+
 class Vote(models.Model):
     """User vote (approve/disapprove) on a motion."""
 
@@ -157,9 +388,138 @@ class Vote(models.Model):
         return f"{self.user.username} - {self.vote_type} - {self.motion.title}"
 
 
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Replies are stored with a materialized path: the ids of all their ancestors,
+# each zero-padded to PATH_SEGMENT_WIDTH digits. A comment's whole subtree is
+# then one index range scan (see subtree_range) and sorting replies by
+# (path, id) always puts a comment before its replies.
+PATH_SEGMENT_WIDTH = 10
+MAX_THREAD_DEPTH = 6
+
+
+def path_segment(pk):
+    return f'{pk:0{PATH_SEGMENT_WIDTH}d}'
+
+
+def subtree_range(prefix):
+    """Match paths starting with prefix.
+
+    Paths are all digits, so "starts with prefix" is the range up to prefix
+    plus one. Unlike LIKE 'prefix%' this can use a plain index on every
+    backend and collation.
+    """
+    upper = str(int(prefix) + 1).zfill(len(prefix))
+    return Q(path__gte=prefix, path__lt=upper)
+
+
+class CommentQuerySet(models.QuerySet):
+
+    def thread(self):
+        """Visible top-level comments, oldest first, with just what the thread displays."""
+        return self.filter(parent__isnull=True).displayed().order_by('created_at', 'pk')
+
+    def displayed(self):
+        return (
+            self.filter(is_hidden=False)
+            .select_related('author')
+            .only('motion', 'parent', 'root', 'path', 'content', 'created_at', 'author__username')
+        )
+
+    def replies(self, roots, limit=None):
+        """Visible replies under the top-level comments roots, in one query.
+
+        With limit, only the first limit replies of each thread are returned
+        (a window function). "First" is (path, id) order: shallower replies
+        before deeper ones, and every ancestor before its descendants, so a
+        truncated thread never contains a reply without its parent. Sort by
+        subtree_path for depth-first display order.
+        """
+        queryset = self.filter(root__in=[root.pk for root in roots]).displayed()
+        if limit is not None:
+            queryset = queryset.annotate(position=Window(
+                RowNumber(), partition_by=[F('root')], order_by=[F('path').asc(), F('pk').asc()],
+            )).filter(position__lte=limit)
+        return queryset.order_by('root', 'path', 'pk')
+
+    def with_replies(self):
+        """These comments and every reply beneath them.
+
+        Top-level comments match their thread by ``root``; deeper ones by
+        path prefix.
+        """
+        comments = list(self.only('pk', 'parent', 'path'))
+        if not comments:
+            return self.none()
+        condition = Q(pk__in=[comment.pk for comment in comments])
+        top_level = [comment.pk for comment in comments if comment.parent_id is None]
+        if top_level:
+            condition |= Q(root__in=top_level)
+        for comment in comments:
+            if comment.parent_id is not None:
+                condition |= subtree_range(comment.subtree_path)
+        return Comment.objects.filter(condition)
+
+    def approve(self, reviewer):
+        """Publish these comments after review."""
+        return self.update(
+            moderation_status=Comment.ModerationStatus.APPROVED,
+            is_hidden=False,
+            reviewed_by=reviewer,
+            reviewed_at=timezone.now(),
+        )
+
+    def reject(self, reviewer):
+        """Hide these comments, and any replies to them, after review."""
+        self.set_hidden(True)
+        return self.update(
+            moderation_status=Comment.ModerationStatus.REJECTED,
+            reviewed_by=reviewer,
+            reviewed_at=timezone.now(),
+        )
+
+    def set_hidden(self, hidden, chunk_size=200):
+        """Hide or show these comments together with all their replies.
+
+        Showing skips comments that are held or were rejected by moderation.
+
+        Chunked so the OR of path ranges stays within SQLite's expression
+        depth limit. Returns the number of rows updated.
+        """
+        ids = list(self.values_list('pk', flat=True))
+        updated = 0
+        for start in range(0, len(ids), chunk_size):
+            chunk = Comment.objects.filter(pk__in=ids[start:start + chunk_size]).with_replies()
+            if not hidden:
+                # Held and rejected comments only come back through moderation.
+                chunk = chunk.exclude(moderation_status__in=[
+                    Comment.ModerationStatus.HELD, Comment.ModerationStatus.REJECTED,
+                ])
+            updated += chunk.update(is_hidden=hidden)
+        return updated
+
+    def after(self, cursor):
+        """Keyset-filter to the comments after cursor (see Comment.cursor).
+
+        Malformed cursors are ignored, as in the notification inbox.
+        """
+        try:
+            micros, pk = (int(part) for part in cursor.split('.'))
+        except (AttributeError, ValueError):
+            return self
+        created_at = EPOCH + timedelta(microseconds=micros)
+        return self.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+
+
 class Comment(models.Model):
     """User comment on a motion."""
 
+    class ModerationStatus(models.TextChoices):
+        APPROVED = 'approved', 'Approved'
+        FLAGGED = 'flagged', 'Flagged for review'
+        HELD = 'held', 'Held for review'
+        REJECTED = 'rejected', 'Rejected'
+
     motion = models.ForeignKey(
         Motion,
         on_delete=models.CASCADE,
@@ -171,12 +531,96 @@ class Comment(models.Model):
         related_name='comments',
     )
     content = models.TextField()
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='children',
+    )
+    # Top-level comment of the thread (null for top-level comments) and the
+    # ancestors' path; both are set from parent on save.
+    root = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+    )
+    path = models.CharField(max_length=PATH_SEGMENT_WIDTH * MAX_THREAD_DEPTH, blank=True, editable=False)
     is_hidden = models.BooleanField(default=False)
+
+    # Set by motions.moderation when the comment is posted. Held comments
+    # stay hidden until a moderator approves them.
+    moderation_status = models.CharField(
+        max_length=10,
+        choices=ModerationStatus.choices,
+        default=ModerationStatus.APPROVED,
+    )
+    moderation_score = models.FloatField(default=0)
+    moderation_reasons = models.CharField(max_length=255, blank=True)
+    reviewed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['motion', 'is_hidden', 'created_at'], name='comment_thread_idx'),
+            models.Index(fields=['root', 'path'], name='comment_replies_idx'),
+            models.Index(fields=['path'], name='comment_path_idx'),
+            models.Index(
+                fields=['-moderation_score'],
+                condition=models.Q(moderation_status__in=['flagged', 'held']),
+                name='comment_moderation_queue_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.motion.title}"
+
+    def save(self, *args, **kwargs):
+        if self.parent_id is not None and self._state.adding:
+            parent = self.parent
+            self.root_id = parent.root_id or parent.pk
+            self.path = parent.subtree_path
+        super().save(*args, **kwargs)
+
+    @property
+    def depth(self):
+        """0 for top-level comments, 1 for their replies and so on."""
+        return len(self.path) // PATH_SEGMENT_WIDTH
+
+    @property
+    def accepts_replies(self):
+        return self.depth < MAX_THREAD_DEPTH
+
+    @property
+    def subtree_path(self):
+        """The path prefix shared by every reply beneath this comment."""
+        return self.path + path_segment(self.pk)
+
+    @property
+    def cursor(self):
+        """Keyset position of this comment: "<created_at in µs since epoch>.<pk>"."""
+        return f'{(self.created_at - EPOCH) // timedelta(microseconds=1)}.{self.pk}'
+
+
+class ModerationQueueItem(Comment):
+    """Comments awaiting moderator review, for the admin moderation queue."""
+
+    class Meta:
+        proxy = True
+        verbose_name = 'comment awaiting review'
+        verbose_name_plural = 'moderation queue'
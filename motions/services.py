@@ -0,0 +1,68 @@
+"""
+Publishing and responding to motions.
+
+Each function makes its change in one transaction: the motion together with
+everything that has to agree with it, including the status history and the
+dashboard counts kept by signals. If any statement fails, nothing is written.
+Fan-out is passed to ``config.tasks.defer`` and runs after the commit, off
+the request:
+
+- notifications for a newly published motion are deferred here;
+- notifications for a response are deferred by notifications/signals.py.
+
+Each notification also updates the recipient's unread count, invalidates
+their cached user and sends any email.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from config.tasks import defer
+from notifications.services import motion_published
+from .models import Motion, MotionResponse
+
+# Default response deadline in days
+RESPONSE_DEADLINE_DAYS = 30
+
+DECISION_STATUS = {
+    MotionResponse.Decision.ACCEPT: Motion.Status.ACCEPTED,
+    MotionResponse.Decision.MODIFY: Motion.Status.MODIFIED,
+    MotionResponse.Decision.REJECT: Motion.Status.REJECTED,
+}
+
+
+def save_motion(motion):
+    """Save a new or edited motion; returns True if this save published it.
+
+    The first save with status published sets published_at and the response
+    deadline, and notifies the motion's LGA once committed.
+    """
+    publishing = motion.status == Motion.Status.PUBLISHED and motion.published_at is None
+    if publishing:
+        motion.published_at = timezone.now()
+        motion.response_deadline = motion.published_at + timedelta(days=RESPONSE_DEADLINE_DAYS)
+    with transaction.atomic():
+        motion.save()
+        if publishing:
+            defer(motion_published, motion.pk)
+    return publishing
+
+
+def respond(motion, response, milestones=()):
+    """Save response (unsaved, decision and owner set) to motion, with its milestones.
+
+    The motion moves to the status matching the decision. Milestones are
+    unsaved instances pointing at response, and are dropped for a rejection.
+    A second response to the same motion fails on the one-to-one constraint
+    (IntegrityError) and writes nothing.
+    """
+    with transaction.atomic():
+        motion.status = DECISION_STATUS[response.decision]
+        motion.save()
+        response.motion = motion
+        response.save()
+        if response.decision != MotionResponse.Decision.REJECT:
+            for milestone in milestones:
+                milestone.save()
+    return response
@@ -0,0 +1,47 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import transitions
+from .delivery import rollup_delivery_status
+from .models import Milestone, Motion
+
+
+@receiver(pre_save, sender=Motion)
+def remember_states(sender, instance, raw=False, **kwargs):
+    # Read from the database, like the dashboard statistics, so a stale
+    # in-memory copy can't hide or invent a transition.
+    instance._transition_old = None
+    if raw or instance._state.adding:
+        return
+    instance._transition_old = (
+        Motion.objects.filter(pk=instance.pk).values(*transitions.FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Motion)
+def record_transitions(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_transition_old', None)
+    if old is None and not created:
+        return
+    new = {name: getattr(instance, name) for name in transitions.FIELDS}
+    rows = transitions.transitions(instance.pk, old, new, actor_id=transitions.current_actor_id())
+    if rows:
+        transitions.record(rows)
+
+
+@receiver(post_save, sender=Milestone)
+def milestone_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rollup_delivery_status([instance.response.motion_id])
+
+
+@receiver(post_delete, sender=Milestone)
+def milestone_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting a whole response or motion leaves nothing to roll up.
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if model is Milestone:
+        rollup_delivery_status([instance.response.motion_id])
@@ -1,3 +1,1177 @@
-from django.test import TestCase
+import asyncio
+import random
+import statistics
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.utils import ConnectionDoesNotExist
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from accounts.models import User
+from dashboard.models import PartitionStat
+from dashboard.stats import compute
+from notifications.models import Notification
+from config.middleware import QueryBudgetExceeded
+from config.ratelimit import SlidingWindowLimiter
+from config.routers import PIN_COOKIE, ReplicaRouter, use_replica
+from config import tasks
+from config.tasks import TaskRunner
+from config.testing import QueryBudgetTestCase, ReplicaTestCase, async_views
+from . import events
+from .analytics import BUCKET_LABELS, month_starts, response_latency, time_in_state
+from .archive import archive_batch
+from .delivery import rollup_delivery_status
+from .transitions import backfill, update_states
+from .moderation import Scorer, trie_pattern
+from .services import save_motion
+from .models import ArchivedMotion, Milestone, Motion, MotionResponse, StatusTransition, Vote, Comment
+from .vote_buffer import VoteBuffer
+from .views import (
+    COMMENTS_PAGE_SIZE, REPLIES_PREVIEW, AsyncMotionDetailView, AsyncMotionFeedView,
+    MotionDetailView, MotionFeedView,
+)
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('youth', password='pass', lga='newcastle')
+        cls.owner = User.objects.create_user('owner', password='pass', lga='newcastle', role='owner')
+        for i in range(12):
+            cls.motion = Motion.objects.create(
+                title=f'Motion {i}', evidence='Evidence', proposed_action='Action',
+                resource_ask='Ask', success_measures='Measures', lga='newcastle',
+                author=cls.user, status='published',
+            )
+            Vote.objects.create(motion=cls.motion, user=cls.user, vote_type='approve')
+            Vote.objects.create(motion=cls.motion, user=cls.owner, vote_type='disapprove')
+            Comment.objects.create(motion=cls.motion, author=cls.user, content='First')
+            Comment.objects.create(motion=cls.motion, author=cls.owner, content='Second')
+        MotionResponse.objects.create(
+            motion=cls.motion, accountable_owner=cls.owner, decision='accept', reasons='Reasons',
+        )
+
+    def test_feed(self):
+        self.assertWithinBudget(reverse('motion_feed'))
+
+    def test_detail(self):
+        self.assertWithinBudget(reverse('motion_detail', args=[self.motion.pk]))
+
+    def test_vote(self):
+        response = self.assertWithinBudget(
+            reverse('motion_vote', args=[self.motion.pk]), {'vote_type': 'disapprove'}, method='post',
+        )
+        self.assertEqual(response.json()['disapproval_count'], 2)
+
+    def test_comment(self):
+        self.assertWithinBudget(
+            reverse('motion_comment', args=[self.motion.pk]), {'content': 'Third'}, method='post', status=302,
+        )
+
+    def test_comment_page(self):
+        response = self.assertWithinBudget(reverse('motion_comments', args=[self.motion.pk]))
+        self.assertContains(response, 'Second')
+
+    def test_over_budget_raises(self):
+        with mock.patch.object(MotionFeedView, 'query_budget', 1):
+            with self.assertLogs('odyssey.requests', 'WARNING'), self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('motion_feed'))
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class AsyncViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('youth', password='pass', lga='newcastle')
+        cls.owner = User.objects.create_user('owner', password='pass', lga='newcastle', role='owner')
+        for i in range(3):
+            cls.motion = Motion.objects.create(
+                title=f'Motion {i}', evidence='Evidence', proposed_action='Action',
+                resource_ask='Ask', success_measures='Measures', lga='newcastle',
+                author=cls.user, status='published',
+            )
+        Vote.objects.create(motion=cls.motion, user=cls.user, vote_type='approve')
+        Comment.objects.create(motion=cls.motion, author=cls.owner, content='Looking into it')
+        response = MotionResponse.objects.create(
+            motion=cls.motion, accountable_owner=cls.owner, decision='accept', reasons='Reasons',
+        )
+        Milestone.objects.create(response=response, title='Consult', due_date=timezone.localdate())
+
+    def setUp(self):
+        self.async_client.force_login(self.user)
+
+    def assertServedAsync(self, response):
+        self.assertTrue(response.resolver_match.func.view_class.view_is_async)
+        profile = response.asgi_request.profile
+        self.assertGreater(profile.query_count, 0)
+        self.assertLessEqual(profile.query_count, profile.budget)
+
+    def test_switch(self):
+        with async_views(False):
+            self.assertIs(resolve(reverse('motion_feed')).func.view_class, MotionFeedView)
+            self.assertIs(resolve(reverse('motion_detail', args=[1])).func.view_class, MotionDetailView)
+        with async_views():
+            self.assertIs(resolve(reverse('motion_feed')).func.view_class, AsyncMotionFeedView)
+            self.assertIs(resolve(reverse('motion_detail', args=[1])).func.view_class, AsyncMotionDetailView)
+
+    async def test_feed(self):
+        with async_views():
+            response = await self.async_client.get(reverse('motion_feed'))
+            self.assertContains(response, 'Motion 2')
+            self.assertEqual(response.context['paginator'].count, 3)
+            self.assertServedAsync(response)
+
+    async def test_detail(self):
+        with async_views():
+            response = await self.async_client.get(reverse('motion_detail', args=[self.motion.pk]))
+            missing = await self.async_client.get(reverse('motion_detail', args=[self.motion.pk + 100]))
+            self.assertContains(response, 'Looking into it')
+            self.assertEqual(response.context['user_vote'], 'approve')
+            self.assertEqual([m.title for m in response.context['milestones']], ['Consult'])
+            self.assertServedAsync(response)
+            self.assertEqual(missing.status_code, 404)
+
+
+@override_settings(MOTION_EVENTS={
+    'BACKEND': 'motions.events.InProcessBackend', 'HEARTBEAT_SECONDS': 15, 'MAX_STREAM_SECONDS': 60,
+})
+class MotionEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('streamer', password='pass', lga='newcastle')
+        cls.motion = Motion.objects.create(
+            title='Live motion', evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+            success_measures='Measures', lga='newcastle', author=author, status='published',
+        )
+
+    def setUp(self):
+        patcher = mock.patch.object(events, '_hub', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_fan_out_and_unsubscribe(self):
+        hub = events.get_event_hub()
+        first, second = hub.subscribe(1), hub.subscribe(1)
+        other = hub.subscribe(2)
+        # Publishers are sync views in worker threads.
+        await sync_to_async(events.publish, thread_sensitive=False)(1, 'vote', {'approval_count': 3})
+        for subscription in (first, second):
+            self.assertEqual(
+                await asyncio.wait_for(subscription.queue.get(), 1), ('vote', {'approval_count': 3}),
+            )
+        self.assertTrue(other.queue.empty())
+
+        hub.unsubscribe(1, first)
+        hub.unsubscribe(1, second)
+        hub.unsubscribe(2, other)
+        self.assertEqual(hub._subscribers, {})
+
+    async def test_missing_motion(self):
+        response = await self.async_client.get(reverse('motion_events', args=[self.motion.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_stream(self):
+        response = await self.async_client.get(reverse('motion_events', args=[self.motion.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = aiter(response.streaming_content)
+        self.assertEqual(await anext(frames), b'retry: 15000\n\n')
+
+        hub = events.get_event_hub()
+        self.assertEqual(len(hub._subscribers[self.motion.pk]), 1)
+        events.publish(self.motion.pk, 'comment', {'comments': ['Hello']})
+        self.assertEqual(
+            await asyncio.wait_for(anext(frames), 1),
+            b'event: comment\ndata: {"comments": ["Hello"]}\n\n',
+        )
+
+        # Expired streams end, and unsubscribe, by themselves.
+        with override_settings(MOTION_EVENTS={**settings.MOTION_EVENTS, 'MAX_STREAM_SECONDS': 0.05}):
+            response = await self.async_client.get(reverse('motion_events', args=[self.motion.pk]))
+            expiring = aiter(response.streaming_content)
+            self.assertEqual(await anext(expiring), b'retry: 15000\n\n')
+            self.assertEqual(len(hub._subscribers[self.motion.pk]), 2)
+            self.assertEqual([frame async for frame in expiring], [b': keepalive\n\n'])
+        self.assertEqual(len(hub._subscribers[self.motion.pk]), 1)
+
+    async def test_closing_the_stream_unsubscribes(self):
+        stream = events.stream(self.motion.pk)
+        await anext(stream)
+        self.assertEqual(len(events.get_event_hub()._subscribers[self.motion.pk]), 1)
+        # As when the server closes the response of a client that went away.
+        await stream.aclose()
+        self.assertEqual(events.get_event_hub()._subscribers, {})
+
+
+class ReadReplicaRoutingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('youth', password='pass', lga='newcastle')
+        cls.motion = Motion.objects.create(
+            title='Motion', evidence='Evidence', proposed_action='Action',
+            resource_ask='Ask', success_measures='Measures', lga='newcastle',
+            author=cls.user, status='published',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.router = ReplicaRouter()
+
+    def test_reads_use_primary_without_replica(self):
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Motion), 'default')
+        self.assertEqual(self.client.get(reverse('motion_feed')).status_code, 200)
+
+    @mock.patch('config.routers.replica_alias', return_value='replica')
+    def test_router(self, _):
+        self.assertEqual(self.router.db_for_read(Motion), 'default')
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Motion), 'replica')
+            self.assertEqual(self.router.db_for_read(Session), 'default')
+            self.assertEqual(self.router.db_for_write(Motion), 'default')
+
+    @mock.patch('config.routers.replica_alias', return_value='replica')
+    def test_public_get_reads_from_replica(self, _):
+        # The test has no 'replica' connection, so reaching it raises.
+        with self.assertRaises(ConnectionDoesNotExist):
+            self.client.get(reverse('motion_feed'))
+
+    @mock.patch('config.routers.replica_alias', return_value='replica')
+    def test_write_pins_browser_to_primary(self, _):
+        response = self.client.post(reverse('motion_vote', args=[self.motion.pk]), {'vote_type': 'approve'})
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+
+        response = self.client.get(reverse('motion_detail', args=[self.motion.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+class ReplicaDatabaseTests(ReplicaTestCase):
+    """Routing against a real replica holding an older copy of the motion."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('youth', password='pass', lga='newcastle')
+        cls.motion = Motion.objects.create(
+            title='Primary title', evidence='Evidence', proposed_action='Action',
+            resource_ask='Ask', success_measures='Measures', lga='newcastle',
+            author=cls.user, status='published',
+        )
+        # bulk_create skips the signals, which would write to the primary.
+        replica = settings.READ_REPLICA_ALIAS
+        User.objects.using(replica).bulk_create([User.objects.get(pk=cls.user.pk)])
+        stale = Motion.objects.get(pk=cls.motion.pk)
+        stale.title = 'Replica title'
+        Motion.objects.using(replica).bulk_create([stale])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.detail_url = reverse('motion_detail', args=[self.motion.pk])
+
+    def test_get_reads_from_replica(self):
+        self.assertContains(self.client.get(reverse('motion_feed')), 'Replica title')
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, 'Replica title')
+        self.assertNotContains(response, 'Primary title')
+
+    def test_views_without_opt_in_read_from_primary(self):
+        with use_replica():
+            self.assertEqual(Motion.objects.get(pk=self.motion.pk).title, 'Replica title')
+        self.assertEqual(Motion.objects.get(pk=self.motion.pk).title, 'Primary title')
+
+    def test_write_reaches_primary_and_pins_browser(self):
+        response = self.client.post(reverse('motion_vote', args=[self.motion.pk]), {'vote_type': 'approve'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+        self.assertTrue(Vote.objects.using('default').filter(motion=self.motion, user=self.user).exists())
+        self.assertFalse(Vote.objects.using(settings.READ_REPLICA_ALIAS).exists())
+
+        # The pinned browser now reads its own write from the primary.
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, 'Primary title')
+        self.assertEqual(response.context['user_vote'], 'approve')
+
+
+class CommentPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('talker', password='pass', lga='newcastle')
+        cls.motion = Motion.objects.create(
+            title='Busy motion', evidence='Evidence', proposed_action='Action',
+            resource_ask='Ask', success_measures='Measures', lga='newcastle',
+            author=author, status='published',
+        )
+        Comment.objects.bulk_create([
+            Comment(motion=cls.motion, author=author, content=f'Comment {i}', is_hidden=i % 10 == 0)
+            for i in range(COMMENTS_PAGE_SIZE * 2 + 5)
+        ])
+        # Identical timestamps must still page by id without gaps or repeats.
+        first = Comment.objects.order_by('pk').first()
+        Comment.objects.filter(pk__lte=first.pk + COMMENTS_PAGE_SIZE + 3).update(created_at=first.created_at)
+        cls.visible_ids = list(
+            Comment.objects.filter(is_hidden=False).order_by('created_at', 'pk').values_list('pk', flat=True)
+        )
+
+    def test_detail_shows_first_page_and_visible_count(self):
+        response = self.client.get(reverse('motion_detail', args=[self.motion.pk]))
+        self.assertEqual(len(response.context['comments']), COMMENTS_PAGE_SIZE)
+        self.assertContains(response, f'<span id="comment-count">{len(self.visible_ids)}</span>', html=True)
+        self.assertContains(response, 'data-load-more')
+
+    def test_load_more_walks_every_visible_comment_once(self):
+        url = reverse('motion_comments', args=[self.motion.pk])
+        seen, cursor = [], None
+        while True:
+            data = self.client.get(url, {'format': 'json', **({'after': cursor} if cursor else {})}).json()
+            seen += [comment['id'] for comment in data['comments']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.visible_ids)
+
+    def test_missing_or_archived_motion_is_404(self):
+        self.assertEqual(self.client.get(reverse('motion_comments', args=[self.motion.pk + 1])).status_code, 404)
+        Motion.objects.filter(pk=self.motion.pk).update(status='rejected')
+        archive_batch({self.motion.pk: timezone.now()})
+        self.assertEqual(self.client.get(reverse('motion_comments', args=[self.motion.pk])).status_code, 404)
+
+
+class ThreadedCommentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('replier', password='pass', lga='newcastle')
+        cls.motion = Motion.objects.create(
+            title='Threaded motion', evidence='Evidence', proposed_action='Action',
+            resource_ask='Ask', success_measures='Measures', lga='newcastle',
+            author=cls.user, status='published',
+        )
+
+    def comment(self, content, parent=None):
+        return Comment.objects.create(motion=self.motion, author=self.user, content=content, parent=parent)
+
+    def test_reply_through_the_view_extends_the_path(self):
+        root = self.comment('Root')
+        self.client.force_login(self.user)
+        self.client.post(reverse('motion_comment', args=[self.motion.pk]), {'content': 'Child', 'parent': root.pk})
+        child = Comment.objects.get(content='Child')
+        self.client.post(reverse('motion_comment', args=[self.motion.pk]), {'content': 'Grandchild', 'parent': child.pk})
+        grandchild = Comment.objects.get(content='Grandchild')
+        self.assertEqual((child.root_id, child.depth), (root.pk, 1))
+        self.assertEqual((grandchild.root_id, grandchild.depth), (root.pk, 2))
+        self.assertTrue(grandchild.path.startswith(child.path))
+
+    def test_detail_previews_replies_in_two_queries(self):
+        root = self.comment('Root')
+        first = self.comment('First reply', root)
+        self.comment('Nested reply', first)
+        for i in range(REPLIES_PREVIEW):
+            self.comment(f'Later reply {i}', root)
+        other = self.comment('Other root')
+
+        with self.assertNumQueries(2):
+            comments = list(Comment.objects.filter(motion=self.motion).thread())
+            replies = list(Comment.objects.replies(comments, REPLIES_PREVIEW + 1))
+        self.assertEqual([c.content for c in comments], ['Root', 'Other root'])
+        # Capped per thread, in (path, id) order: every reply under Root is
+        # returned except the last, and Other root has none.
+        every = list(Comment.objects.replies(comments))
+        self.assertEqual(len(every), REPLIES_PREVIEW + 2)
+        self.assertEqual([reply.pk for reply in replies], [reply.pk for reply in every][:REPLIES_PREVIEW + 1])
+        self.assertEqual(
+            [(reply.path, reply.pk) for reply in replies], sorted((reply.path, reply.pk) for reply in replies),
+        )
+        self.assertEqual({reply.root_id for reply in replies}, {root.pk})
+        self.assertEqual(
+            [reply.content for reply in replies],
+            ['First reply', 'Later reply 0', 'Later reply 1', 'Later reply 2'],
+        )
+
+        response = self.client.get(reverse('motion_detail', args=[self.motion.pk]))
+        root = response.context['comments'][0]
+        self.assertEqual(
+            [reply.content for reply in root.thread_replies],
+            ['First reply', 'Later reply 0', 'Later reply 1'],
+        )
+        self.assertTrue(root.more_replies)
+        self.assertContains(response, reverse('motion_comment_thread', args=[self.motion.pk, root.pk]))
+        self.assertFalse(response.context['comments'][1].more_replies)
+
+        thread = self.client.get(
+            reverse('motion_comment_thread', args=[self.motion.pk, root.pk]), {'format': 'json'},
+        ).json()
+        self.assertEqual(
+            [reply['content'] for reply in thread['replies']],
+            ['First reply', 'Nested reply', 'Later reply 0', 'Later reply 1', 'Later reply 2'],
+        )
+        self.assertNotIn(other.pk, [reply['id'] for reply in thread['replies']])
+
+    def test_hiding_a_comment_hides_its_subtree(self):
+        root = self.comment('Root')
+        child = self.comment('Child', root)
+        grandchild = self.comment('Grandchild', child)
+        sibling = self.comment('Sibling', root)
+
+        updated = Comment.objects.filter(pk=child.pk).set_hidden(True)
+        self.assertEqual(updated, 2)
+        hidden = set(Comment.objects.filter(is_hidden=True).values_list('pk', flat=True))
+        self.assertEqual(hidden, {child.pk, grandchild.pk})
+
+        Comment.objects.filter(pk=root.pk).set_hidden(True)
+        self.assertEqual(Comment.objects.filter(is_hidden=False).count(), 0)
+        Comment.objects.filter(pk=root.pk).set_hidden(False)
+        self.assertTrue(Comment.objects.get(pk=sibling.pk).is_hidden is False)
+        self.assertEqual(Comment.objects.filter(is_hidden=False).count(), 4)
+
+    def test_cannot_reply_to_hidden_comment(self):
+        root = self.comment('Root')
+        Comment.objects.filter(pk=root.pk).set_hidden(True)
+        self.client.force_login(self.user)
+        self.client.post(reverse('motion_comment', args=[self.motion.pk]), {'content': 'Sneaky', 'parent': root.pk})
+        self.assertFalse(Comment.objects.filter(content='Sneaky').exists())
+
+
+class ModerationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('poster', password='pass', lga='newcastle')
+        cls.moderator = User.objects.create_superuser('mod', 'mod@example.com', 'pass', lga='newcastle')
+        cls.motion = Motion.objects.create(
+            title='Moderated motion', evidence='Evidence', proposed_action='Action',
+            resource_ask='Ask', success_measures='Measures', lga='newcastle',
+            author=cls.user, status='published',
+        )
+
+    def test_scorer(self):
+        self.assertEqual(trie_pattern(['cat', 'car', 'cart']), 'ca(?:r(?:t)?|t)')
+        scorer = Scorer({'hold': ['meet me alone'], 'flag': ['idiot']})
+        decide = lambda text: scorer.decide(scorer.score(text))
+        self.assertEqual(decide('Great idea for the skate park'), Comment.ModerationStatus.APPROVED)
+        self.assertEqual(decide('What an 1d10t'), Comment.ModerationStatus.FLAGGED)
+        self.assertEqual(decide('meet  me ALONE after'), Comment.ModerationStatus.HELD)
+        self.assertEqual(decide('add me on snapchat'), Comment.ModerationStatus.HELD)
+        self.assertEqual(decide('Idiotic'), Comment.ModerationStatus.APPROVED)
+
+    def test_held_comment_is_hidden_until_approved(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('motion_comment', args=[self.motion.pk]), {'content': 'text me 0412 345 678'})
+        comment = Comment.objects.get()
+        self.assertEqual(comment.moderation_status, Comment.ModerationStatus.HELD)
+        self.assertTrue(comment.is_hidden)
+        self.assertNotContains(self.client.get(reverse('motion_detail', args=[self.motion.pk])), '0412')
+
+        self.client.force_login(self.moderator)
+        response = self.client.get(reverse('admin:motions_moderationqueueitem_changelist'))
+        self.assertContains(response, '0412')
+        self.client.post(reverse('admin:motions_moderationqueueitem_changelist'), {
+            'action': 'approve_comments', '_selected_action': [comment.pk],
+        })
+        comment.refresh_from_db()
+        self.assertEqual((comment.moderation_status, comment.is_hidden), (Comment.ModerationStatus.APPROVED, False))
+        self.assertEqual(comment.reviewed_by, self.moderator)
+
+
+@override_settings(RATE_LIMITS={
+    'comment': {'user': '2/m', 'ip': '3/m'},
+    'motion_create': {'user': '5/h'},
+})
+class RateLimitTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('chatty', password='pass', lga='newcastle')
+        cls.other = User.objects.create_user('sibling', password='pass', lga='newcastle')
+        cls.motion = Motion.objects.create(
+            title='Limited motion', evidence='Evidence', proposed_action='Action',
+            resource_ask='Ask', success_measures='Measures', lga='newcastle',
+            author=cls.user, status='published',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def comment(self, text, **extra):
+        return self.client.post(reverse('motion_comment', args=[self.motion.pk]), {'content': text}, **extra)
+
+    def test_user_and_ip_limits(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.comment('One').status_code, 302)
+        self.assertEqual(self.comment('Two').status_code, 302)
+        response = self.comment('Three', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(response.json()['retry_after'], int(response['Retry-After']))
+        self.assertEqual(Comment.objects.count(), 2)
+
+        # Another account on the same connection only has the IP limit left.
+        self.client.force_login(self.other)
+        self.assertEqual(self.comment('Four').status_code, 302)
+        response = self.comment('Five')
+        self.assertContains(response, 'Too many requests', status_code=429)
+        # Reading is never limited.
+        self.assertEqual(self.client.get(reverse('motion_detail', args=[self.motion.pk])).status_code, 200)
+
+    @override_settings(RATE_LIMIT_PROXY_COUNT=1)
+    def test_client_ip_from_proxy(self):
+        self.client.force_login(self.user)
+        self.comment('One', HTTP_X_FORWARDED_FOR='10.0.0.1')
+        self.comment('Two', HTTP_X_FORWARDED_FOR='10.0.0.2')
+        self.client.force_login(self.other)
+        # A spoofed leading entry does not change the address the proxy saw.
+        self.assertEqual(self.comment('Three', HTTP_X_FORWARDED_FOR='1.2.3.4, 10.0.0.1').status_code, 302)
+        self.assertEqual(self.comment('Four', HTTP_X_FORWARDED_FOR='10.0.0.3').status_code, 302)
+
+    def test_sliding_window(self):
+        limiter = SlidingWindowLimiter()
+        limits = [('user:1', 3, 60)]
+        for now in (6000, 6030, 6050):
+            self.assertEqual(limiter.check('test', limits, now=now), 0)
+        self.assertAlmostEqual(limiter.check('test', limits, now=6059), 1)
+        # A refused request is not counted.
+        current, _, _ = limiter.keys('test', 'user:1', 60, 6059)
+        self.assertEqual(cache.get(current), 3)
+        # A quarter into the next window the previous three weigh 2.25.
+        self.assertEqual(limiter.check('test', limits, now=6075), 0)
+        # 1 + 3 * 40/60 is exactly the limit, so wait for the weight to drop.
+        self.assertAlmostEqual(limiter.check('test', limits, now=6080), 0.001)
+        self.assertEqual(limiter.check('test', limits, now=6081), 0)
+        self.assertAlmostEqual(limiter.check('test', limits, now=6082), 18)
+
+    def test_concurrent_requests_cannot_overshoot(self):
+        limiter = SlidingWindowLimiter()
+        limits = [('user:1', 2, 60)]
+        current, _, _ = limiter.keys('test', 'user:1', 60, 6000)
+        cache.set(current, 1)
+        # Another request is counted after this one read the cache but
+        # before it counts itself.
+        get_many = cache.get_many
+
+        def racing_get_many(keys):
+            counts = get_many(keys)
+            cache.incr(current)
+            return counts
+
+        with mock.patch.object(cache, 'get_many', racing_get_many):
+            self.assertGreater(limiter.check('test', limits, now=6000), 0)
+        self.assertEqual(cache.get(current), 2)
+
+
+class ResponseLatencyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        now = timezone.now()
+        cls.youth = User.objects.create_user('youth', password='pass', lga='newcastle')
+        owners = [
+            User.objects.create_user(f'owner{i}', password='pass', lga='newcastle', role='owner') for i in range(3)
+        ]
+        Motion.objects.bulk_create([
+            Motion(
+                title=f'Motion {i}', evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+                success_measures='Measures', author=cls.youth, status='accepted',
+                lga=rng.choice(['newcastle', 'lake_macquarie', 'port_stephens']),
+                jurisdiction=rng.choice(['local', 'state', 'federal']),
+                published_at=now - timedelta(days=120 + rng.expovariate(1 / 15)),
+            )
+            for i in range(3000)
+        ])
+        MotionResponse.objects.bulk_create([
+            MotionResponse(motion=motion, accountable_owner=rng.choice(owners), decision='accept', reasons='Yes')
+            for motion in Motion.objects.all()
+        ])
+        # Back-date a third of the responses into an earlier month.
+        MotionResponse.objects.filter(pk__in=MotionResponse.objects.order_by('pk').values('pk')[:1000]).update(
+            created_at=now - timedelta(days=100),
+        )
+
+    def expected(self, key):
+        groups = {}
+        for response in MotionResponse.objects.select_related('motion', 'accountable_owner'):
+            latency = (response.created_at - response.motion.published_at).total_seconds() / 86400
+            groups.setdefault(key(response), []).append(latency)
+        return groups
+
+    def test_matches_per_object_computation(self):
+        for by, key in [
+            ('lga', lambda response: response.motion.lga),
+            ('owner', lambda response: response.accountable_owner.username),
+            ('month', lambda response: timezone.localtime(response.created_at).date().replace(day=1)),
+        ]:
+            expected = self.expected(key)
+            results = response_latency(by)
+            self.assertEqual({row['group'] for row in results}, set(expected))
+            for row in results:
+                values = expected[row['group']]
+                cuts = statistics.quantiles(values, n=100, method='inclusive')
+                self.assertEqual(row['count'], len(values))
+                for q in (50, 90, 99):
+                    self.assertAlmostEqual(row[f'p{q}'], cuts[q - 1], places=4)
+                self.assertAlmostEqual(row['max'], max(values), places=4)
+                self.assertEqual(sum(row['buckets'].values()), len(values))
+                self.assertEqual(list(row['buckets']), list(BUCKET_LABELS))
+
+    def test_filters(self):
+        results = response_latency('jurisdiction', lga='newcastle', since=timezone.now() - timedelta(days=30))
+        expected = MotionResponse.objects.filter(
+            motion__lga='newcastle', created_at__gte=timezone.now() - timedelta(days=30),
+        ).count()
+        self.assertEqual(sum(row['count'] for row in results), expected)
+        with self.assertRaises(ValueError):
+            response_latency('colour')
+
+    def test_december_is_a_month(self):
+        december = timezone.make_aware(datetime(timezone.localdate().year + 1, 12, 15, 12))
+        starts = month_starts(december - timedelta(days=40), december)
+        self.assertEqual(
+            [start.date() for start in starts[-2:]],
+            [date(december.year, 12, 1), date(december.year + 1, 1, 1)],
+        )
+
+        # The newest response is in December, so its month has to be closed.
+        MotionResponse.objects.filter(pk__in=MotionResponse.objects.order_by('pk').values('pk')[:1]).update(
+            created_at=december,
+        )
+        months = {row['group']: row['count'] for row in response_latency('month')}
+        self.assertNotIn(None, months)
+        self.assertEqual(months[date(december.year, 12, 1)], 1)
+
+    def test_archived_motions_still_count(self):
+        groups = ('lga', 'jurisdiction', 'owner', 'month')
+        before = {by: response_latency(by) for by in groups}
+        archived = list(MotionResponse.objects.order_by('pk').values_list('motion_id', flat=True)[::2])
+        archive_batch({pk: timezone.now() for pk in archived})
+        self.assertEqual(ArchivedMotion.objects.filter(accountable_owner__isnull=False).count(), len(archived))
+        for by in groups:
+            after = response_latency(by)
+            self.assertEqual(
+                [(row['group'], row['count']) for row in after],
+                [(row['group'], row['count']) for row in before[by]],
+            )
+            for old, new in zip(before[by], after):
+                self.assertAlmostEqual(old['p50'], new['p50'], places=6)
+                self.assertEqual(old['buckets'], new['buckets'])
+
+
+class MilestoneTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.youth = User.objects.create_user('planner', password='pass', lga='newcastle')
+        cls.owner = User.objects.create_user('delivery_owner', password='pass', lga='newcastle', role='owner')
+        cls.staff = User.objects.create_superuser('council_admin', password='pass', lga='newcastle')
+
+    def setUp(self):
+        cache.clear()
+
+    def motion(self, title, status='accepted'):
+        return Motion.objects.create(
+            title=title, evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+            success_measures='Measures', lga='newcastle', author=self.youth, status=status,
+            published_at=timezone.now(),
+        )
+
+    def respond(self, motion):
+        return MotionResponse.objects.create(
+            motion=motion, accountable_owner=self.owner, decision='accept', reasons='Yes',
+        )
+
+    def delivery_status(self, motion):
+        motion.refresh_from_db()
+        return motion.delivery_status
+
+    def test_rollup_follows_milestones(self):
+        motion = self.motion('Youth centre')
+        response = self.respond(motion)
+        today = timezone.localdate()
+        first = Milestone.objects.create(response=response, title='Consult', due_date=today + timedelta(days=10))
+        second = Milestone.objects.create(response=response, title='Build', due_date=today + timedelta(days=40))
+        self.assertEqual(self.delivery_status(motion), 'not_started')
+
+        first.status = 'in_progress'
+        first.save()
+        self.assertEqual(self.delivery_status(motion), 'on_track')
+
+        # Time passing alone makes the open milestone overdue.
+        later = today + timedelta(days=11)
+        self.assertEqual(list(Milestone.objects.overdue(later)), [first])
+        self.assertEqual(rollup_delivery_status(today=later), {'delayed': 1})
+        self.assertEqual(self.delivery_status(motion), 'delayed')
+        self.assertEqual(rollup_delivery_status(today=later), {})
+
+        first.status = 'completed'
+        first.save()
+        self.assertIsNotNone(first.completed_at)
+        second.status = 'cancelled'
+        second.save()
+        self.assertEqual(self.delivery_status(motion), 'completed')
+
+        # The rollup kept the dashboard's delivery counts in step.
+        stored = {
+            (lga, jurisdiction, metric): value
+            for lga, jurisdiction, metric, value in PartitionStat.objects.exclude(value=0).values_list(
+                'lga', 'jurisdiction', 'metric', 'value',
+            )
+        }
+        self.assertEqual(stored, {key: value for key, value in compute().items() if value})
+
+        # Deleting the response takes the milestones with it and leaves the
+        # motion's last status alone.
+        response.delete()
+        self.assertEqual(self.delivery_status(motion), 'completed')
+
+    def test_respond_with_milestones_and_update(self):
+        motion = self.motion('Bike paths', status='published')
+        due = timezone.localdate() + timedelta(days=30)
+        self.client.force_login(self.owner)
+        response = self.client.post(reverse('motion_respond', args=[motion.pk]), {
+            'decision': 'accept', 'reasons': 'Yes', 'delivery_plan': 'Plan',
+            'milestones-TOTAL_FORMS': '3', 'milestones-INITIAL_FORMS': '0',
+            'milestones-0-title': 'Design', 'milestones-0-due_date': due.isoformat(),
+            'milestones-1-title': 'Build', 'milestones-1-due_date': (due + timedelta(days=60)).isoformat(),
+        })
+        self.assertRedirects(response, reverse('motion_detail', args=[motion.pk]))
+        design, build = Milestone.objects.filter(response__motion=motion)
+        self.assertEqual((design.title, design.due_date), ('Design', due))
+
+        response = self.client.get(reverse('motion_detail', args=[motion.pk]))
+        self.assertContains(response, 'Design')
+        self.assertContains(response, reverse('motion_milestone_update', args=[motion.pk, design.pk]))
+
+        url = reverse('motion_milestone_update', args=[motion.pk, design.pk])
+        self.client.post(url, {'status': 'in_progress'})
+        self.assertEqual(self.delivery_status(motion), 'on_track')
+
+        # Only the accountable owner (or an admin) can change milestones.
+        self.client.force_login(self.youth)
+        self.client.post(url, {'status': 'completed'})
+        design.refresh_from_db()
+        self.assertEqual(design.status, 'in_progress')
+        self.assertNotContains(self.client.get(reverse('motion_detail', args=[motion.pk])), url)
+
+    def test_manual_actions_skip_tracked_motions(self):
+        tracked = self.motion('Tracked')
+        Milestone.objects.create(
+            response=self.respond(tracked), title='Step', due_date=timezone.localdate() + timedelta(days=5),
+        )
+        manual = self.motion('Manual')
+
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('admin:motions_motion_changelist'), {
+            'action': 'mark_delayed', '_selected_action': [tracked.pk, manual.pk],
+        }, follow=True)
+        self.assertContains(response, 'Skipped 1 motion with active milestones')
+        self.assertEqual(self.delivery_status(manual), 'delayed')
+        self.assertEqual(self.delivery_status(tracked), 'not_started')
+
+        milestone = Milestone.objects.get()
+        self.client.post(reverse('admin:motions_milestone_changelist'), {
+            'action': 'mark_completed', '_selected_action': [milestone.pk],
+        })
+        milestone.refresh_from_db()
+        self.assertIsNotNone(milestone.completed_at)
+        self.assertEqual(self.delivery_status(tracked), 'completed')
+
+    def test_cancelling_every_milestone_returns_to_manual_control(self):
+        motion = self.motion('Cancelled plan')
+        milestone = Milestone.objects.create(
+            response=self.respond(motion), title='Step', due_date=timezone.localdate() + timedelta(days=5),
+            status=Milestone.Status.IN_PROGRESS,
+        )
+        self.assertEqual(self.delivery_status(motion), 'on_track')
+        milestone.status = Milestone.Status.CANCELLED
+        milestone.save()
+        # It keeps its last status, and the rollup leaves it alone from now on...
+        self.assertEqual(self.delivery_status(motion), 'on_track')
+        self.assertEqual(rollup_delivery_status(), {})
+
+        # ...so it can be set by hand again.
+        self.client.force_login(self.staff)
+        self.client.post(reverse('admin:motions_motion_changelist'), {
+            'action': 'mark_completed', '_selected_action': [motion.pk],
+        })
+        self.assertEqual(self.delivery_status(motion), 'completed')
+
+
+class StatusTransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.youth = User.objects.create_user('historian', password='pass', lga='newcastle')
+        cls.owner = User.objects.create_user('history_owner', password='pass', lga='newcastle', role='owner')
+        cls.staff = User.objects.create_superuser('council_admin', password='pass', lga='newcastle')
+
+    def motion(self, title, **fields):
+        return Motion.objects.create(
+            title=title, evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+            success_measures='Measures', lga='newcastle', author=self.youth, **fields,
+        )
+
+    def history(self, motion):
+        return list(motion.transitions.values_list('field', 'from_state', 'to_state', 'actor__username'))
+
+    def test_saves_and_bulk_updates_are_logged(self):
+        motion = self.motion('Bus timetable', status='published', published_at=timezone.now())
+        self.client.force_login(self.owner)
+        self.client.post(reverse('motion_respond', args=[motion.pk]), {
+            'decision': 'accept', 'reasons': 'Yes', 'milestones-TOTAL_FORMS': '0', 'milestones-INITIAL_FORMS': '0',
+        })
+        # Saving without a change logs nothing.
+        motion.refresh_from_db()
+        motion.save()
+
+        self.client.force_login(self.staff)
+        self.client.post(reverse('admin:motions_motion_changelist'), {
+            'action': 'mark_on_track', '_selected_action': [motion.pk],
+        })
+        self.assertEqual(self.history(motion), [
+            (StatusTransition.Field.STATUS, '', 'published', None),
+            (StatusTransition.Field.DELIVERY_STATUS, '', 'not_started', None),
+            (StatusTransition.Field.STATUS, 'published', 'accepted', 'history_owner'),
+            (StatusTransition.Field.DELIVERY_STATUS, 'not_started', 'on_track', 'council_admin'),
+        ])
+
+        # Only motions that actually change are updated and logged.
+        other = self.motion('Pool hours', status='accepted', delivery_status='on_track')
+        self.assertEqual(update_states(Motion.objects.all(), delivery_status='on_track'), 0)
+        self.assertEqual(update_states(Motion.objects.all(), delivery_status='completed'), 2)
+        self.assertEqual(StatusTransition.objects.filter(to_state='completed').count(), 2)
+        self.assertEqual(other.transitions.count(), 3)
+
+        with self.assertRaises(ValueError):
+            update_states(Motion.objects.all(), title='Renamed')
+        row = StatusTransition.objects.first()
+        row.to_state = 'rejected'
+        with self.assertRaises(ValueError):
+            row.save()
+
+    def test_time_in_state(self):
+        start = timezone.now() - timedelta(days=30)
+        first = self.motion('Library', status='published')
+        second = self.motion('Skate park', status='published')
+        StatusTransition.objects.all().delete()
+        for motion, changes in [
+            (first, [(0, '', 'published'), (10, 'published', 'accepted')]),
+            (second, [(0, '', 'published'), (4, 'published', 'under_review'), (6, 'under_review', 'rejected')]),
+        ]:
+            StatusTransition.objects.bulk_create([
+                StatusTransition(
+                    motion=motion, field=StatusTransition.Field.STATUS, from_state=old, to_state=new,
+                    created_at=start + timedelta(days=day),
+                )
+                for day, old, new in changes
+            ])
+
+        results = {row['state']: row for row in time_in_state(now=start + timedelta(days=30))}
+        self.assertEqual(list(results), ['published', 'under_review', 'accepted', 'rejected'])
+        self.assertEqual((results['published']['entries'], results['published']['current']), (2, 0))
+        self.assertAlmostEqual(results['published']['mean'], 7)
+        self.assertAlmostEqual(results['published']['max'], 10)
+        self.assertAlmostEqual(results['under_review']['total'], 2)
+        self.assertEqual(results['accepted']['current'], 1)
+        self.assertAlmostEqual(results['accepted']['total'], 20)
+        # Entries outside the window are left out.
+        since = {row['state'] for row in time_in_state(since=start + timedelta(days=5))}
+        self.assertEqual(since, {'accepted', 'rejected'})
+
+    def test_backfill(self):
+        published = timezone.now() - timedelta(days=20)
+        motion = self.motion('Old motion', status='accepted', published_at=published)
+        response = MotionResponse.objects.create(
+            motion=motion, accountable_owner=self.owner, decision='accept', reasons='Yes',
+        )
+        StatusTransition.objects.all().delete()
+        self.assertEqual(backfill(Motion.objects.all()), 3)
+        self.assertEqual(
+            list(motion.transitions.values_list('from_state', 'to_state', 'created_at')),
+            [('', 'published', published), ('', 'not_started', motion.created_at),
+             ('published', 'accepted', response.created_at)],
+        )
+        # Motions with history are left alone.
+        self.assertEqual(backfill(Motion.objects.all()), 0)
+
+
+class SeedDataTests(TestCase):
+
+    def test_lgas_without_users_get_no_motions(self):
+        # Two users cannot cover every LGA.
+        call_command('seed_data', users=2, motions=30, votes=20, comments=10, stdout=StringIO())
+        seeded = Motion.objects.filter(author__username__startswith='seed_')
+        self.assertTrue(seeded.exists())
+        self.assertFalse(seeded.exclude(lga__in=User.objects.filter(
+            username__startswith='seed_').values('lga')).exists())
+
+
+class ArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.youth = User.objects.create_user('archivist', password='pass', lga='newcastle')
+        cls.owner = User.objects.create_user('archive_owner', password='pass', lga='newcastle', role='owner')
+
+    def motion(self, title, decision, **fields):
+        motion = Motion.objects.create(
+            title=title, evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+            success_measures='Measures', lga='newcastle', author=self.youth,
+            published_at=timezone.now() - timedelta(days=800), **fields,
+        )
+        response = MotionResponse.objects.create(
+            motion=motion, accountable_owner=self.owner, decision=decision, reasons='Reasons',
+        )
+        return motion, response
+
+    def stored(self):
+        return {
+            (lga, jurisdiction, metric): value
+            for lga, jurisdiction, metric, value in PartitionStat.objects.exclude(value=0).values_list(
+                'lga', 'jurisdiction', 'metric', 'value',
+            )
+        }
+
+    def test_closed_motions_are_archived(self):
+        rejected, _ = self.motion('Night bus', 'reject', status='rejected')
+        delivered, response = self.motion('Youth hub', 'accept', status='accepted')
+        Milestone.objects.create(
+            response=response, title='Open the hub', due_date=timezone.localdate(),
+            status=Milestone.Status.COMPLETED,
+        )
+        delivering, response = self.motion('Skate ramp', 'accept', status='accepted')
+        Milestone.objects.create(response=response, title='Build it', due_date=timezone.localdate())
+        recent, _ = self.motion('Late library', 'reject', status='rejected')
+        StatusTransition.objects.exclude(motion=recent).update(created_at=timezone.now() - timedelta(days=700))
+
+        voters = [User.objects.create_user(f'voter{i}', password='pass', lga='newcastle') for i in range(3)]
+        for voter, vote_type in zip(voters, ['approve', 'approve', 'disapprove']):
+            Vote.objects.create(motion=rejected, user=voter, vote_type=vote_type)
+        Comment.objects.create(motion=rejected, author=self.youth, content='Please')
+        Comment.objects.create(motion=rejected, author=self.youth, content='Spam', is_hidden=True)
+
+        counts = compute()
+        self.assertEqual(self.stored(), {key: value for key, value in counts.items() if value})
+        out = StringIO()
+        call_command('archive_motions', stdout=out)
+        self.assertIn('Archived 2 motions', out.getvalue())
+
+        self.assertCountEqual(Motion.objects.values_list('pk', flat=True), [delivering.pk, recent.pk])
+        self.assertFalse(Vote.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(StatusTransition.objects.filter(motion_id=rejected.pk).exists())
+        archived = ArchivedMotion.objects.get(pk=rejected.pk)
+        self.assertEqual((archived.approvals, archived.disapprovals, archived.comments), (2, 1, 1))
+        self.assertEqual(archived.document['response']['accountable_owner'], 'archive_owner')
+
+        # The statistics still count them, and their pages still work.
+        self.assertEqual(compute(), counts)
+        self.assertEqual(self.stored(), {key: value for key, value in counts.items() if value})
+        page = self.client.get(reverse('motion_detail', args=[delivered.pk]))
+        self.assertContains(page, 'has been archived')
+        self.assertContains(page, 'Open the hub')
+        self.assertEqual(self.client.get(reverse('motion_detail', args=[rejected.pk + 100])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('home')).context['total_responses'], 4)
+
+        call_command('archive_motions', stdout=out)
+        self.assertIn('Archived 0 motions', out.getvalue())
+
+
+@override_settings(BACKGROUND_TASKS={'ENABLED': False})
+class PublishWorkflowTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.youth = User.objects.create_user('publisher', password='pass', lga='newcastle')
+        cls.neighbour = User.objects.create_user('neighbour', password='pass', lga='newcastle')
+        cls.owner = User.objects.create_user('workflow_owner', password='pass', lga='newcastle', role='owner')
+
+    def notified(self):
+        return list(Notification.objects.order_by('pk').values_list('user__username', 'notification_type'))
+
+    def test_publishing_notifies_after_commit(self):
+        self.client.force_login(self.youth)
+        fields = {
+            'title': 'Free bus passes', 'evidence': 'Evidence', 'proposed_action': 'Action',
+            'resource_ask': 'Ask', 'success_measures': 'Measures', 'jurisdiction': 'local', 'status': 'draft',
+        }
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(reverse('motion_create'), fields)
+        motion = Motion.objects.get()
+        self.assertEqual((callbacks, motion.published_at), ([], None))
+
+        # Publishing defers the fan-out until the transaction commits.
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('motion_edit', args=[motion.pk]), {**fields, 'status': 'published'})
+            self.assertEqual(self.notified(), [])
+        for callback in callbacks:
+            callback()
+        neighbours = User.objects.filter(lga='newcastle').exclude(pk=self.youth.pk).values_list('username', flat=True)
+        self.assertCountEqual(self.notified(), [(username, 'new_motion') for username in neighbours])
+        motion.refresh_from_db()
+        self.assertEqual(motion.response_deadline, motion.published_at + timedelta(days=30))
+
+        # Later edits don't notify again.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(reverse('motion_edit', args=[motion.pk]), {**fields, 'status': 'published', 'title': 'Free passes'})
+        self.assertEqual(callbacks, [])
+
+    def test_response_is_all_or_nothing(self):
+        motion = Motion.objects.create(
+            title='Youth hub', evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+            success_measures='Measures', lga='newcastle', author=self.youth,
+            status='published', published_at=timezone.now(),
+        )
+        Vote.objects.create(motion=motion, user=self.neighbour, vote_type='approve')
+        self.client.force_login(self.owner)
+        url = reverse('motion_respond', args=[motion.pk])
+        data = {
+            'decision': 'accept', 'reasons': 'Yes', 'milestones-TOTAL_FORMS': '1', 'milestones-INITIAL_FORMS': '0',
+            'milestones-0-title': 'Lease a space', 'milestones-0-due_date': timezone.localdate() + timedelta(days=30),
+        }
+
+        with mock.patch.object(Milestone, 'save', side_effect=DatabaseError('disk full')), \
+                self.captureOnCommitCallbacks() as callbacks, self.assertRaises(DatabaseError):
+            self.client.post(url, data)
+        motion.refresh_from_db()
+        self.assertEqual(motion.status, 'published')
+        self.assertFalse(MotionResponse.objects.exists())
+        self.assertFalse(motion.transitions.filter(to_state='accepted').exists())
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, data)
+        motion.refresh_from_db()
+        self.assertEqual((motion.status, motion.delivery_status), ('accepted', 'not_started'))
+        self.assertEqual(motion.response.milestones.count(), 1)
+        self.assertEqual(self.notified(), [('publisher', 'motion_response'), ('neighbour', 'motion_response')])
+
+        # A second response is refused without touching the first.
+        response = self.client.post(url, {**data, 'decision': 'reject'}, follow=True)
+        self.assertContains(response, 'already been responded to')
+        motion.refresh_from_db()
+        self.assertEqual(motion.status, 'accepted')
+
+    def test_task_runner(self):
+        runner = TaskRunner(workers=2)
+        done = []
+
+        def fail():
+            raise RuntimeError('boom')
+
+        with self.assertLogs('config.tasks', 'ERROR'):
+            for i in range(20):
+                runner.submit(done.append, (i,))
+            runner.submit(fail)
+            runner.close()
+        self.assertCountEqual(done, range(20))
+        # Once closed, tasks run inline.
+        runner.submit(done.append, (20,))
+        self.assertEqual(done[-1], 20)
+
+
+@override_settings(BACKGROUND_TASKS={'ENABLED': True, 'WORKERS': 2})
+class BackgroundTaskTests(TransactionTestCase):
+    """Deferred work on the real process-wide runner, off the request thread."""
+
+    def setUp(self):
+        patcher = mock.patch.object(tasks, '_runner', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_publishing_fans_out_on_the_runner(self):
+        author = User.objects.create_user('runner_author', password='pass', lga='port_stephens')
+        User.objects.create_user('runner_neighbour', password='pass', lga='port_stephens')
+        motion = Motion(
+            title='Night bus', evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+            success_measures='Measures', lga='port_stephens', author=author, status='published',
+        )
+        self.assertTrue(save_motion(motion))
+        runner = tasks.get_task_runner()
+        self.assertEqual(len(runner._threads), 2)
+        runner.close()
+        self.assertFalse(any(thread.is_alive() for thread in runner._threads))
+        self.assertEqual(
+            list(Notification.objects.values_list('user__username', 'notification_type')),
+            [('runner_neighbour', 'new_motion')],
+        )
+        # Once closed, deferred work runs inline.
+        save_motion(Motion(
+            title='Day bus', evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+            success_measures='Measures', lga='port_stephens', author=author, status='published',
+        ))
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+class VoteBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.voters = [User.objects.create_user(f'buffered{i}', password='pass', lga='newcastle') for i in range(4)]
+        cls.motion = Motion.objects.create(
+            title='Live session', evidence='Evidence', proposed_action='Action', resource_ask='Ask',
+            success_measures='Measures', lga='newcastle', author=cls.voters[0], status='published',
+        )
+
+    def setUp(self):
+        # No flusher thread: the tests flush by hand, inside their transaction.
+        patcher = mock.patch.object(VoteBuffer, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def votes(self):
+        return dict(Vote.objects.values_list('user__username', 'vote_type'))
+
+    def test_flush_coalesces_and_upserts(self):
+        Vote.objects.create(motion=self.motion, user=self.voters[0], vote_type='approve')
+        buffer = VoteBuffer()
+        buffer.add(self.motion.pk, self.voters[0].pk, 'disapprove')
+        buffer.add(self.motion.pk, self.voters[1].pk, 'approve')
+        buffer.add(self.motion.pk, self.voters[1].pk, 'disapprove')
+        self.assertEqual(buffer.counts(self.motion.pk), (0, 2))
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.votes(), {'buffered0': 'disapprove', 'buffered1': 'disapprove'})
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_counts_during_a_flush(self):
+        Vote.objects.create(motion=self.motion, user=self.voters[0], vote_type='approve')
+        Vote.objects.create(motion=self.motion, user=self.voters[1], vote_type='approve')
+        buffer = VoteBuffer()
+        buffer.add(self.motion.pk, self.voters[1].pk, 'disapprove')
+        buffer.add(self.motion.pk, self.voters[2].pk, 'disapprove')
+        seen = []
+        write = buffer._write
+
+        def write_and_count(batch):
+            # In flight, before and after the batch reaches the database.
+            seen.append(buffer.counts(self.motion.pk))
+            write(batch)
+            buffer.add(self.motion.pk, self.voters[3].pk, 'approve')
+            seen.append(buffer.counts(self.motion.pk))
+
+        with mock.patch.object(buffer, '_write', write_and_count):
+            buffer.flush()
+        self.assertEqual(seen, [(1, 2), (2, 2)])
+        self.assertEqual(buffer.counts(self.motion.pk), (2, 2))
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.votes(), {
+            'buffered0': 'approve', 'buffered1': 'disapprove', 'buffered2': 'disapprove', 'buffered3': 'approve',
+        })
+
+    def test_failed_batch_falls_back_to_row_writes(self):
+        buffer = VoteBuffer()
+        buffer.add(self.motion.pk, self.voters[0].pk, 'approve')
+        buffer.add(self.motion.pk, self.voters[1].pk, 'disapprove')
+        with mock.patch.object(Vote.objects, 'bulk_create', side_effect=DatabaseError('conflict')), \
+                self.assertLogs('motions.vote_buffer', 'ERROR'):
+            buffer.flush()
+        self.assertEqual(self.votes(), {'buffered0': 'approve', 'buffered1': 'disapprove'})
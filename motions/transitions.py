@@ -0,0 +1,176 @@
+"""
+Append-only audit trail of motion status and delivery status changes.
+
+Every change becomes a ``StatusTransition`` row, however it is made:
+
+- ``Motion.save()`` is covered by the signals in motions/signals.py;
+- bulk changes go through ``update_states(queryset, **changes)`` instead of
+  ``queryset.update(**changes)``, which skips signals;
+- code that already knows the old values (the delivery rollup) builds rows
+  with ``transitions()`` and writes them with ``record()``.
+
+Rows are only ever inserted, one bulk INSERT per save or update. The user
+making the change is taken from the current request (set by
+``TransitionActorMiddleware``) or ``acting_as(user)``; changes made by
+management commands have no actor.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Motion, StatusTransition
+
+# Model field name -> StatusTransition.field
+FIELDS = {
+    'status': StatusTransition.Field.STATUS,
+    'delivery_status': StatusTransition.Field.DELIVERY_STATUS,
+}
+
+# Motions per SELECT/UPDATE, and rows per INSERT
+BATCH_SIZE = 500
+
+_actor = contextvars.ContextVar('transition_actor', default=None)
+
+
+@contextmanager
+def _acting(get_user):
+    token = _actor.set(get_user)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+def acting_as(user):
+    """Attribute the transitions recorded inside the block to user."""
+    return _acting(lambda: user)
+
+
+def current_actor_id():
+    get_user = _actor.get()
+    user = get_user() if get_user else None
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def transitions(motion_id, old, new, at=None, actor_id=None):
+    """Unsaved rows for the fields that differ between old and new.
+
+    old and new map field names ('status', 'delivery_status') to values;
+    old is None for a new motion.
+    """
+    at = at or timezone.now()
+    return [
+        StatusTransition(
+            motion_id=motion_id,
+            field=FIELDS[name],
+            from_state=old[name] if old else '',
+            to_state=value,
+            actor_id=actor_id,
+            created_at=at,
+        )
+        for name, value in new.items()
+        if old is None or old[name] != value
+    ]
+
+
+def record(rows):
+    StatusTransition.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def update_states(queryset, **changes):
+    """queryset.update(**changes) for status fields, with transitions logged.
+
+    Only motions whose values actually change are updated. Returns that
+    number.
+    """
+    names = list(changes)
+    unknown = set(names) - set(FIELDS)
+    if unknown:
+        raise ValueError(f'Not a tracked state field: {", ".join(sorted(unknown))}')
+
+    now = timezone.now()
+    actor_id = current_actor_id()
+    with transaction.atomic():
+        rows = []
+        for pk, *values in queryset.select_for_update().values_list('pk', *names):
+            rows.extend(transitions(pk, dict(zip(names, values)), changes, now, actor_id))
+        changed = sorted({row.motion_id for row in rows})
+        for start in range(0, len(changed), BATCH_SIZE):
+            Motion.objects.filter(pk__in=changed[start:start + BATCH_SIZE]).update(**changes)
+        record(rows)
+    return len(changed)
+
+
+def backfill(motions, transition_model=StatusTransition):
+    """Log a starting history for motions that have none, from their timestamps.
+
+    Each motion gets its status from publication (or creation), a move to
+    the decided status when its response was given, and its delivery status
+    from creation (moving off not started when the response was given).
+    Takes a Motion queryset so the migration can pass historical models.
+    Returns the number of rows written.
+    """
+    responded_statuses = (Motion.Status.ACCEPTED, Motion.Status.MODIFIED, Motion.Status.REJECTED)
+    status, delivery = StatusTransition.Field.STATUS, StatusTransition.Field.DELIVERY_STATUS
+    not_started = Motion.DeliveryStatus.NOT_STARTED
+
+    def row(motion_id, field, from_state, to_state, at):
+        return transition_model(
+            motion_id=motion_id, field=field, from_state=from_state, to_state=to_state, created_at=at,
+        )
+
+    total = 0
+    rows = []
+    history = motions.filter(transitions__isnull=True).order_by('pk').values_list(
+        'pk', 'status', 'delivery_status', 'created_at', 'published_at', 'response__created_at',
+    )
+    with transaction.atomic():
+        for pk, current, delivery_status, created, published, responded in history.iterator():
+            entered = published or created
+            if responded and current in responded_statuses:
+                rows.append(row(pk, status, '', Motion.Status.PUBLISHED, entered))
+                rows.append(row(pk, status, Motion.Status.PUBLISHED, current, responded))
+            else:
+                rows.append(row(pk, status, '', current, entered))
+            rows.append(row(pk, delivery, '', not_started, created))
+            if delivery_status != not_started:
+                rows.append(row(pk, delivery, not_started, delivery_status, responded or entered))
+            if len(rows) >= BATCH_SIZE:
+                transition_model.objects.bulk_create(rows)
+                total += len(rows)
+                rows = []
+        transition_model.objects.bulk_create(rows)
+    return total + len(rows)
+
+
+class TransitionActorMiddleware:
+    """Attribute transitions recorded during a request to its user.
+
+    Must come after AuthenticationMiddleware.
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with _acting(lambda: request.user):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        # A function rather than the lazy request.user itself: asgiref
+        # inspects context variables when it copies them between threads,
+        # which would load the user in the event loop. This way it is only
+        # loaded when a transition is recorded, in the thread doing the save.
+        with _acting(lambda: request.user):
+            return await self.get_response(request)
@@ -1,12 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.USE_ASYNC_VIEWS:
+    feed_view = views.AsyncMotionFeedView
+    detail_view = views.AsyncMotionDetailView
+else:
+    feed_view = views.MotionFeedView
+    detail_view = views.MotionDetailView
+
 urlpatterns = [
-    path('', views.MotionFeedView.as_view(), name='motion_feed'),
+    path('', feed_view.as_view(), name='motion_feed'),
     path('create/', views.MotionCreateView.as_view(), name='motion_create'),
-    path('<int:pk>/', views.MotionDetailView.as_view(), name='motion_detail'),
+    path('<int:pk>/', detail_view.as_view(), name='motion_detail'),
     path('<int:pk>/edit/', views.MotionUpdateView.as_view(), name='motion_edit'),
     path('<int:pk>/vote/', views.vote_motion, name='motion_vote'),
     path('<int:pk>/comment/', views.add_comment, name='motion_comment'),
+    path('<int:pk>/comments/', views.motion_comments, name='motion_comments'),
+    path('<int:pk>/comments/<int:comment_pk>/', views.motion_comment_thread, name='motion_comment_thread'),
+    path('<int:pk>/events/', views.motion_events, name='motion_events'),
+    path('<int:pk>/milestones/<int:milestone_pk>/', views.update_milestone, name='motion_milestone_update'),
     path('<int:pk>/respond/', views.MotionResponseView.as_view(), name='motion_respond'),
 ]
@@ -1,18 +1,96 @@
+import asyncio
+from collections import defaultdict
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.paginator import InvalidPage, Paginator
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse_lazy
-from django.http import JsonResponse
-from django.utils import timezone
-from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, connection
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.utils import dateformat, timezone
 from django.db.models import Q
-from .models import Motion, MotionResponse, Vote, Comment
-from .forms import MotionForm, MotionResponseForm, CommentForm
+from config import metrics
+from config.middleware import query_budget
+from config.ratelimit import rate_limit
+from config.routers import reads_from_replica
+from .models import ArchivedMotion, Motion, MotionResponse, Milestone, Vote, Comment
+from .forms import MotionForm, MotionResponseForm, MilestoneFormSet, CommentForm
+from .moderation import moderate
+from .vote_buffer import get_vote_buffer
+from . import archive, events, services
+
+# Top-level comments shown on the detail page and per "load more", and the
+# replies shown under each before "View all replies"
+COMMENTS_PAGE_SIZE = 30
+REPLIES_PREVIEW = 3
+
+ARCHIVED_TEMPLATE = 'motions/archived_detail.html'
+
+LGA_CHOICES = [
+    ('newcastle', 'Newcastle'),
+    ('lake_macquarie', 'Lake Macquarie'),
+    ('port_stephens', 'Port Stephens'),
+]
+
+
+def split_comment_page(rows):
+    """Split up to COMMENTS_PAGE_SIZE + 1 fetched comments into (page, next_cursor)."""
+    comments = rows[:COMMENTS_PAGE_SIZE]
+    next_cursor = comments[-1].cursor if len(rows) > COMMENTS_PAGE_SIZE else None
+    return comments, next_cursor
+
+
+def attach_replies(comments, replies, limit=None):
+    """Set thread_replies (in display order) and more_replies on each top-level comment.
+
+    replies comes from CommentQuerySet.replies(), fetched with limit + 1 per
+    thread when limited, so the extra row tells us the thread was cut short.
+    """
+    by_root = defaultdict(list)
+    for reply in replies:
+        by_root[reply.root_id].append(reply)
+    for comment in comments:
+        thread = by_root[comment.pk]
+        comment.more_replies = limit is not None and len(thread) > limit
+        if limit is not None:
+            thread = thread[:limit]
+        # Depth-first, so each reply sits directly under its parent.
+        comment.thread_replies = sorted(thread, key=lambda reply: reply.subtree_path)
+    return comments
+
+
+def comment_payload(comment):
+    """A comment as sent to live streams and the JSON comment pages."""
+    return {
+        'id': comment.pk,
+        'parent': comment.parent_id,
+        'depth': comment.depth,
+        'author': comment.author.username,
+        'content': comment.content,
+        'created_at': dateformat.format(timezone.localtime(comment.created_at), 'M d, Y H:i'),
+    }
+
+
+def thread_payload(comment):
+    return {
+        **comment_payload(comment),
+        'replies': [comment_payload(reply) for reply in comment.thread_replies],
+        'more_replies': comment.more_replies,
+    }
+
+
+def can_update_milestones(user, response):
+    return user.is_authenticated and (
+        user.pk == response.accountable_owner_id or user.is_admin or user.is_staff
+    )
+
 
-# Default response deadline in days
-RESPONSE_DEADLINE_DAYS = 30
+async def aget_user(request):
+    """Resolve request.user, which loads from the sync-only session backend."""
+    return await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
 
 
 class MotionFeedView(ListView):
@@ -20,6 +98,8 @@ class MotionFeedView(ListView):
     template_name = 'motions/feed.html'
     context_object_name = 'motions'
     paginate_by = 10
+    query_budget = 5
+    use_replica = True
 
     def get_queryset(self):
         queryset = Motion.objects.filter(status='published')
@@ -34,30 +114,86 @@ class MotionFeedView(ListView):
         if jurisdiction:
             queryset = queryset.filter(jurisdiction=jurisdiction)
 
-        return queryset.order_by('-published_at', '-created_at')
+        return queryset.select_related('author').with_counts().order_by('-published_at', '-created_at')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['lga_choices'] = [
-            ('newcastle', 'Newcastle'),
-            ('lake_macquarie', 'Lake Macquarie'),
-            ('port_stephens', 'Port Stephens'),
-        ]
+        context['lga_choices'] = LGA_CHOICES
         context['jurisdiction_choices'] = Motion.Jurisdiction.choices
         context['current_lga'] = self.request.GET.get('lga', '')
         context['current_jurisdiction'] = self.request.GET.get('jurisdiction', '')
         return context
 
 
+class AsyncMotionFeedView(MotionFeedView):
+    """MotionFeedView on the async ORM, for ASGI deployments."""
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+
+        paginator = Paginator(queryset, self.paginate_by)
+        # Prime the paginator's cached count so it never calls count() itself.
+        paginator.count = await queryset.acount()
+        try:
+            number = paginator.validate_number(request.GET.get('page') or 1)
+        except InvalidPage as exc:
+            raise Http404(str(exc))
+
+        bottom = (number - 1) * paginator.per_page
+        motions = [motion async for motion in queryset[bottom:bottom + paginator.per_page]]
+        page_obj = paginator.get_page(number)
+        page_obj.object_list = motions
+
+        context = {
+            'motions': motions,
+            'object_list': motions,
+            'page_obj': page_obj,
+            'paginator': paginator,
+            'is_paginated': paginator.num_pages > 1,
+            'lga_choices': LGA_CHOICES,
+            'jurisdiction_choices': Motion.Jurisdiction.choices,
+            'current_lga': request.GET.get('lga', ''),
+            'current_jurisdiction': request.GET.get('jurisdiction', ''),
+        }
+        return await sync_to_async(render)(request, self.template_name, context)
+
+
 class MotionDetailView(DetailView):
     model = Motion
     template_name = 'motions/detail.html'
     context_object_name = 'motion'
+    query_budget = 7
+    use_replica = True
+
+    def get_queryset(self):
+        return Motion.objects.select_related(
+            'author', 'response__accountable_owner'
+        ).with_counts()
+
+    def get(self, request, *args, **kwargs):
+        try:
+            return super().get(request, *args, **kwargs)
+        except Http404:
+            # Closed motions move to the archive; their pages stay up, read-only.
+            archived = get_object_or_404(ArchivedMotion.objects.select_related('author'), pk=kwargs['pk'])
+            return render(request, ARCHIVED_TEMPLATE, archive.detail(archived))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['comment_form'] = CommentForm()
-        context['comments'] = self.object.comments.filter(is_hidden=False)
+        # First page only; the rest is fetched by motion_comments on demand.
+        rows = list(self.object.comments.thread()[:COMMENTS_PAGE_SIZE + 1])
+        comments, context['comments_next_cursor'] = split_comment_page(rows)
+        replies = Comment.objects.replies(comments, REPLIES_PREVIEW + 1) if comments else []
+        context['comments'] = attach_replies(comments, replies, REPLIES_PREVIEW)
+
+        try:
+            response = self.object.response
+        except MotionResponse.DoesNotExist:
+            response = None
+        if response is not None:
+            context['milestones'] = list(response.milestones.all())
+            context['can_update_milestones'] = can_update_milestones(self.request.user, response)
 
         # Check deadline status
         if self.object.response_deadline:
@@ -65,16 +201,87 @@ class MotionDetailView(DetailView):
             context['days_remaining'] = (self.object.response_deadline - timezone.now()).days
 
         if self.request.user.is_authenticated:
-            user_vote = Vote.objects.filter(
-                motion=self.object,
-                user=self.request.user
-            ).first()
-            context['user_vote'] = user_vote.vote_type if user_vote else None
+            vote_buffer = get_vote_buffer()
+            pending_vote = vote_buffer and vote_buffer.pending_vote(self.object.pk, self.request.user.pk)
+            if pending_vote:
+                context['user_vote'] = pending_vote
+            else:
+                user_vote = Vote.objects.filter(
+                    motion=self.object,
+                    user=self.request.user
+                ).first()
+                context['user_vote'] = user_vote.vote_type if user_vote else None
 
         return context
 
 
+class AsyncMotionDetailView(MotionDetailView):
+    """MotionDetailView on the async ORM, for ASGI deployments.
+
+    The motion is fetched first; its comments and the viewer's vote are then
+    requested together with asyncio.gather. On Django 4.2 every async ORM
+    call runs through sync_to_async(thread_sensitive=True), so the two
+    queries still run one after the other on one thread; the gain is that
+    the event loop is free while they do.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            motion = await self.get_queryset().aget(pk=kwargs['pk'])
+        except Motion.DoesNotExist:
+            archived = await ArchivedMotion.objects.select_related('author').filter(pk=kwargs['pk']).afirst()
+            if archived is None:
+                raise Http404('No motion found matching the query')
+            return await sync_to_async(render)(request, ARCHIVED_TEMPLATE, archive.detail(archived))
+
+        user = await aget_user(request)
+        (comments, next_cursor), user_vote = await asyncio.gather(
+            self._acomments(motion),
+            self._auser_vote(motion, user),
+        )
+
+        context = {
+            'motion': motion,
+            'object': motion,
+            'comment_form': CommentForm(),
+            'comments': comments,
+            'comments_next_cursor': next_cursor,
+        }
+        try:
+            response = motion.response
+        except MotionResponse.DoesNotExist:
+            response = None
+        if response is not None:
+            context['milestones'] = [milestone async for milestone in response.milestones.all()]
+            context['can_update_milestones'] = user is not None and can_update_milestones(user, response)
+        if motion.response_deadline:
+            context['is_overdue'] = timezone.now() > motion.response_deadline
+            context['days_remaining'] = (motion.response_deadline - timezone.now()).days
+        if user is not None:
+            context['user_vote'] = user_vote
+        return await sync_to_async(render)(request, self.template_name, context)
+
+    async def _acomments(self, motion):
+        rows = Comment.objects.filter(motion=motion).thread()[:COMMENTS_PAGE_SIZE + 1]
+        comments, next_cursor = split_comment_page([comment async for comment in rows])
+        replies = []
+        if comments:
+            replies = [reply async for reply in Comment.objects.replies(comments, REPLIES_PREVIEW + 1)]
+        return attach_replies(comments, replies, REPLIES_PREVIEW), next_cursor
+
+    async def _auser_vote(self, motion, user):
+        if user is None:
+            return None
+        vote_buffer = get_vote_buffer()
+        pending_vote = vote_buffer and vote_buffer.pending_vote(motion.pk, user.pk)
+        if pending_vote:
+            return pending_vote
+        user_vote = await Vote.objects.filter(motion=motion, user=user).afirst()
+        return user_vote.vote_type if user_vote else None
+
+
 class MotionCreateView(LoginRequiredMixin, CreateView):
+    rate_limit = 'motion_create'
     model = Motion
     form_class = MotionForm
     template_name = 'motions/create.html'
@@ -83,22 +290,10 @@ class MotionCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.author = self.request.user
         form.instance.lga = self.request.user.lga
-
-        was_draft = form.instance.status != 'published'
-        if form.instance.status == 'published':
-            form.instance.published_at = timezone.now()
-            # Set response deadline
-            form.instance.response_deadline = timezone.now() + timedelta(days=RESPONSE_DEADLINE_DAYS)
-
-        response = super().form_valid(form)
-
-        # Send notifications if newly published
-        if form.instance.status == 'published' and was_draft:
-            from notifications.services import notify_new_motion
-            notify_new_motion(self.object)
-
+        self.object = form.save(commit=False)
+        services.save_motion(self.object)
         messages.success(self.request, 'Motion created successfully!')
-        return response
+        return HttpResponseRedirect(self.get_success_url())
 
 
 class MotionUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
@@ -114,24 +309,14 @@ class MotionUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return reverse_lazy('motion_detail', kwargs={'pk': self.object.pk})
 
     def form_valid(self, form):
-        was_draft = self.get_object().status != 'published'
-
-        if form.instance.status == 'published' and not form.instance.published_at:
-            form.instance.published_at = timezone.now()
-            # Set response deadline
-            form.instance.response_deadline = timezone.now() + timedelta(days=RESPONSE_DEADLINE_DAYS)
-
-        response = super().form_valid(form)
-
-        # Send notifications if newly published
-        if form.instance.status == 'published' and was_draft:
-            from notifications.services import notify_new_motion
-            notify_new_motion(self.object)
-
+        self.object = form.save(commit=False)
+        services.save_motion(self.object)
         messages.success(self.request, 'Motion updated successfully!')
-        return response
+        return HttpResponseRedirect(self.get_success_url())
 
 
+@query_budget(10)
+@rate_limit('vote')
 @login_required
 def vote_motion(request, pk):
     if request.method != 'POST':
@@ -143,37 +328,152 @@ def vote_motion(request, pk):
     if vote_type not in ['approve', 'disapprove']:
         return JsonResponse({'error': 'Invalid vote type'}, status=400)
 
-    vote, created = Vote.objects.update_or_create(
-        motion=motion,
-        user=request.user,
-        defaults={'vote_type': vote_type}
-    )
-
-    return JsonResponse({
-        'success': True,
-        'approval_count': motion.approval_count,
-        'disapproval_count': motion.disapproval_count,
-    })
-
-
+    # In buffered mode the vote is written in a later batch; counts are
+    # served from the buffer so the voter still sees their vote at once.
+    vote_buffer = get_vote_buffer()
+    if vote_buffer:
+        vote_buffer.add(motion.pk, request.user.pk, vote_type)
+        metrics.VOTES.inc(mode='buffered')
+        approval_count, disapproval_count = vote_buffer.counts(motion.pk)
+    else:
+        vote, created = Vote.objects.update_or_create(
+            motion=motion,
+            user=request.user,
+            defaults={'vote_type': vote_type}
+        )
+        metrics.VOTES.inc(mode='direct')
+        approval_count = motion.approval_count
+        disapproval_count = motion.disapproval_count
+
+    counts = {
+        'approval_count': approval_count,
+        'disapproval_count': disapproval_count,
+    }
+    events.publish(motion.pk, 'vote', counts)
+
+    return JsonResponse({'success': True, **counts})
+
+
+@query_budget(6)
+@rate_limit('comment')
 @login_required
 def add_comment(request, pk):
     if request.method != 'POST':
         return redirect('motion_detail', pk=pk)
 
     motion = get_object_or_404(Motion, pk=pk)
-    form = CommentForm(request.POST)
+    form = CommentForm(request.POST, motion=motion)
 
     if form.is_valid():
         comment = form.save(commit=False)
         comment.motion = motion
         comment.author = request.user
+        status = moderate(comment)
         comment.save()
-        messages.success(request, 'Comment added successfully!')
+        metrics.COMMENTS_MODERATED.inc(status=status)
+        if comment.is_hidden:
+            messages.info(request, 'Thanks! Your comment will appear once a moderator has reviewed it.')
+        else:
+            events.publish(motion.pk, 'comment', comment_payload(comment))
+            messages.success(request, 'Comment added successfully!')
 
     return redirect('motion_detail', pk=pk)
 
 
+@query_budget(14)
+@login_required
+def update_milestone(request, pk, milestone_pk):
+    """Set a milestone's status; the motion's delivery status follows."""
+    if request.method != 'POST':
+        return redirect('motion_detail', pk=pk)
+
+    milestone = get_object_or_404(
+        Milestone.objects.select_related('response'), pk=milestone_pk, response__motion_id=pk,
+    )
+    if not can_update_milestones(request.user, milestone.response):
+        messages.error(request, 'Only the accountable owner can update these milestones.')
+        return redirect('motion_detail', pk=pk)
+
+    status = request.POST.get('status')
+    if status not in Milestone.Status.values:
+        messages.error(request, 'Invalid milestone status.')
+    elif status != milestone.status:
+        milestone.status = status
+        milestone.save()
+        messages.success(request, f'"{milestone.title}" marked as {milestone.get_status_display()}.')
+    return redirect('motion_detail', pk=pk)
+
+
+@query_budget(4)
+@reads_from_replica
+def motion_comments(request, pk):
+    """The page of a motion's comments after ?after=<cursor>.
+
+    Returns the HTML fragment the detail page's "load more" link swaps in,
+    or JSON with ?format=json. Pages are keyset-paginated on
+    (created_at, id), so deep pages cost the same as the first one.
+    Archived motions have no live comments left, so they 404 like a missing
+    motion.
+    """
+    if not Motion.objects.filter(pk=pk).exists():
+        raise Http404('No motion found matching the query')
+    comments = Comment.objects.filter(motion_id=pk).thread().after(request.GET.get('after'))
+    comments, next_cursor = split_comment_page(list(comments[:COMMENTS_PAGE_SIZE + 1]))
+    replies = Comment.objects.replies(comments, REPLIES_PREVIEW + 1) if comments else []
+    attach_replies(comments, replies, REPLIES_PREVIEW)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [thread_payload(comment) for comment in comments],
+            'next_cursor': next_cursor,
+        })
+    return render(request, 'motions/comment_page.html', {
+        'motion_id': pk,
+        'comments': comments,
+        'comments_next_cursor': next_cursor,
+    })
+
+
+@query_budget(4)
+@reads_from_replica
+def motion_comment_thread(request, pk, comment_pk):
+    """One top-level comment with all of its visible replies, in two queries."""
+    comment = get_object_or_404(Comment.objects.filter(motion_id=pk).thread(), pk=comment_pk)
+    attach_replies([comment], Comment.objects.replies([comment]))
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse(thread_payload(comment))
+    return render(request, 'motions/comment_page.html', {
+        'motion_id': pk,
+        'comments': [comment],
+    })
+
+
+def release_connection():
+    # A connection inside a transaction has to stay open until it ends.
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+async def motion_events(request, pk):
+    """Server-sent event stream of vote counts and new comments.
+
+    Serve this under ASGI (uvicorn/daphne); under a sync WSGI worker each open
+    stream would tie up the whole worker.
+    """
+    if not await Motion.objects.filter(pk=pk).aexists():
+        raise Http404('No motion found matching the query')
+
+    # Release the connection used for the lookup so open streams don't pin
+    # one. Looked up in the sync thread: connections are per thread.
+    await sync_to_async(release_connection)()
+
+    response = StreamingHttpResponse(events.stream(pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 class MotionResponseView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     model = MotionResponse
     form_class = MotionResponseForm
@@ -185,24 +485,29 @@ class MotionResponseView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['motion'] = get_object_or_404(Motion, pk=self.kwargs['pk'])
+        context.setdefault('milestone_formset', MilestoneFormSet(prefix='milestones'))
         return context
 
-    def form_valid(self, form):
-        motion = get_object_or_404(Motion, pk=self.kwargs['pk'])
-        form.instance.motion = motion
-        form.instance.accountable_owner = self.request.user
-
-        # Update motion status based on decision
-        decision_to_status = {
-            'accept': 'accepted',
-            'modify': 'modified',
-            'reject': 'rejected',
-        }
-        motion.status = decision_to_status.get(form.instance.decision, motion.status)
-        motion.save()
+    def post(self, request, *args, **kwargs):
+        self.object = None
+        form = self.get_form()
+        formset = MilestoneFormSet(request.POST, prefix='milestones')
+        if form.is_valid() and formset.is_valid():
+            return self.form_valid(form, formset)
+        return self.render_to_response(self.get_context_data(form=form, milestone_formset=formset))
 
+    def form_valid(self, form, formset):
+        motion = get_object_or_404(Motion, pk=self.kwargs['pk'])
+        self.object = form.save(commit=False)
+        self.object.accountable_owner = self.request.user
+        formset.instance = self.object
+        try:
+            services.respond(motion, self.object, formset.save(commit=False))
+        except IntegrityError:
+            messages.error(self.request, 'This motion has already been responded to.')
+            return redirect('motion_detail', pk=motion.pk)
         messages.success(self.request, 'Response submitted successfully!')
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse_lazy('motion_detail', kwargs={'pk': self.kwargs['pk']})
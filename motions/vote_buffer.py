@@ -0,0 +1,183 @@
+"""
+Write-behind buffer for motion votes.
+
+During live council sessions hundreds of votes can land on the same motion
+within a minute. When ``VOTE_BUFFER['ENABLED']`` is set, ``vote_motion``
+records votes here instead of writing each one straight to the database.
+Repeat votes from the same user are coalesced in memory and the buffer is
+flushed to ``Vote`` as a single batched upsert every ``FLUSH_INTERVAL_MS``
+milliseconds, or sooner once ``MAX_ENTRIES`` votes are pending.
+
+The buffer is per process. Counts read through ``counts()`` combine the
+committed rows with this process's pending votes, so a voter sees their
+vote reflected immediately. Pending votes are flushed when the process
+exits (gunicorn workers exit through ``sys.exit``, which runs ``atexit``).
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+
+from config import metrics
+from .models import Vote
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBuffer:
+    """Coalescing in-process buffer that batches vote upserts."""
+
+    def __init__(self, flush_interval_ms=500, max_entries=200):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_entries = max_entries
+        self._pending = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, motion_id, user_id, vote_type):
+        """Queue a vote, replacing any pending vote by the same user."""
+        with self._lock:
+            self._pending[(motion_id, user_id)] = vote_type
+            pending = len(self._pending)
+            full = pending >= self.max_entries
+        metrics.VOTE_BUFFER_PENDING.set(pending)
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+
+    def pending_vote(self, motion_id, user_id):
+        """Return the user's not-yet-committed vote on a motion, if any."""
+        with self._lock:
+            key = (motion_id, user_id)
+            return self._pending.get(key, self._in_flight.get(key))
+
+    def counts(self, motion_id):
+        """Return ``(approvals, disapprovals)`` including pending votes."""
+        with self._lock:
+            pending = {
+                user_id: vote_type
+                for (m_id, user_id), vote_type in {**self._in_flight, **self._pending}.items()
+                if m_id == motion_id
+            }
+
+        # One statement: the committed votes of everyone without a buffered
+        # vote, plus the buffered votes. A batch landing meanwhile only writes
+        # rows for excluded voters, so nobody is counted twice or missed.
+        totals = Vote.objects.filter(motion_id=motion_id).exclude(user_id__in=pending).aggregate(
+            approvals=Count('pk', filter=Q(vote_type=Vote.VoteType.APPROVE)),
+            disapprovals=Count('pk', filter=Q(vote_type=Vote.VoteType.DISAPPROVE)),
+        )
+        pending_types = list(pending.values())
+        return (
+            totals['approvals'] + pending_types.count(Vote.VoteType.APPROVE),
+            totals['disapprovals'] + pending_types.count(Vote.VoteType.DISAPPROVE),
+        )
+
+    def flush(self):
+        """Write all pending votes in one upsert. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+            metrics.VOTE_BUFFER_PENDING.set(0)
+
+            try:
+                self._write(batch)
+            finally:
+                with self._lock:
+                    self._in_flight = {}
+
+            metrics.VOTE_BUFFER_FLUSHED.inc(len(batch))
+            return len(batch)
+
+    def _write(self, batch):
+        votes = [
+            Vote(motion_id=motion_id, user_id=user_id, vote_type=vote_type)
+            for (motion_id, user_id), vote_type in batch.items()
+        ]
+        try:
+            Vote.objects.bulk_create(
+                votes,
+                update_conflicts=True,
+                unique_fields=['motion', 'user'],
+                update_fields=['vote_type'],
+            )
+        except Exception:
+            # One bad row (e.g. a motion deleted mid-session) fails the whole
+            # batch, so fall back to row-by-row writes to save the rest.
+            logger.exception('Batched vote flush failed; retrying row by row')
+            for vote in votes:
+                try:
+                    Vote.objects.update_or_create(
+                        motion_id=vote.motion_id,
+                        user_id=vote.user_id,
+                        defaults={'vote_type': vote.vote_type},
+                    )
+                except Exception:
+                    logger.exception(
+                        'Dropping buffered vote for motion %s by user %s',
+                        vote.motion_id, vote.user_id,
+                    )
+
+    def close(self):
+        """Stop the background flusher and write anything still pending."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _ensure_worker(self):
+        if self._thread is not None or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='vote-buffer-flusher', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Vote buffer flush failed')
+            finally:
+                # The flusher thread owns its own connection; don't hold it
+                # open between batches.
+                connection.close()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_vote_buffer():
+    """Return the process-wide vote buffer, or None if buffering is off."""
+    global _buffer
+
+    config = getattr(settings, 'VOTE_BUFFER', {})
+    if not config.get('ENABLED'):
+        return None
+
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = VoteBuffer(
+                    flush_interval_ms=config.get('FLUSH_INTERVAL_MS', 500),
+                    max_entries=config.get('MAX_ENTRIES', 200),
+                )
+                atexit.register(_buffer.close)
+    return _buffer
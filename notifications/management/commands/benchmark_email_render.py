@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from accounts.models import User
+from notifications.models import Notification
+from notifications.services import render_notification_body, render_notification_email
+
+
+class Command(BaseCommand):
+    help = 'Compare per-message cost of rendering notification emails in a fan-out, before and after the shared-render cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipients',
+            type=int,
+            default=2000,
+            help='Number of recipients in the simulated fan-out (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        recipients = options['recipients']
+
+        # Unsaved instances: this measures rendering only, not the database.
+        notifications = [
+            Notification(
+                user=User(username=f'youth_{i}', email=f'youth_{i}@example.com'),
+                notification_type=Notification.NotificationType.NEW_MOTION,
+                title='New Motion in Newcastle',
+                message='"Free late-night buses for students" has been published. Join the discussion and show your support.',
+                link='/motions/42/',
+            )
+            for i in range(recipients)
+        ]
+
+        def full_render(notification):
+            context = {
+                'notification': notification,
+                'user': notification.user,
+                'site_url': settings.SITE_URL,
+            }
+            html_message = render_to_string('notifications/email/notification.html', context)
+            return html_message, strip_tags(html_message)
+
+        render_notification_body.cache_clear()
+        before = self.time_per_message(full_render, notifications)
+        render_notification_body.cache_clear()
+        after = self.time_per_message(render_notification_email, notifications)
+
+        self.stdout.write(f'Recipients:                          {recipients}')
+        self.stdout.write(f'render_to_string + strip_tags:       {before:8.1f} us/message')
+        self.stdout.write(f'shared render + username substitute: {after:8.1f} us/message')
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: {before / after:.1f}x'))
+
+    def time_per_message(self, render, notifications):
+        start = time.perf_counter()
+        for notification in notifications:
+            render(notification)
+        return (time.perf_counter() - start) / len(notifications) * 1_000_000
@@ -0,0 +1,178 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, Length
+from django.utils import timezone
+
+from config import metrics
+from notifications.models import Notification
+from notifications.services import adjust_unread_counts
+
+# Rough fixed per-row cost (ids, flags, timestamp, tuple header) added to the
+# text column lengths when estimating reclaimed space.
+ROW_OVERHEAD_BYTES = 64
+
+
+class Command(BaseCommand):
+    help = 'Delete old read notifications and collapse old unread ones into digest rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--read-days',
+            type=int,
+            default=90,
+            help='Delete read notifications older than this many days (default: 90)',
+        )
+        parser.add_argument(
+            '--unread-days',
+            type=int,
+            default=180,
+            help='Collapse unread notifications older than this many days into one digest per user (default: 180)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Width of each primary-key range processed per transaction (default: 5000)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be removed without deleting anything',
+        )
+
+    @metrics.COMMAND_DURATION.time(command='prune_notifications')
+    def handle(self, *args, **options):
+        now = timezone.now()
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+
+        read_old = Notification.objects.filter(
+            is_read=True,
+            created_at__lt=now - timedelta(days=options['read_days']),
+        )
+        unread_old = Notification.objects.filter(
+            is_read=False,
+            created_at__lt=now - timedelta(days=options['unread_days']),
+        ).exclude(notification_type=Notification.NotificationType.DIGEST)
+
+        deleted, deleted_bytes = self.delete_read(read_old)
+        self.stdout.write(f'Deleted {deleted} read notifications (~{deleted_bytes:,} bytes)')
+
+        collapsed, collapsed_bytes, digests = self.collapse_unread(unread_old)
+        self.stdout.write(
+            f'Collapsed {collapsed} unread notifications into {digests} digests (~{collapsed_bytes:,} bytes)'
+        )
+
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING('Dry run - nothing was deleted'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Reclaimed {deleted + collapsed - digests} rows (~{deleted_bytes + collapsed_bytes:,} bytes)'
+            ))
+
+    def pk_ranges(self, queryset):
+        """Yield (low, high) primary-key windows covering the queryset."""
+        bounds = queryset.order_by().aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return
+        for low in range(bounds['low'], bounds['high'] + 1, self.batch_size):
+            yield low, low + self.batch_size
+
+    def estimate_bytes(self, queryset):
+        return queryset.order_by().aggregate(
+            total=Coalesce(
+                Sum(Length('title') + Length('message') + Length('link') + Length('notification_type')),
+                Value(0),
+            ),
+        )['total']
+
+    def delete_read(self, queryset):
+        deleted = 0
+        reclaimed = 0
+
+        for low, high in self.pk_ranges(queryset):
+            window = queryset.filter(pk__gte=low, pk__lt=high)
+            stats = window.order_by().aggregate(rows=Count('pk'))
+            if not stats['rows']:
+                continue
+
+            reclaimed += self.estimate_bytes(window) + stats['rows'] * ROW_OVERHEAD_BYTES
+            if self.dry_run:
+                deleted += stats['rows']
+            else:
+                count, _ = window.delete()
+                deleted += count
+
+        return deleted, reclaimed
+
+    def collapse_unread(self, queryset):
+        collapsed = 0
+        reclaimed = 0
+        counts = defaultdict(Counter)
+        digests = {}
+
+        for low, high in self.pk_ranges(queryset):
+            window = queryset.filter(pk__gte=low, pk__lt=high)
+            with transaction.atomic():
+                # Counted from the locked rows: a mark_read running meanwhile
+                # either commits first, and its row is left out here, or waits
+                # and then finds the row gone. Either way each row comes off
+                # its user's unread counter once.
+                locking = window if self.dry_run else window.select_for_update()
+                rows = list(locking.order_by().values_list('pk', 'user', 'notification_type'))
+                if not rows:
+                    continue
+                locked = Notification.objects.filter(pk__in=[pk for pk, _, _ in rows])
+
+                reclaimed += self.estimate_bytes(locked) + len(rows) * ROW_OVERHEAD_BYTES
+                collapsed += len(rows)
+
+                per_user = Counter()
+                for _, user_id, notification_type in rows:
+                    counts[user_id][notification_type] += 1
+                    per_user[user_id] += 1
+
+                if self.dry_run:
+                    digests.update(dict.fromkeys(per_user))
+                    continue
+
+                locked.delete()
+
+                # Each digest carries the running totals for its user.
+                new_users = [user_id for user_id in per_user if user_id not in digests]
+                existing = [digests[user_id] for user_id in per_user if user_id in digests]
+                for digest in existing:
+                    self.fill_digest(digest, counts[digest.user_id])
+                Notification.objects.bulk_update(existing, ['title', 'message'])
+
+                created = []
+                for user_id in new_users:
+                    digest = Notification(
+                        user_id=user_id,
+                        notification_type=Notification.NotificationType.DIGEST,
+                        link='/notifications/',
+                    )
+                    self.fill_digest(digest, counts[user_id])
+                    created.append(digest)
+                digests.update(zip(new_users, Notification.objects.bulk_create(created)))
+
+                # The digest itself counts as one unread notification.
+                adjust_unread_counts({
+                    user_id: (1 if user_id in new_users else 0) - total
+                    for user_id, total in per_user.items()
+                })
+
+        return collapsed, reclaimed, len(digests)
+
+    def fill_digest(self, digest, type_counts):
+        labels = dict(Notification.NotificationType.choices)
+        total = sum(type_counts.values())
+        digest.title = f'{total} older notification{"s" if total != 1 else ""} archived'
+        digest.message = 'Older unread notifications were archived: ' + ', '.join(
+            f'{count} x {labels.get(notification_type, notification_type)}'
+            for notification_type, count in sorted(type_counts.items())
+        ) + '.'
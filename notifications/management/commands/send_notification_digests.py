@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from accounts.models import User
+from notifications.services import send_digests
+from config import metrics
+
+
+class Command(BaseCommand):
+    help = 'Send digest emails to users who chose hourly or daily delivery (run from cron at that interval)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--frequency',
+            choices=[User.EmailDelivery.HOURLY, User.EmailDelivery.DAILY],
+            required=True,
+            help='Which digest subscribers to send to',
+        )
+        parser.add_argument(
+            '--max-age-days',
+            type=int,
+            default=7,
+            help='Ignore unsent notifications older than this many days (default: 7)',
+        )
+
+    @metrics.COMMAND_DURATION.time(command='send_notification_digests')
+    def handle(self, *args, **options):
+        emails_sent, notifications_covered = send_digests(
+            options['frequency'],
+            max_age_days=options['max_age_days'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {emails_sent} {options["frequency"]} digests covering {notifications_covered} notifications'
+        ))
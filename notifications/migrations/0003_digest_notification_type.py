@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_inbox_indexes_and_unread_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('new_motion', 'New Motion in Your LGA'), ('motion_response', 'Motion Response Received'), ('comment', 'New Comment on Motion'), ('announcement', 'New Announcement'), ('digest', 'Notification Digest')], max_length=20),
+        ),
+    ]
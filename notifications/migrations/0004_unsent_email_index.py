@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_digest_notification_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('email_sent', False)), fields=['user'], name='notification_unsent_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:19
+
+from django.db import migrations
+from django.db.models import Q
+
+
+def settle_unowed_emails(apps, schema_editor):
+    """Mark sent the notifications of users who get no email, as create_notification now does."""
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.filter(email_sent=False).filter(
+        Q(user__email_notifications_enabled=False) | Q(user__email='')
+    ).update(email_sent=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_unsent_email_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(settle_unowed_emails, migrations.RunPython.noop),
+    ]
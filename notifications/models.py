@@ -10,6 +10,7 @@ class Notification(models.Model):
         MOTION_RESPONSE = 'motion_response', 'Motion Response Received'
         COMMENT = 'comment', 'New Comment on Motion'
         ANNOUNCEMENT = 'announcement', 'New Announcement'
+        DIGEST = 'digest', 'Notification Digest'
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -24,11 +25,22 @@ class Notification(models.Model):
     message = models.TextField()
     link = models.URLField(blank=True)
     is_read = models.BooleanField(default=False)
+    # Also set when no email is owed (email turned off, no address, or too
+    # old for a digest), so notification_unsent_idx only holds pending ones.
     email_sent = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-id'], name='notification_inbox_idx'),
+            models.Index(fields=['user', 'is_read'], name='notification_unread_idx'),
+            models.Index(
+                fields=['user'],
+                condition=models.Q(email_sent=False),
+                name='notification_unsent_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.notification_type} for {self.user.username}"
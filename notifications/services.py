@@ -1,36 +1,139 @@
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+import logging
+import secrets
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache
+from types import SimpleNamespace
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
+from django.db import transaction
+from django.db.models import Case, F, Max, PositiveIntegerField, Q, When
+from django.db.models.functions import Greatest
+from django.template.loader import get_template, render_to_string
 from django.conf import settings
-from django.utils.html import strip_tags
+from django.utils import timezone
+from django.utils.html import escape
+from accounts.cache import invalidate_user, invalidate_users
+from config import metrics
 from .models import Notification
 
+logger = logging.getLogger(__name__)
+
+# Stand-in for the recipient's username in shared renders; random so that no
+# motion title or message can contain it by accident.
+USERNAME_TOKEN = f'odyssey-username-{secrets.token_hex(8)}'
+
 
 def create_notification(user, notification_type, title, message, link=''):
     """Create a notification and optionally send email."""
+    wants_email = user.email_notifications_enabled and user.email
     notification = Notification.objects.create(
         user=user,
         notification_type=notification_type,
         title=title,
         message=message,
         link=link,
+        email_sent=not wants_email,
     )
+    adjust_unread_count(user.pk, 1)
+    metrics.NOTIFICATIONS_CREATED.inc(type=notification_type)
 
-    if user.email_notifications_enabled and user.email:
+    # Digest subscribers get this in their next hourly/daily digest instead
+    if wants_email and user.email_delivery == 'immediate':
         send_notification_email(notification)
 
     return notification
 
 
-def send_notification_email(notification):
-    """Send email for a notification."""
+def adjust_unread_count(user_id, delta):
+    """Shift a user's denormalized unread counter by delta in one UPDATE."""
+    from accounts.models import User
+
+    if delta:
+        User.objects.filter(pk=user_id).update(
+            unread_notification_count=Greatest(F('unread_notification_count') + delta, 0, output_field=PositiveIntegerField())
+        )
+        # update() skips post_save, so drop the cached user (nav badge) here
+        invalidate_user(user_id)
+
+
+def adjust_unread_counts(deltas):
+    """Apply {user_id: delta} changes to several unread counters in one UPDATE."""
+    from accounts.models import User
+
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if deltas:
+        User.objects.filter(pk__in=deltas).update(
+            unread_notification_count=Case(
+                *[When(pk=user_id, then=Greatest(F('unread_notification_count') + delta, 0, output_field=PositiveIntegerField()))
+                  for user_id, delta in deltas.items()],
+                default=F('unread_notification_count'),
+            )
+        )
+        invalidate_users(deltas)
+
+
+def mark_read(user, notification_id):
+    """Mark one of the user's notifications read. Returns True if it was unread."""
+    with transaction.atomic():
+        updated = Notification.objects.filter(
+            pk=notification_id, user=user, is_read=False,
+        ).update(is_read=True)
+        adjust_unread_count(user.pk, -updated)
+    return bool(updated)
+
+
+def mark_all_read(user):
+    """Mark all of the user's notifications read. Returns the number changed."""
+    with transaction.atomic():
+        updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+        # Decrement rather than zero the counter so a notification created
+        # concurrently is still counted.
+        adjust_unread_count(user.pk, -updated)
+    return updated
+
+
+@lru_cache(maxsize=256)
+def render_notification_body(notification_type, title, message, link, site_url):
+    """Render the HTML and plain-text email bodies shared by every recipient.
+
+    In a fan-out every subscriber gets the same title, message and link, so
+    the templates are rendered once per distinct notification and only the
+    username is filled in per message by render_notification_email().
+    """
     context = {
-        'notification': notification,
-        'user': notification.user,
-        'site_url': settings.SITE_URL,
+        'notification': SimpleNamespace(
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            link=link,
+        ),
+        'user': SimpleNamespace(username=USERNAME_TOKEN),
+        'site_url': site_url,
     }
-
     html_message = render_to_string('notifications/email/notification.html', context)
-    plain_message = strip_tags(html_message)
+    plain_message = render_to_string('notifications/email/notification.txt', context)
+    return html_message, plain_message
+
+
+def render_notification_email(notification):
+    """Return (html_message, plain_message) for one notification."""
+    html_message, plain_message = render_notification_body(
+        notification.notification_type,
+        notification.title,
+        notification.message,
+        notification.link,
+        settings.SITE_URL,
+    )
+    username = notification.user.username
+    return (
+        html_message.replace(USERNAME_TOKEN, escape(username)),
+        plain_message.replace(USERNAME_TOKEN, username),
+    )
+
+
+def send_notification_email(notification):
+    """Send email for a notification."""
+    html_message, plain_message = render_notification_email(notification)
 
     try:
         send_mail(
@@ -39,12 +142,97 @@ def send_notification_email(notification):
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[notification.user.email],
             html_message=html_message,
-            fail_silently=True,
         )
-        notification.email_sent = True
-        notification.save()
     except Exception:
-        pass
+        # Email is best-effort; the notification is still in the inbox.
+        logger.exception('Failed to send notification email %s', notification.pk)
+        metrics.EMAILS.inc(kind='immediate', outcome='failed')
+        return
+
+    metrics.EMAILS.inc(kind='immediate', outcome='sent')
+    notification.email_sent = True
+    notification.save(update_fields=['email_sent'])
+
+
+def send_digests(frequency, max_age_days=7, chunk_size=500):
+    """Email each digest subscriber one message covering their unsent notifications.
+
+    Templates are compiled once per run and every message goes out over a
+    single SMTP connection. Returns (emails_sent, notifications_covered).
+
+    Unsent notifications this frequency's digests will never cover (older
+    than max_age_days, or for subscribers who have since turned email off)
+    are marked sent first, so they leave notification_unsent_idx.
+    """
+    from accounts.models import User
+
+    cutoff = timezone.now() - timedelta(days=max_age_days)
+    Notification.objects.filter(email_sent=False, user__email_delivery=frequency).filter(
+        Q(created_at__lt=cutoff) | Q(user__email_notifications_enabled=False) | Q(user__email='')
+    ).update(email_sent=True)
+
+    pending = Notification.objects.filter(
+        email_sent=False,
+        created_at__gte=cutoff,
+        user__email_delivery=frequency,
+        user__email_notifications_enabled=True,
+    ).exclude(user__email='')
+
+    # Only cover rows that exist now; anything created mid-run waits for the next one.
+    high_water = pending.aggregate(Max('pk'))['pk__max']
+    if high_water is None:
+        return 0, 0
+    pending = pending.filter(pk__lte=high_water)
+
+    html_template = get_template('notifications/email/digest.html')
+    text_template = get_template('notifications/email/digest.txt')
+    frequency_label = 'hourly' if frequency == User.EmailDelivery.HOURLY else 'daily'
+
+    user_ids = sorted(set(pending.values_list('user', flat=True)))
+    emails_sent = 0
+    notifications_covered = 0
+
+    with get_connection() as connection:
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            users = User.objects.in_bulk(chunk)
+
+            grouped = defaultdict(list)
+            for notification in pending.filter(user_id__in=chunk).order_by('user_id', 'created_at'):
+                grouped[notification.user_id].append(notification)
+
+            delivered = []
+            for user_id, notifications in grouped.items():
+                user = users[user_id]
+                context = {
+                    'user': user,
+                    'notifications': notifications,
+                    'frequency': frequency_label,
+                    'site_url': settings.SITE_URL,
+                }
+                message = EmailMultiAlternatives(
+                    subject=f'Your Odyssey {frequency_label} digest ({len(notifications)} update{"s" if len(notifications) != 1 else ""})',
+                    body=text_template.render(context),
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[user.email],
+                    connection=connection,
+                )
+                message.attach_alternative(html_template.render(context), 'text/html')
+                try:
+                    message.send()
+                except Exception:
+                    logger.exception('Failed to send %s digest to user %s', frequency, user_id)
+                    metrics.EMAILS.inc(kind='digest', outcome='failed')
+                    continue
+                metrics.EMAILS.inc(kind='digest', outcome='sent')
+                delivered.append(user_id)
+                emails_sent += 1
+                notifications_covered += len(notifications)
+
+            if delivered:
+                pending.filter(user_id__in=delivered).update(email_sent=True)
+
+    return emails_sent, notifications_covered
 
 
 def notify_new_motion(motion):
@@ -58,6 +246,7 @@ def notify_new_motion(motion):
 
     link = f'/motions/{motion.pk}/'
 
+    recipients = 0
     for user in users:
         create_notification(
             user=user,
@@ -66,6 +255,8 @@ def notify_new_motion(motion):
             message=f'"{motion.title}" has been published. Join the discussion and show your support.',
             link=link,
         )
+        recipients += 1
+    metrics.NOTIFICATION_FANOUT.observe(recipients, event='new_motion')
 
 
 def notify_motion_response(motion):
@@ -101,3 +292,22 @@ def notify_motion_response(motion):
             message=f'A motion you engaged with has received an official response: {response.get_decision_display()}',
             link=link,
         )
+    metrics.NOTIFICATION_FANOUT.observe(len(engaged_users) + 1, event='motion_response')
+
+
+def motion_published(motion_id):
+    """Background task: notify_new_motion() for a motion once its publication commits."""
+    from motions.models import Motion
+
+    motion = Motion.objects.select_related('author').filter(pk=motion_id).first()
+    if motion is not None:
+        notify_new_motion(motion)
+
+
+def motion_responded(motion_id):
+    """Background task: notify_motion_response() once a response commits."""
+    from motions.models import Motion
+
+    motion = Motion.objects.select_related('author', 'response').filter(pk=motion_id).first()
+    if motion is not None:
+        notify_motion_response(motion)
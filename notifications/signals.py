@@ -1,11 +1,12 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from config.tasks import defer
 from motions.models import MotionResponse
 
 
 @receiver(post_save, sender=MotionResponse)
 def response_saved(sender, instance, created, **kwargs):
-    """Send notifications when a response is added."""
+    """Send notifications, in the background, once a new response commits."""
     if created:
-        from .services import notify_motion_response
-        notify_motion_response(instance.motion)
+        from .services import motion_responded
+        defer(motion_responded, instance.motion_id)
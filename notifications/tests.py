@@ -1,3 +1,183 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from config.testing import QueryBudgetTestCase
+from .models import Notification
+from .services import create_notification, mark_all_read, mark_read, send_digests
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('youth', password='pass', lga='newcastle')
+        for i in range(25):
+            create_notification(cls.user, 'new_motion', f'Notification {i}', 'Message')
+
+    def test_inbox(self):
+        response = self.assertWithinBudget(reverse('notification_list'))
+        self.assertEqual(len(response.context['notifications']), 20)
+
+
+class UnreadCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass', lga='newcastle')
+        cls.other = User.objects.create_user('neighbour', password='pass', lga='newcastle')
+
+    def unread(self, user):
+        counter = User.objects.values_list('unread_notification_count', flat=True).get(pk=user.pk)
+        self.assertEqual(counter, Notification.objects.filter(user=user, is_read=False).count())
+        return counter
+
+    def test_counter_follows_creates_and_reads(self):
+        notifications = [
+            create_notification(self.user, 'new_motion', f'Notification {i}', 'Message') for i in range(3)
+        ]
+        create_notification(self.other, 'new_motion', 'Elsewhere', 'Message')
+        self.assertEqual((self.unread(self.user), self.unread(self.other)), (3, 1))
+
+        self.assertTrue(mark_read(self.user, notifications[0].pk))
+        self.assertEqual(self.unread(self.user), 2)
+        # Reading it again, or someone else's, changes nothing.
+        self.assertFalse(mark_read(self.user, notifications[0].pk))
+        self.assertFalse(mark_read(self.other, notifications[1].pk))
+        self.assertEqual((self.unread(self.user), self.unread(self.other)), (2, 1))
+
+        self.assertEqual(mark_all_read(self.user), 2)
+        self.assertEqual(mark_all_read(self.user), 0)
+        self.assertEqual((self.unread(self.user), self.unread(self.other)), (0, 1))
+
+    def test_saving_a_loaded_user_keeps_the_counter(self):
+        user = User.objects.get(pk=self.user.pk)
+        create_notification(self.user, 'new_motion', 'Arrived meanwhile', 'Message')
+        user.first_name = 'Renamed'
+        user.save()
+        self.assertEqual(self.unread(self.user), 1)
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Renamed')
+
+    def test_double_mark_read_through_the_views(self):
+        notification = create_notification(self.user, 'new_motion', 'Title', 'Message')
+        create_notification(self.user, 'new_motion', 'Title', 'Message')
+        self.client.force_login(self.user)
+        url = reverse('notification_read', args=[notification.pk])
+        self.client.post(url)
+        self.client.post(url)
+        self.assertEqual(self.unread(self.user), 1)
+        self.client.post(reverse('notification_read_all'))
+        self.client.post(reverse('notification_read_all'))
+        self.assertEqual(self.unread(self.user), 0)
+
+
+class PruneNotificationsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('hoarder', password='pass', lga='newcastle')
+        cls.drifted = User.objects.create_user('drifted', password='pass', lga='newcastle')
+
+    def notify(self, user, notification_type='new_motion', days=0, read=False):
+        notification = create_notification(user, notification_type, 'Title', 'Message')
+        if read:
+            mark_read(user, notification.pk)
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=days))
+        return notification
+
+    def unread(self, user):
+        return User.objects.values_list('unread_notification_count', flat=True).get(pk=user.pk)
+
+    def test_prune(self):
+        for _ in range(3):
+            self.notify(self.user, days=100, read=True)
+        recent_read = self.notify(self.user, days=10, read=True)
+        for notification_type in ['new_motion', 'motion_response', 'new_motion', 'new_motion']:
+            self.notify(self.user, notification_type, days=200)
+        recent_unread = self.notify(self.user, days=10)
+        self.notify(self.drifted, days=200)
+        self.notify(self.drifted, days=200)
+        # A counter that has drifted below the real number of unread rows.
+        User.objects.filter(pk=self.drifted.pk).update(unread_notification_count=0)
+        self.assertEqual(self.unread(self.user), 5)
+
+        out = StringIO()
+        # Small batches, so the user's digest is updated across windows.
+        call_command('prune_notifications', batch_size=3, stdout=out)
+        self.assertIn('Deleted 3 read notifications', out.getvalue())
+        self.assertIn('Collapsed 6 unread notifications into 2 digests', out.getvalue())
+
+        remaining = Notification.objects.filter(user=self.user)
+        digest = remaining.get(notification_type='digest')
+        self.assertCountEqual(remaining.values_list('pk', flat=True), [recent_read.pk, recent_unread.pk, digest.pk])
+        self.assertEqual(digest.title, '4 older notifications archived')
+        self.assertEqual(
+            digest.message,
+            'Older unread notifications were archived: 1 x Motion Response Received, 3 x New Motion in Your LGA.',
+        )
+        # The digest counts as one unread notification; counters never go below 0.
+        self.assertEqual(self.unread(self.user), 2)
+        self.assertEqual(self.unread(self.drifted), 0)
+
+    def test_dry_run(self):
+        self.notify(self.user, days=100, read=True)
+        self.notify(self.user, days=200)
+        out = StringIO()
+        call_command('prune_notifications', dry_run=True, stdout=out)
+        self.assertIn('Collapsed 1 unread notifications into 1 digests', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(self.unread(self.user), 1)
+
+
+class SendDigestsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        def user(username, delivery, **fields):
+            return User.objects.create_user(
+                username, email=f'{username}@example.com', password='pass', lga='newcastle',
+                email_delivery=delivery, **fields,
+            )
+
+        cls.daily = user('daily_reader', 'daily')
+        cls.hourly = user('hourly_reader', 'hourly')
+        cls.lapsed = user('lapsed_reader', 'daily')
+        cls.silent = user('silent_reader', 'immediate', email_notifications_enabled=False)
+
+    def notify(self, user, title, days=0):
+        notification = create_notification(user, 'new_motion', title, 'Message')
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=days))
+        return notification
+
+    def unsent(self):
+        return set(Notification.objects.filter(email_sent=False).values_list('title', flat=True))
+
+    def test_send_digests(self):
+        self.notify(self.daily, 'Bus shelters')
+        self.notify(self.daily, 'Skate park', days=2)
+        self.notify(self.daily, 'Too old', days=10)
+        self.notify(self.hourly, 'Hourly news')
+        self.notify(self.lapsed, 'Turned off')
+        # Users who get no email never hold an unsent notification.
+        self.notify(self.silent, 'Never emailed')
+        self.assertEqual(self.unsent(), {'Bus shelters', 'Skate park', 'Too old', 'Hourly news', 'Turned off'})
+        User.objects.filter(pk=self.lapsed.pk).update(email_notifications_enabled=False)
+
+        self.assertEqual(send_digests('daily'), (1, 2))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['daily_reader@example.com'])
+        self.assertEqual(mail.outbox[0].subject, 'Your Odyssey daily digest (2 updates)')
+        self.assertIn('Bus shelters', mail.outbox[0].body)
+        self.assertNotIn('Too old', mail.outbox[0].body)
+        # Everything the daily digest will never cover leaves the unsent index.
+        self.assertEqual(self.unsent(), {'Hourly news'})
 
-# Create your tests here.
+        self.assertEqual(send_digests('daily'), (0, 0))
+        self.assertEqual(send_digests('hourly'), (1, 1))
+        self.assertEqual(self.unsent(), set())
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.NotificationListView.as_view(), name='notification_list'),
+    path('<int:pk>/read/', views.mark_notification_read, name='notification_read'),
+    path('read-all/', views.mark_all_notifications_read, name='notification_read_all'),
+]
@@ -1,3 +1,61 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect
+from django.views.generic import ListView
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.utils.http import url_has_allowed_host_and_scheme
+from .models import Notification
+from .services import mark_read, mark_all_read
 
-# Create your views here.
+
+class NotificationListView(LoginRequiredMixin, ListView):
+    """The user's notification inbox, newest first.
+
+    Pages are keyset-paginated on the primary key (``?before=<id>``) so deep
+    pages cost the same as the first one.
+    """
+    template_name = 'notifications/inbox.html'
+    context_object_name = 'notifications'
+    page_size = 20
+    query_budget = 4
+
+    def get_queryset(self):
+        queryset = Notification.objects.filter(user=self.request.user)
+
+        before = self.request.GET.get('before')
+        if before and before.isdigit():
+            queryset = queryset.filter(pk__lt=int(before))
+
+        # Fetch one extra row to learn whether there is a next page
+        return queryset.order_by('-pk')[:self.page_size + 1]
+
+    def get_context_data(self, **kwargs):
+        notifications = list(self.object_list)
+        has_next = len(notifications) > self.page_size
+        notifications = notifications[:self.page_size]
+
+        context = super().get_context_data(object_list=notifications, **kwargs)
+        context['notifications'] = notifications
+        context['next_cursor'] = notifications[-1].pk if has_next else None
+        context['is_first_page'] = not self.request.GET.get('before')
+        return context
+
+
+@login_required
+def mark_notification_read(request, pk):
+    if request.method == 'POST':
+        mark_read(request.user, pk)
+
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('notification_list')
+
+
+@login_required
+def mark_all_notifications_read(request):
+    if request.method == 'POST':
+        updated = mark_all_read(request.user)
+        if updated:
+            messages.success(request, f'Marked {updated} notification{"s" if updated != 1 else ""} as read.')
+    return redirect('notification_list')